@@ -0,0 +1,258 @@
+#!/usr/bin/env python
+
+# Licensed under the Apache License, Version 2.0 (the "License"); you may
+# not use this file except in compliance with the License. You may obtain
+# a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+# WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+# License for the specific language governing permissions and limitations
+# under the License.
+
+"""Times each hwk module's `info()` against recorded hosts of several sizes
+and counts the filesystem operations and subprocess spawns each call makes.
+
+The synthetic hosts are built with `hwk.tests.fixtures.build_host()` and
+recorded with `hwk.snapshot`, so every run replays exactly the same reads from
+memory and the timings measure hwk's own cost rather than the kernel's.
+Snapshots captured from real hosts may be added with --snapshot.
+
+Modules with lazily determined attributes are also run as '$MODULE+all',
+which calls `info(include=$MODULE.FIELDS)` to determine every attribute up
+front, giving the cost of full discovery.
+
+Counts and timings are compared against the budgets in
+benchmarks/budgets.json, keyed by '$HOST/$MODULE', and optionally against the
+timings in the results of an earlier run. The exit status is 1 if any budget
+is exceeded.
+
+Usage: PYTHONPATH=. python benchmarks/bench_discovery.py [--help]
+"""
+
+import argparse
+import functools
+import importlib
+import itertools
+import json
+import os
+import platform
+import shutil
+import sys
+import tempfile
+import timeit
+
+from hwk import fs
+from hwk import snapshot
+from hwk.tests import fixtures
+
+_BUDGETS = os.path.join(os.path.dirname(__file__), 'budgets.json')
+
+# Keyword arguments for `hwk.tests.fixtures.build_host()`
+HOSTS = {
+    'small': dict(nodes=1, cores_per_node=4, threads_per_core=2, nics=2,
+                  disks=1, partitions=2),
+    'medium': dict(nodes=2, cores_per_node=16, threads_per_core=2, nics=16,
+                   disks=8, partitions=4),
+    'large': dict(nodes=2, cores_per_node=64, threads_per_core=2, nics=5000,
+                  disks=24, partitions=4),
+}
+
+MODULES = (
+    'cpu', 'memory', 'block', 'block+all', 'net', 'net+all', 'gpu', 'gpu+all',
+    'pci', 'topology',
+)
+
+_counter = itertools.count()
+
+
+class Meter(fs.Proxy):
+    """A `hwk.fs.Proxy` that counts the calls made through it. Every
+    filesystem operation is counted as a syscall; most cost exactly one, and
+    none cost fewer.
+    """
+
+    def __init__(self, filesystem):
+        super(Meter, self).__init__(filesystem)
+        self._id = next(_counter)
+        self.opens = 0
+        self.syscalls = 0
+        self.spawns = 0
+
+    @property
+    def key(self):
+        return (self.__class__.__name__, self._id)
+
+    def open(self, path, mode='r'):
+        self.opens += 1
+        self.syscalls += 1
+        return self.filesystem.open(path, mode)
+
+    def _op(name):
+        def op(self, path):
+            self.syscalls += 1
+            return getattr(self.filesystem, name)(path)
+        return op
+
+    listdir = _op('listdir')
+    isdir = _op('isdir')
+    exists = _op('exists')
+    islink = _op('islink')
+    readlink = _op('readlink')
+    realpath = _op('realpath')
+    getmtime = _op('getmtime')
+    statvfs = _op('statvfs')
+    del _op
+
+    def check_output(self, cmd, stderr=None):
+        self.spawns += 1
+        return self.filesystem.check_output(cmd, stderr=stderr)
+
+
+def _build(name):
+    root = tempfile.mkdtemp()
+    try:
+        host = fixtures.build_host(root, **HOSTS[name])
+        return snapshot.Archive(snapshot.capture(filesystem=host), name=name)
+    finally:
+        shutil.rmtree(root)
+
+
+def _discover(module):
+    name, _, variant = module.partition('+')
+    mod = importlib.import_module('hwk.' + name)
+    if not variant:
+        return mod.info
+    return functools.partial(mod.info, include=mod.FIELDS)
+
+
+def _bench(host, archive, module, rounds):
+    info = _discover(module)
+    res = {'host': host, 'module': module}
+    times = []
+    for x in range(rounds + 1):
+        # A fresh meter per round also defeats memoization, since memoized
+        # results are keyed by filesystem
+        meter = Meter(archive)
+        with fs.use(meter):
+            start = timeit.default_timer()
+            info()
+            elapsed = timeit.default_timer() - start
+        if x == 0:
+            # The first round warms up imports and is not timed
+            res.update(
+                opens=meter.opens,
+                syscalls=meter.syscalls,
+                spawns=meter.spawns,
+            )
+            continue
+        times.append(elapsed * 1000)
+    times.sort()
+    res['ms'] = round(times[0], 3)
+    res['median_ms'] = round(times[len(times) // 2], 3)
+    return res
+
+
+def _check(results, budgets, baseline, max_slowdown):
+    failures = []
+    previous = {}
+    for r in (baseline or {}).get('results', []):
+        previous['%s/%s' % (r['host'], r['module'])] = r
+    for r in results:
+        key = '%s/%s' % (r['host'], r['module'])
+        for metric, limit in sorted(budgets.get(key, {}).items()):
+            if r[metric] > limit:
+                failures.append("%s: %s is %s, budget is %s" % (
+                    key, metric, r[metric], limit))
+        prev = previous.get(key)
+        if prev is not None and r['ms'] > prev['ms'] * max_slowdown:
+            failures.append("%s: ms is %s, %.2fx the baseline of %s" % (
+                key, r['ms'], r['ms'] / prev['ms'], prev['ms']))
+    return failures
+
+
+def _parser():
+    parser = argparse.ArgumentParser(
+        description="Benchmark hwk discovery against recorded hosts.",
+    )
+    parser.add_argument(
+        '--hosts', default='small,medium,large',
+        help="Comma-separated synthetic hosts to run (default: %(default)s).",
+    )
+    parser.add_argument(
+        '--snapshot', action='append', default=[],
+        help="A snapshot file to run as an additional host. May be repeated.",
+    )
+    parser.add_argument(
+        '--modules', default=','.join(MODULES),
+        help="Comma-separated hwk modules to run (default: %(default)s).",
+    )
+    parser.add_argument(
+        '--rounds', type=int, default=5,
+        help="Timed calls per host and module (default: %(default)s).",
+    )
+    parser.add_argument(
+        '--output', help="File to write the results to as JSON.",
+    )
+    parser.add_argument(
+        '--budgets', default=_BUDGETS,
+        help="JSON file of budgets (default: %(default)s).",
+    )
+    parser.add_argument(
+        '--baseline', help="Results of an earlier run to compare timings to.",
+    )
+    parser.add_argument(
+        '--max-slowdown', type=float, default=1.25,
+        help="Largest allowed ratio of a timing to its baseline "
+             "(default: %(default)s).",
+    )
+    return parser
+
+
+def main(argv=None):
+    args = _parser().parse_args(argv)
+    hosts = []
+    for name in [h for h in args.hosts.split(',') if h]:
+        hosts.append((name, _build(name)))
+    for path in args.snapshot:
+        hosts.append((os.path.basename(path), snapshot.load(path)))
+
+    results = []
+    fmt = "%-12s %-15s %10s %8s %9s %7s\n"
+    sys.stdout.write(fmt % (
+        'host', 'module', 'best ms', 'opens', 'syscalls', 'spawns'))
+    for host, archive in hosts:
+        for module in [m for m in args.modules.split(',') if m]:
+            r = _bench(host, archive, module, args.rounds)
+            results.append(r)
+            sys.stdout.write(fmt % (
+                host, module, '%.2f' % r['ms'], r['opens'], r['syscalls'],
+                r['spawns']))
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump({
+                'python': platform.python_version(),
+                'platform': platform.platform(),
+                'rounds': args.rounds,
+                'results': results,
+            }, f, indent=2, sort_keys=True)
+
+    budgets = {}
+    if args.budgets and os.path.exists(args.budgets):
+        with open(args.budgets) as f:
+            budgets = json.load(f)
+    baseline = None
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+    failures = _check(results, budgets, baseline, args.max_slowdown)
+    for failure in failures:
+        sys.stderr.write("FAIL %s\n" % failure)
+    return 1 if failures else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,95 @@
+#!/usr/bin/env python
+
+# Licensed under the Apache License, Version 2.0 (the "License"); you may
+# not use this file except in compliance with the License. You may obtain
+# a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+# WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+# License for the specific language governing permissions and limitations
+# under the License.
+
+"""Measures the memory held by the inventory of each synthetic host, as a
+service keeping the full discovery results of many hosts in memory would
+hold it.
+
+Each host is recorded once with `hwk.snapshot` and discovered COUNT times from
+separate archives, so every copy parses its own strings just as copies
+discovered on different hosts would. The reported bytes per host are the
+total size of every object reachable from the `Info` objects of all copies,
+counting shared objects once, divided by COUNT.
+
+Usage: PYTHONPATH=. python benchmarks/bench_memory.py [COUNT]
+"""
+
+import importlib
+import shutil
+import sys
+import tempfile
+import types
+
+from hwk import fs
+from hwk import snapshot
+from hwk.tests import fixtures
+
+sys.path.insert(0, __file__.rsplit('/', 1)[0])
+from bench_discovery import HOSTS  # noqa: E402
+
+# Objects that belong to the process rather than to any one inventory
+_SKIP = (
+    type, types.ModuleType, types.FunctionType, types.BuiltinFunctionType,
+    fs.Filesystem,
+)
+
+
+def _deep_size(objs, seen):
+    res = 0
+    stack = list(objs)
+    while stack:
+        obj = stack.pop()
+        if id(obj) in seen or isinstance(obj, _SKIP):
+            continue
+        seen.add(id(obj))
+        res += sys.getsizeof(obj)
+        if isinstance(obj, dict):
+            stack.extend(obj.keys())
+            stack.extend(obj.values())
+        elif isinstance(obj, (list, tuple, set, frozenset)):
+            stack.extend(obj)
+        if hasattr(obj, '__dict__'):
+            stack.append(obj.__dict__)
+        for cls in type(obj).__mro__:
+            for name in getattr(cls, '__slots__', ()):
+                if hasattr(obj, name):
+                    stack.append(getattr(obj, name))
+    return res
+
+
+def _discover(archive):
+    res = []
+    with fs.use(archive):
+        for name in snapshot.MODULES:
+            module = importlib.import_module('hwk.' + name)
+            res.append(module.info(include=module.FIELDS))
+    return res
+
+
+def _bench(host, count):
+    root = tempfile.mkdtemp()
+    try:
+        data = snapshot.capture(filesystem=fixtures.build_host(
+            root, **HOSTS[host]))
+    finally:
+        shutil.rmtree(root)
+    inventories = [_discover(snapshot.Archive(data)) for x in range(count)]
+    return _deep_size(inventories, set()) // count
+
+
+if __name__ == '__main__':
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 20
+    print("%-10s %14s" % ("host", "bytes/host"))
+    for host in ('small', 'medium', 'large'):
+        print("%-10s %14d" % (host, _bench(host, count)))
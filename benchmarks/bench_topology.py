@@ -0,0 +1,69 @@
+#!/usr/bin/env python
+
+# Licensed under the Apache License, Version 2.0 (the "License"); you may
+# not use this file except in compliance with the License. You may obtain
+# a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+# WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+# License for the specific language governing permissions and limitations
+# under the License.
+
+"""Times `hwk.topology.info()` against synthetic sysfs trees of increasing
+size and reports the number of files opened for each.
+
+Usage: PYTHONPATH=. python benchmarks/bench_topology.py [ROUNDS]
+"""
+
+import shutil
+import sys
+import tempfile
+import timeit
+
+from hwk import fs
+from hwk import topology
+from hwk.tests import fixtures
+
+# (nodes, cores per node, threads per core)
+_LAYOUTS = (
+    (1, 4, 2),
+    (2, 16, 2),
+    (2, 64, 2),
+    (8, 32, 2),
+)
+
+
+def _bench(layout, rounds):
+    root = tempfile.mkdtemp()
+    try:
+        num_cpus = fixtures.build_topology(root, *layout)
+
+        def run():
+            topology._linux_info.cache_clear()
+            topology._linux_info()
+
+        counting_fs = fixtures.CountingFilesystem(root)
+        with fs.use(counting_fs):
+            run()
+        with fs.use(root):
+            best = min(timeit.repeat(run, number=1, repeat=rounds))
+        return num_cpus, len(counting_fs.opened), best
+    finally:
+        topology._linux_info.cache_clear()
+        shutil.rmtree(root)
+
+
+if __name__ == '__main__':
+    rounds = int(sys.argv[1]) if len(sys.argv) > 1 else 5
+    print("%-22s %8s %8s %10s" % ("layout", "cpus", "opens", "best ms"))
+    for layout in _LAYOUTS:
+        num_cpus, opens, best = _bench(layout, rounds)
+        print("%-22s %8d %8d %10.2f" % (
+            "%dn x %dc x %dt" % layout,
+            num_cpus,
+            opens,
+            best * 1000,
+        ))
@@ -12,18 +12,57 @@
 # License for the specific language governing permissions and limitations
 # under the License.
 
+import collections
 import math
 import os
-import subprocess
-import platform
+import threading
+import time
 
+import six
+
+from hwk import fs
+from hwk import serialize
+from hwk import trace
 from hwk import units
+from hwk import utils
 
 
-_SECTOR_SIZE = 512
+# The kernel reports the sizes of block devices and partitions in sysfs in
+# 512-byte units whatever the logical block size of the device, so this is not
+# the sector size of any particular disk. See `hwk.block.Queue` for that.
+_SYSFS_SECTOR_SIZE = 512
 _LINUX_SYS_BLOCK_DIR = '/sys/block/'
 _LINUX_DEV_DISK_BY_ID = '/dev/disk/by-id/'
+_LINUX_DEV_DISK_BY_PARTUUID = '/dev/disk/by-partuuid/'
 _LINUX_SYS_CLASS_BLOCK_DIR = '/sys/class/block/'
+_LINUX_PROC_SELF_MOUNTINFO = '/proc/self/mountinfo'
+# Attributes of `Disk` and `Partition` objects that are determined on first
+# access, and may be determined for many disks at once with `prefetch()`
+PREFETCH_FIELDS = (
+    'vendor', 'serial_no', 'queue', 'partitions', 'type', 'mount_point',
+    'usage',
+)
+# Fields that may be passed to `info(include=...)`. size_bytes covers the size
+# of each disk and the total size.
+FIELDS = ('size_bytes',) + PREFETCH_FIELDS
+# Fields whose values change continually rather than when the hardware or its
+# configuration changes. `hwk.diff.Collector` leaves them out unless asked for
+# them.
+VOLATILE_FIELDS = ('usage',)
+# Seconds to wait for the filesystems mounted on partitions to report their
+# usage, and for which reported usage is reused
+USAGE_TIMEOUT = 2.0
+USAGE_TTL = 10.0
+# The most filesystems asked for their usage at once, not counting those that
+# have failed to answer within USAGE_TIMEOUT
+_USAGE_WORKERS = 8
+# The attributes of `Queue` objects that `apply_queues()` may set, and the
+# values of write_cache the kernel accepts
+QUEUE_SETTINGS = (
+    'scheduler', 'nr_requests', 'read_ahead_kb', 'rotational',
+    'discard_max_bytes', 'write_cache',
+)
+_WRITE_CACHE_MODES = ('write back', 'write through')
 _INFO_HELP = """Block device subsystem
 ===============================================================================
 `hwk.block.Info` attributes:
@@ -49,7 +88,7 @@ disks (list of `hwk.block.Disk` objects)
 
   bus_type (string)
 
-    'IDE' or 'SCSI'
+    'IDE', 'SCSI', 'NVMe', 'MMC' or 'virtio'
 
   vendor (string)
 
@@ -59,6 +98,58 @@ disks (list of `hwk.block.Disk` objects)
 
     Serial number of the device, if known
 
+  queue (`hwk.block.Queue` object)
+
+    The request queue settings and limits of the disk, from
+    /sys/block/$DISK/queue
+
+    `hwk.block.Queue` attributes:
+
+    scheduler (string)
+
+      The I/O scheduler in use, e.g. 'mq-deadline' or 'none'
+
+    schedulers (tuple of string)
+
+      The I/O schedulers available for the disk
+
+    nr_requests (int)
+
+      The most read and write requests that may be queued at once
+
+    read_ahead_kb (int)
+
+      The most kilobytes read ahead of sequential reads
+
+    rotational (bool)
+
+      True for spinning disks, False for solid state ones
+
+    logical_block_size (int)
+
+      The smallest unit the disk can address, in bytes, i.e. its sector size
+
+    physical_block_size (int)
+
+      The smallest unit the disk can write without a read-modify-write cycle
+
+    optimal_io_size (int)
+
+      The preferred size of requests in bytes, or 0 if the disk reports none,
+      e.g. the stripe width of a RAID controller's volumes
+
+    discard_max_bytes (int)
+
+      The most bytes discarded by a single request, or 0 if the disk does not
+      support discard (TRIM)
+
+    write_cache (string)
+
+      'write back' if the disk has a volatile write cache, otherwise 'write
+      through'
+
+    Any of these is None if the kernel does not report it.
+
   partitions (list of `hwk.block.Partition` objects)
 
     A list of partitions on this particular block device
@@ -82,6 +173,25 @@ partitions (list of `hwk.block.Partition` objects)
 
     Storage capacity of the partition
 
+  number (int)
+
+    The number of the partition in the disk's partition table
+
+  start_bytes (int)
+
+    The offset of the partition from the start of the disk
+
+  uuid (string)
+
+    The PARTUUID of the partition, the unique identifier GPT gives every
+    partition, or the disk signature and partition number for MBR
+    partitions, if known
+
+  label (string)
+
+    The PARTLABEL of the partition, the name a GPT partition may be given,
+    if any
+
   type (string)
 
     A string indicating the filesystem format/type of the partition, e.g.
@@ -94,12 +204,119 @@ partitions (list of `hwk.block.Partition` objects)
   is_readonly (bool)
 
     True if the partition is marked read-only
+
+  usage (`hwk.block.Usage` object)
+
+    The space and inodes used on the filesystem mounted on the partition, or
+    None if it is not mounted or did not report its usage within
+    `hwk.block.USAGE_TIMEOUT` seconds
+
+    `hwk.block.Usage` attributes:
+
+    total_bytes, used_bytes, available_bytes (int)
+
+      Size of the filesystem, bytes in use, and bytes available to
+      unprivileged users, which excludes space reserved for root
+
+    total_inodes, used_inodes, available_inodes (int)
+
+      The same, in inodes
+
+The vendor, serial_no, queue and partitions attributes of disks, and the type,
+mount_point and usage attributes of partitions, are determined on first
+access. Use `hwk.block.prefetch()` to determine them for many disks at once.
+
+Usage is determined with statvfs(), on a small pool of threads so that the
+filesystems mounted on many partitions are asked at once and one that never
+answers, such as a hung NFS or FUSE mount, delays discovery by at most
+`hwk.block.USAGE_TIMEOUT` seconds. Usage reported less than
+`hwk.block.USAGE_TTL` seconds earlier is reused.
+"""
+_STACK_HELP = """Storage stack
+===============================================================================
+`hwk.block.Stack` attributes:
+
+devices (dict of string to `hwk.block.Device` object)
+
+  Every block device of the host, keyed by kernel name, e.g. 'sda', 'sda1',
+  'md0' or 'dm-3'
+
+  `hwk.block.Device` attributes:
+
+  name (string)
+
+    The kernel name of the device
+
+  kind (string)
+
+    'disk', 'partition', 'loop', 'md', or for device mapper devices 'lvm',
+    'crypt', 'multipath' or 'dm'
+
+  size_bytes (int)
+
+    Size of the device
+
+  devno (string)
+
+    The device's major:minor number, e.g. '253:0'
+
+  parent (string)
+
+    For partitions, the name of the disk the partition is on
+
+  dm_name (string)
+
+    For device mapper devices, the name under /dev/mapper, e.g. 'vg0-root'
+
+  md_level (string)
+
+    For md devices, the RAID level, e.g. 'raid1'
+
+  slaves (tuple of string)
+
+    Names of the devices this device is built on
+
+  holders (tuple of string)
+
+    Names of the devices built on this device
+
+mounts (dict of string to string)
+
+  The name of the device mounted at each mount point
+
+`hwk.block.Stack` methods:
+
+Each accepts a device name, a /dev path, a device mapper name, a
+/dev/mapper path or a mount point, and raises KeyError for anything else.
+
+find(ref)
+
+  Returns the `hwk.block.Device`
+
+leaves(ref)
+
+  Returns the devices at the bottom of the stack under the device: the
+  partitions and disks with nothing below them. Partitions of md and device
+  mapper devices are not leaves: the leaves under them are those of the
+  device they are on.
+
+disks(ref)
+
+  Returns the disks under the device: its leaves, with partitions replaced
+  by the disks they are on
+
+raw_bytes(ref)
+
+  Returns the total size of the device's leaves, e.g. the raw capacity under
+  a logical volume on a RAID 1 array is twice the size of the array
 """
 
 
 class Info(object):
     """Object describing the block device information about a system."""
 
+    _SERIALIZED = ('total_size_bytes', 'disks')
+
     def __init__(self):
         self.total_size_bytes = None
         self.disks = []
@@ -117,18 +334,62 @@ class Info(object):
     def describe(self):
         return _INFO_HELP
 
+    def _prefetch(self):
+        prefetch(self.disks)
+
+    def to_dict(self):
+        return serialize.to_dict(self)
+
+    @classmethod
+    def from_dict(cls, data):
+        res = cls()
+        res.total_size_bytes = data['total_size_bytes']
+        res.disks = [Disk.from_dict(d) for d in data['disks']]
+        return res
+
 
 class Disk(object):
     """Object describing a disk block device."""
 
+    # Inventories of many hosts may be kept in memory, so disks, partitions
+    # and the other per-device objects have no per-instance __dict__. Lazy
+    # attributes are stored in the slot named for them with a leading
+    # underscore.
+    __slots__ = (
+        '_filesystem', 'name', 'size_bytes', 'bus_type', '_vendor',
+        '_serial_no', '_queue', '_partitions',
+    )
+    _SERIALIZED = (
+        'name', 'size_bytes', 'bus_type', 'vendor', 'serial_no', 'queue',
+        'partitions',
+    )
+
     def __init__(self, name, size_bytes=None, bus_type=None, vendor=None,
                  serial_no=None):
+        self._filesystem = fs.current()
         self.name = name
         self.size_bytes = size_bytes
         self.bus_type = bus_type
-        self.vendor = vendor
-        self.serial_no = serial_no
-        self.partitions = []
+        if vendor is not None:
+            self.vendor = vendor
+        if serial_no is not None:
+            self.serial_no = serial_no
+
+    @utils.lazy
+    def vendor(self):
+        return _linux_disk_vendor(self.name)
+
+    @utils.lazy
+    def serial_no(self):
+        return _linux_disk_serial_number(self.name)
+
+    @utils.lazy
+    def queue(self):
+        return _linux_disk_queue(self.name)
+
+    @utils.lazy
+    def partitions(self):
+        return _linux_partitions_on_disk(self)
 
     def __repr__(self):
         vendor_str = ''
@@ -145,26 +406,113 @@ class Disk(object):
             serial_str,
         )
 
+    def to_dict(self):
+        return serialize.to_dict(self)
+
+    @classmethod
+    def from_dict(cls, data):
+        res = cls(
+            name=data['name'],
+            size_bytes=data['size_bytes'],
+            bus_type=data['bus_type'],
+        )
+        # None is a valid vendor and serial number, which the constructor
+        # would take to mean "not yet determined"
+        res.vendor = data['vendor']
+        res.serial_no = data['serial_no']
+        # Serialized before disks had a queue
+        queue = data.get('queue')
+        res.queue = Queue.from_dict(queue) if queue is not None else None
+        res.partitions = [
+            Partition.from_dict(res, p) for p in data['partitions']
+        ]
+        return res
+
+
+class Queue(object):
+    """Object describing the request queue of a disk block device."""
+
+    __slots__ = (
+        'scheduler', 'schedulers', 'nr_requests', 'read_ahead_kb',
+        'rotational', 'logical_block_size', 'physical_block_size',
+        'optimal_io_size', 'discard_max_bytes', 'write_cache',
+    )
+    _SERIALIZED = __slots__
+
+    def __init__(self):
+        for name in self.__slots__:
+            setattr(self, name, None)
+
+    def __repr__(self):
+        return "queue (%s scheduler, %s-byte sectors, %s)" % (
+            self.scheduler,
+            self.logical_block_size,
+            'rotational' if self.rotational else 'non-rotational',
+        )
+
+    def to_dict(self):
+        return serialize.to_dict(self)
+
+    @classmethod
+    def from_dict(cls, data):
+        res = cls()
+        for name in cls._SERIALIZED:
+            setattr(res, name, data[name])
+        if res.schedulers is not None:
+            res.schedulers = tuple(res.schedulers)
+        return res
+
 
 class Partition(object):
     """Object describing a partition of a disk block device."""
 
+    __slots__ = (
+        '_filesystem', 'disk', 'name', 'size_bytes', 'number', 'start_bytes',
+        'uuid', 'label', 'is_readonly', '_type', '_mount_point', '_usage',
+    )
+    _SERIALIZED = (
+        'name', 'size_bytes', 'number', 'start_bytes', 'uuid', 'label', 'type',
+        'is_readonly', 'mount_point', 'usage',
+    )
+
     def __init__(self, disk, name=None, size_bytes=None, type=None,
-                 is_readonly=None, mount_point=None):
+                 is_readonly=None, mount_point=None, number=None,
+                 start_bytes=None, uuid=None, label=None):
+        self._filesystem = fs.current()
         self.disk = disk
         self.name = name
-        self.mount_point = mount_point
+        if mount_point is not None:
+            self.mount_point = mount_point
         self.size_bytes = size_bytes
-        self.type = type
+        self.number = number
+        self.start_bytes = start_bytes
+        self.uuid = uuid
+        self.label = label
+        if type is not None:
+            self.type = type
         self.is_readonly = is_readonly
 
+    @utils.lazy
+    def type(self):
+        return _linux_partition_mount(self.disk.name, self.name)[0]
+
+    @utils.lazy
+    def mount_point(self):
+        return _linux_partition_mount(self.disk.name, self.name)[1]
+
+    @utils.lazy
+    def usage(self):
+        if self.mount_point is None:
+            return None
+        return _linux_usages([self.mount_point])[self.mount_point]
+
     def __repr__(self):
         type_str = ''
         if self.type is not None:
-            type_str = " [" + self.type.decode('utf8') + "]"
+            type_str = " [" + self.type + "]"
         mount_str = ''
         if self.mount_point is not None:
-            mount_str = ' mounted@' + self.mount_point.decode('utf8')
+            mount_str = ' mounted@' + self.mount_point
         return "/dev/%s (%d MB) %s%s" % (
             self.name,
             math.floor((self.size_bytes or 0) / units.MB),
@@ -172,42 +520,119 @@ class Partition(object):
             mount_str,
         )
 
+    def to_dict(self):
+        return serialize.to_dict(self)
+
+    @classmethod
+    def from_dict(cls, disk, data):
+        res = cls(
+            disk,
+            name=data['name'],
+            size_bytes=data['size_bytes'],
+            is_readonly=data['is_readonly'],
+            # Serialized before partitions had these
+            number=data.get('number'),
+            start_bytes=data.get('start_bytes'),
+            uuid=data.get('uuid'),
+            label=data.get('label'),
+        )
+        res.type = data['type']
+        res.mount_point = data['mount_point']
+        # Serialized before partitions had a usage
+        usage = data.get('usage')
+        res.usage = Usage.from_dict(usage) if usage is not None else None
+        return res
+
+
+class Usage(object):
+    """Object describing the space and inodes used on a mounted filesystem."""
+
+    __slots__ = (
+        'total_bytes', 'used_bytes', 'available_bytes', 'total_inodes',
+        'used_inodes', 'available_inodes',
+    )
+    _SERIALIZED = __slots__
+
+    def __init__(self):
+        self.total_bytes = None
+        self.used_bytes = None
+        self.available_bytes = None
+        self.total_inodes = None
+        self.used_inodes = None
+        self.available_inodes = None
+
+    def __repr__(self):
+        return "usage (%d MB of %d MB used)" % (
+            math.floor(self.used_bytes / units.MB),
+            math.floor(self.total_bytes / units.MB),
+        )
+
+    def to_dict(self):
+        return serialize.to_dict(self)
+
+    @classmethod
+    def from_dict(cls, data):
+        res = cls()
+        for name in cls._SERIALIZED:
+            setattr(res, name, data[name])
+        return res
+
 
 def disks():
-    """Returns a list of `hwk.block.Disk` objects that describe all disk devices
-    the host system knows about.
+    """Returns a list of `hwk.block.Disk` objects that describe all disk
+    devices the host system knows about.
     """
     return {
         "Linux": _linux_disks,
-    }[platform.system()]()
+    }[fs.system()]()
 
 
-def _linux_disks():
+@trace.collector
+def _linux_disks(sizes=True):
     # In Linux, we could use the fdisk, lshw or blockdev commands to list disk
     # information, however all of these utilities require root privileges to
     # run. We can get all of this information by examining the /sys/block sysfs
     res = []
-    for filename in os.listdir(_LINUX_SYS_BLOCK_DIR):
-        # Hard drives start with an 's' or an 'h' (for SCSI and IDE) followed
-        # by a 'd'
-        if not (filename[0] in ('s', 'h') and filename[1] == 'd'):
+    for filename in fs.listdir(_LINUX_SYS_BLOCK_DIR):
+        bus_type = _linux_bus_type(filename)
+        if bus_type is None:
             continue
 
-        bus_type = 'SCSI' if filename[0] == 's' else 'IDE'
-        size_bytes = _linux_disk_size_bytes(filename)
+        size_bytes = _linux_disk_size_bytes(filename) if sizes else None
 
+        # The vendor, serial number and partitions are determined when first
+        # accessed
         d = Disk(name=filename, bus_type=bus_type, size_bytes=size_bytes)
-        d.vendor = _linux_disk_vendor(filename)
-        d.serial_no = _linux_disk_serial_number(filename)
-
-        d.partitions = _linux_partitions_on_disk(d)
-
         res.append(d)
 
     return res
 
 
-def _linux_disk_serial_number(disk):
+# The prefixes of the names the kernel gives disks on each bus
+_LINUX_DISK_PREFIXES = (
+    ('sd', 'SCSI'),
+    ('hd', 'IDE'),
+    ('nvme', 'NVMe'),
+    ('mmcblk', 'MMC'),
+    ('vd', 'virtio'),
+)
+
+
+def _linux_bus_type(name):
+    # Returns the bus type of the disk with the supplied name in /sys/block,
+    # or None if it is not a disk: /sys/block also lists loop, ram, md and
+    # device mapper devices, and the boot and RPMB hardware partitions of
+    # eMMC devices, e.g. mmcblk0boot0 and mmcblk0rpmb
+    for prefix, bus_type in _LINUX_DISK_PREFIXES:
+        if name.startswith(prefix):
+            if 'boot' in name or 'rpmb' in name:
+                return None
+            return bus_type
+    return None
+
+
+@trace.collector
+def _linux_disk_serial_numbers():
     # Finding the serial number of a disk without root privileges in Linux is
     # a little tricky. The /dev/disk/by-id directory contains a bunch of
     # symbolic links to disk devices and partitions. The serial number is
@@ -215,70 +640,551 @@ def _linux_disk_serial_number(disk):
     # primary SCSI disk (/dev/sda) is represented as a symbolic link named
     # /dev/disk/by-id/scsi-3600508e000000000f8253aac9a1abd0c. The serial
     # number is 3600508e000000000f8253aac9a1abd0c.
-    path = os.path.join(_LINUX_DEV_DISK_BY_ID)
-    for link in os.listdir(path):
+    #
+    # Returns a dict of disk name to serial number for every disk with a link
+    res = {}
+    try:
+        links = fs.listdir(_LINUX_DEV_DISK_BY_ID)
+    except OSError:
+        return res
+    for link in links:
         lpath = os.path.join(_LINUX_DEV_DISK_BY_ID, link)
-        dest = os.readlink(lpath)
-        dest = os.path.basename(dest)
-        if dest != disk:
-            continue
+        dest = os.path.basename(fs.readlink(lpath))
         parts = link.split("-")
-        return parts[1]
-    return "unknown"
+        if len(parts) > 1:
+            res.setdefault(dest, parts[1])
+    return res
+
+
+def _linux_disk_serial_number(disk):
+    return _linux_disk_serial_numbers().get(disk, "unknown")
 
 
+@trace.collector
 def _linux_disk_vendor(disk):
     # In Linux, we can find the vendor for the block storage device (disk) by
     # looking at /sys/block/$DEVICE/device/vendor file in sysfs
     path = os.path.join(_LINUX_SYS_BLOCK_DIR, disk, "device", "vendor")
     try:
-        contents = open(path, 'r').read()
+        contents = fs.open(path, 'r').read()
     except IOError:
         return "unknown"
-    return contents.strip()
+    return utils.intern_str(contents.strip())
+
+
+def _int(value):
+    return int(value) if value is not None else None
+
+
+def _scheduler(value):
+    # The scheduler file lists the schedulers available for the disk, with the
+    # one in use in brackets, e.g. 'mq-deadline kyber [bfq] none'. Devices
+    # without a choice have just 'none'.
+    if value is None:
+        return None, None
+    names = value.split()
+    current = None
+    for x, name in enumerate(names):
+        if name.startswith('['):
+            current = names[x] = name.strip('[]')
+    if current is None and len(names) == 1:
+        current = names[0]
+    return current, tuple(utils.intern_str(n) for n in names)
+
+
+@trace.collector
+def _linux_disk_queue(disk):
+    # Every file in /sys/block/$DEVICE/queue holds a single value, and all
+    # are readable without root privileges
+    path = _LINUX_SYS_BLOCK_DIR + disk + '/queue/'
+    res = Queue()
+    res.scheduler, res.schedulers = _scheduler(_read_str(path + 'scheduler'))
+    if res.scheduler is not None:
+        res.scheduler = utils.intern_str(res.scheduler)
+    for name in ('nr_requests', 'read_ahead_kb', 'logical_block_size',
+                 'physical_block_size', 'optimal_io_size',
+                 'discard_max_bytes'):
+        setattr(res, name, _int(_read_str(path + name)))
+    rotational = _read_str(path + 'rotational')
+    if rotational is not None:
+        res.rotational = rotational == '1'
+    write_cache = _read_str(path + 'write_cache')
+    if write_cache is not None:
+        res.write_cache = utils.intern_str(write_cache)
+    return res
 
 
-def _linux_partitions_on_disk(disk):
-    res = []
-    dev_name = disk.name
-    disk_dir = _LINUX_SYS_BLOCK_DIR + dev_name
-    for filename in os.listdir(disk_dir):
-        if not filename.startswith(dev_name):
-            continue
+def apply_queues(settings):
+    """Sets request queue attributes of many disks at once, and returns a
+    dict of disk name to the `hwk.block.Queue` object describing each disk's
+    queue afterwards. Requires root privileges.
+
+    settings is a dict, keyed by disk name, of dicts of the values to set
+    for any of the attributes listed in `hwk.block.QUEUE_SETTINGS`, e.g.:
+
+        >>> block.apply_queues({
+        ...     'sda': {'scheduler': 'mq-deadline', 'read_ahead_kb': 4096},
+        ...     'sdb': {'scheduler': 'mq-deadline', 'read_ahead_kb': 4096},
+        ... })
 
-        p = Partition(disk, name=filename)
-        p.type = _linux_partition_type(filename)
-        p.mount_point = _linux_partition_mount_point(filename)
-        p.size_bytes = _linux_partition_size_bytes(filename)
-        res.append(p)
+    Every value is checked against the current queue of its disk before
+    anything is set, and ValueError is raised for an unknown disk or
+    attribute, or a value the attribute cannot take, such as a scheduler the
+    disk does not offer. Once all are set, every attribute is read back, and
+    ValueError is raised naming any that the kernel adjusted or ignored, such
+    as nr_requests beyond what the device supports. IOError is raised if the
+    kernel refuses a value, or without root privileges, once the values
+    already set have been put back as they were.
+
+    The scheduler of each disk is set before its other attributes, since
+    switching scheduler resets nr_requests to the new scheduler's default.
+    """
+    return {
+        "Linux": _linux_apply_queues,
+    }[fs.system()](settings)
+
+
+def _queue_value(disk, queue, name, value):
+    # Returns the string to write to the named queue attribute of the disk
+    # for the supplied value, raising ValueError if the value is not valid
+    if name not in QUEUE_SETTINGS:
+        raise ValueError(
+            "%s: %s is not a queue setting; expected one of %s" % (
+                disk, name, ', '.join(QUEUE_SETTINGS)))
+    if name == 'scheduler':
+        if value not in (queue.schedulers or ()):
+            raise ValueError("%s: scheduler %r is not one of %s" % (
+                disk, value, ', '.join(queue.schedulers or ())))
+        return value
+    if name == 'write_cache':
+        if value not in _WRITE_CACHE_MODES:
+            raise ValueError("%s: write_cache %r is not one of %s" % (
+                disk, value, ', '.join(_WRITE_CACHE_MODES)))
+        return value
+    if name == 'rotational':
+        if not isinstance(value, bool):
+            raise ValueError("%s: rotational must be True or False" % disk)
+        return '1' if value else '0'
+    minimum = 1 if name == 'nr_requests' else 0
+    if isinstance(value, bool) or not isinstance(value, six.integer_types) \
+            or value < minimum:
+        raise ValueError("%s: %s must be an integer of at least %d" % (
+            disk, name, minimum))
+    return str(value)
+
+
+def _linux_write_queue(disk, name, value):
+    path = _LINUX_SYS_BLOCK_DIR + disk + '/queue/' + name
+    with fs.open(path, 'w') as f:
+        f.write(value)
+
+
+def _linux_apply_queues(settings):
+    # Switching the scheduler makes the kernel reset nr_requests to the new
+    # scheduler's default, so the scheduler of each disk is set first. The
+    # values read while checking are kept, and if the kernel refuses a value,
+    # those already written are put back before the IOError is raised.
+    writes = []
+    for disk in sorted(settings):
+        if not fs.isdir(_LINUX_SYS_BLOCK_DIR + disk):
+            raise ValueError("No such disk: %s" % disk)
+        queue = _linux_disk_queue(disk)
+        for name in sorted(settings[disk],
+                           key=lambda n: (n != 'scheduler', n)):
+            value = _queue_value(disk, queue, name, settings[disk][name])
+            try:
+                previous = _queue_value(
+                    disk, queue, name, getattr(queue, name))
+            except ValueError:
+                previous = None
+            writes.append((disk, name, value, previous))
+    for x, (disk, name, value, _previous) in enumerate(writes):
+        try:
+            _linux_write_queue(disk, name, value)
+        except IOError:
+            for done_disk, done_name, _value, previous in writes[:x]:
+                if previous is not None:
+                    try:
+                        _linux_write_queue(done_disk, done_name, previous)
+                    except IOError:
+                        pass
+            raise
+    res = dict((disk, _linux_disk_queue(disk)) for disk in settings)
+    ignored = []
+    for disk in sorted(settings):
+        for name, value in sorted(settings[disk].items()):
+            actual = getattr(res[disk], name)
+            if actual != value:
+                ignored.append('%s %s is %r, not %r' % (
+                    disk, name, actual, value))
+    if ignored:
+        raise ValueError(
+            "Queue settings not applied: %s" % '; '.join(ignored))
     return res
 
 
-def _linux_partition_type(part_name):
-    if not part_name.startswith('/dev'):
-        part_name = '/dev/' + part_name
-    cmd = ['findmnt', part_name, '--noheadings', '--output', 'FSTYPE']
+def _uevent(path):
+    # Returns the KEY=value lines of a sysfs uevent file as a dict
+    res = {}
     try:
-        out = subprocess.check_output(cmd).strip()
-        return out
-    except subprocess.CalledProcessError:
-        # Not mounted...
-        return None
+        lines = fs.open(path, 'r').readlines()
+    except IOError:
+        return res
+    for line in lines:
+        key, sep, value = line.strip().partition('=')
+        if sep:
+            res[key] = value
+    return res
 
 
-def _linux_partition_mount_point(part_name):
-    """Given a partition name, returns the mount point for the partition, or
-    None if not mounted.
-    """
-    if not part_name.startswith('/dev'):
-        part_name = '/dev/' + part_name
-    cmd = ['findmnt', part_name, '--noheadings', '--output', 'TARGET']
+def _linux_partuuids():
+    # Returns a dict of partition name to PARTUUID from the links udev
+    # creates in /dev/disk/by-partuuid
+    res = {}
     try:
-        out = subprocess.check_output(cmd)
-        return out.strip()
-    except subprocess.CalledProcessError:
-        # Not mounted...
-        return None
+        links = fs.listdir(_LINUX_DEV_DISK_BY_PARTUUID)
+    except OSError:
+        return res
+    for link in links:
+        dest = fs.readlink(_LINUX_DEV_DISK_BY_PARTUUID + link)
+        res[os.path.basename(dest)] = link
+    return res
+
+
+@trace.collector
+def _linux_partitions(disk=None):
+    # Every partition has a directory in /sys/class/block, as every block
+    # device does, which is a link to its directory under that of the disk it
+    # is on, e.g. /sys/class/block/nvme0n1p1 links to
+    # ../../devices/pci0000:00/0000:00:1d.0/nvme/nvme0/nvme0n1/nvme0n1p1, so
+    # the disk is the name of the parent directory. Guessing the disk from the
+    # partition's name does not work: nvme0n1p1 and mmcblk0p2 are on nvme0n1
+    # and mmcblk0.
+    #
+    # The uevent file of a partition looks like the following:
+    #
+    # MAJOR=259
+    # MINOR=1
+    # DEVNAME=nvme0n1p1
+    # DEVTYPE=partition
+    # PARTN=1
+    # PARTNAME=EFI System Partition
+    #
+    # PARTNAME is the GPT partition name, i.e. the PARTLABEL, and is missing
+    # if there is none. The kernel does not include the PARTUUID, so unless
+    # it is there it is looked up in /dev/disk/by-partuuid. The start and
+    # size files hold the partition's offset and size in 512-byte units.
+    #
+    # If disk is supplied, only the partitions of that disk are looked for,
+    # in the directories named after it in /sys/block/<disk>, rather than
+    # every block device of the system.
+    #
+    # Returns a dict, keyed by disk name, of lists of the keyword arguments
+    # for creating `Partition` objects
+    res = {}
+    uuids = None
+    if disk is None:
+        base = _LINUX_SYS_CLASS_BLOCK_DIR
+        names = fs.listdir(base)
+    else:
+        base = _LINUX_SYS_BLOCK_DIR + disk + '/'
+        try:
+            names = [n for n in fs.listdir(base) if n.startswith(disk)]
+        except OSError:
+            return res
+    for name in sorted(names):
+        path = base + name
+        uevent = _uevent(path + '/uevent')
+        if uevent.get('DEVTYPE') != 'partition':
+            continue
+        if disk is None:
+            on = os.path.basename(os.path.dirname(fs.realpath(path)))
+        else:
+            on = disk
+        uuid = uevent.get('PARTUUID')
+        if uuid is None:
+            if uuids is None:
+                uuids = _linux_partuuids()
+            uuid = uuids.get(name)
+        start = _read_str(path + '/start')
+        size = _read_str(path + '/size')
+        res.setdefault(on, []).append(dict(
+            name=name,
+            number=_int(uevent.get('PARTN')),
+            start_bytes=_int(start) * _SYSFS_SECTOR_SIZE if start else None,
+            size_bytes=_int(size) * _SYSFS_SECTOR_SIZE if size else None,
+            uuid=uuid,
+            label=uevent.get('PARTNAME'),
+        ))
+    return res
+
+
+def _linux_partitions_on_disk(disk, partitions=None):
+    # The type and mount point are determined when first accessed. Without
+    # the partitions of every disk to pick from, only the disk's own are
+    # read.
+    if partitions is None:
+        partitions = _linux_partitions(disk.name)
+    return [Partition(disk, **kw) for kw in partitions.get(disk.name, ())]
+
+
+@trace.collector
+def _linux_mounts():
+    # We used to run `findmnt` twice for each partition to find its filesystem
+    # type and mount point, but findmnt just reads /proc/self/mountinfo, so we
+    # read it once ourselves. Lines look like the following:
+    #
+    # 25 1 8:6 / / rw,relatime shared:1 - ext4 /dev/sda6 rw,errors=remount-ro
+    #
+    # The third field is the major:minor number of the mounted device and the
+    # fifth is the mount point. After the '-' separator come the filesystem
+    # type and the mount source.
+    #
+    # Returns a dict, keyed by both mount source and major:minor number, of
+    # (filesystem type, mount point) tuples for the first mount of each device
+    res = {}
+    try:
+        lines = fs.open(_LINUX_PROC_SELF_MOUNTINFO, 'r').readlines()
+    except IOError:
+        return res
+    for line in lines:
+        fields = line.split()
+        try:
+            sep = fields.index('-')
+        except ValueError:
+            continue
+        if len(fields) < sep + 3:
+            continue
+        mount = (
+            utils.intern_str(fields[sep + 1]),
+            utils.unescape_octal(fields[4]),
+        )
+        res.setdefault(utils.unescape_octal(fields[sep + 2]), mount)
+        res.setdefault(fields[2], mount)
+    return res
+
+
+def _linux_partition_mount(disk_name, part_name, mounts=None):
+    # Returns a tuple of (filesystem type, mount point) for the partition, or
+    # (None, None) if it is not mounted. The mount source of the root
+    # filesystem may be reported as /dev/root, so we fall back to matching
+    # the partition's major:minor number
+    if mounts is None:
+        mounts = _linux_mounts()
+    res = mounts.get('/dev/' + part_name)
+    if res is None:
+        path = os.path.join(_LINUX_SYS_BLOCK_DIR, disk_name, part_name, 'dev')
+        try:
+            res = mounts.get(fs.open(path, 'r').read().strip())
+        except IOError:
+            pass
+    return res or (None, None)
+
+
+class _Statvfs(object):
+    # A statvfs() call made by a `_StatvfsPool` thread
+
+    __slots__ = ('filesystem', 'path', 'submitted', 'done', 'result')
+
+    def __init__(self, filesystem, path):
+        self.filesystem = filesystem
+        self.path = path
+        self.submitted = time.time()
+        self.done = threading.Event()
+        self.result = None
+
+
+class _StatvfsPool(object):
+    # Makes statvfs() calls on daemon threads, started as they are needed. A
+    # call to a filesystem that does not answer blocks its thread for as long
+    # as it takes, which may be forever, so no call is made for a path while
+    # an earlier call for it is still in progress. The earlier call is
+    # returned instead, and a hung mount ties up at most one thread however
+    # often it is asked about. At most `workers` threads run calls submitted
+    # less than USAGE_TIMEOUT ago: threads stuck on older calls, which their
+    # callers have given up waiting for, are not counted, so hung mounts do
+    # not starve the others of threads.
+
+    def __init__(self, workers):
+        self._workers = workers
+        self._threads = 0
+        self._idle = 0
+        # The call each busy thread is making, by thread
+        self._running = {}
+        self._queue = collections.deque()
+        self._pending = {}
+        self._cond = threading.Condition()
+
+    def submit(self, filesystem, path):
+        key = (filesystem.key, path)
+        with self._cond:
+            call = self._pending.get(key)
+            if call is None:
+                call = self._pending[key] = _Statvfs(filesystem, path)
+                self._queue.append(call)
+                self._cond.notify()
+            # Calls submitted earlier may still be waiting behind threads
+            # that have since got stuck, so threads are started even when the
+            # call was already pending
+            self._start_threads()
+        return call
+
+    def _start_threads(self):
+        # Called with the lock held
+        now = time.time()
+        running = self._threads - len([
+            c for c in self._running.values()
+            if now - c.submitted >= USAGE_TIMEOUT
+        ])
+        while len(self._queue) > self._idle and running < self._workers:
+            running += 1
+            self._threads += 1
+            self._idle += 1
+            thread = threading.Thread(target=self._run)
+            thread.daemon = True
+            thread.start()
+
+    def _run(self):
+        me = threading.current_thread()
+        while True:
+            with self._cond:
+                while not self._queue:
+                    self._cond.wait()
+                call = self._queue.popleft()
+                self._idle -= 1
+                self._running[me] = call
+            try:
+                call.result = call.filesystem.statvfs(call.path)
+            except (IOError, OSError):
+                pass
+            with self._cond:
+                del self._running[me]
+                self._idle += 1
+                del self._pending[(call.filesystem.key, call.path)]
+            call.done.set()
+
+
+_statvfs_pool = _StatvfsPool(_USAGE_WORKERS)
+# (time, `Usage` or None) tuples keyed by filesystem key and mount point
+_usage_cache = {}
+
+
+def _usage(st):
+    res = Usage()
+    res.total_bytes = st.f_blocks * st.f_frsize
+    res.used_bytes = (st.f_blocks - st.f_bfree) * st.f_frsize
+    res.available_bytes = st.f_bavail * st.f_frsize
+    res.total_inodes = st.f_files
+    res.used_inodes = st.f_files - st.f_ffree
+    res.available_inodes = st.f_favail
+    return res
+
+
+@trace.collector
+def _linux_usages(mount_points):
+    # Returns a dict of mount point to the `Usage` of the filesystem mounted
+    # there, or None if it could not be determined in time. The calls for all
+    # mount points are made at once and waited for together, so the wait is
+    # bounded by USAGE_TIMEOUT however many filesystems do not answer.
+    # Timeouts are not cached, so a filesystem that recovers is reported as
+    # soon as it answers.
+    filesystem = fs.current()
+    now = time.time()
+    res = {}
+    calls = {}
+    for mount_point in mount_points:
+        key = (filesystem.key, mount_point)
+        cached = _usage_cache.get(key)
+        if cached is not None and now - cached[0] < USAGE_TTL:
+            res[mount_point] = cached[1]
+        elif mount_point not in calls:
+            calls[mount_point] = _statvfs_pool.submit(filesystem, mount_point)
+    # The deadline is set once every call has been submitted, so by the time
+    # it passes, the pool counts the calls still running as stuck. Waits may
+    # return a little early, so they are repeated until it has passed.
+    deadline = time.time() + USAGE_TIMEOUT
+    for mount_point, call in calls.items():
+        res[mount_point] = None
+        done = call.done.wait(max(0.0, deadline - time.time()))
+        while not done and time.time() < deadline:
+            done = call.done.wait(max(0.0, deadline - time.time()))
+        if done:
+            if call.result is not None:
+                res[mount_point] = _usage(call.result)
+            _usage_cache[(filesystem.key, mount_point)] = (
+                time.time(), res[mount_point])
+    return res
+
+
+def prefetch(disks, fields=None):
+    """Determines the named attributes, by default all of those listed in
+    `hwk.block.PREFETCH_FIELDS`, of the supplied `hwk.block.Disk` objects and
+    their partitions, probing the host once for all disks where possible
+    rather than once for each. Attributes already determined are left as
+    they are.
+    """
+    fields = utils.included(fields, PREFETCH_FIELDS)
+    if not disks:
+        return
+    with fs.on_host(disks[0]._filesystem):
+        {
+            "Linux": _linux_prefetch,
+        }[fs.system()](disks, fields)
+
+
+def _linux_prefetch(disks, fields):
+    lazy_vendor = Disk.__dict__['vendor']
+    lazy_serial_no = Disk.__dict__['serial_no']
+    lazy_type = Partition.__dict__['type']
+    lazy_mount_point = Partition.__dict__['mount_point']
+    if 'vendor' in fields:
+        for d in disks:
+            if not lazy_vendor.is_resolved(d):
+                d.vendor = _linux_disk_vendor(d.name)
+    if 'queue' in fields:
+        lazy_queue = Disk.__dict__['queue']
+        for d in disks:
+            if not lazy_queue.is_resolved(d):
+                d.queue = _linux_disk_queue(d.name)
+    if 'serial_no' in fields:
+        serials = None
+        for d in disks:
+            if not lazy_serial_no.is_resolved(d):
+                if serials is None:
+                    serials = _linux_disk_serial_numbers()
+                d.serial_no = serials.get(d.name, "unknown")
+    part_fields = fields & set(('type', 'mount_point', 'usage'))
+    if 'partitions' not in fields and not part_fields:
+        return
+    lazy_partitions = Disk.__dict__['partitions']
+    partitions = None
+    for d in disks:
+        if not lazy_partitions.is_resolved(d):
+            if partitions is None:
+                partitions = _linux_partitions()
+            d.partitions = _linux_partitions_on_disk(d, partitions)
+    parts = [p for d in disks for p in d.partitions]
+    if not part_fields:
+        return
+    mounts = None
+    for p in parts:
+        if lazy_type.is_resolved(p) and lazy_mount_point.is_resolved(p):
+            continue
+        if mounts is None:
+            mounts = _linux_mounts()
+        fstype, mount_point = _linux_partition_mount(
+            p.disk.name, p.name, mounts)
+        if not lazy_type.is_resolved(p):
+            p.type = fstype
+        if not lazy_mount_point.is_resolved(p):
+            p.mount_point = mount_point
+    if 'usage' in fields:
+        lazy_usage = Partition.__dict__['usage']
+        parts = [p for p in parts if not lazy_usage.is_resolved(p)]
+        usages = _linux_usages(
+            [p.mount_point for p in parts if p.mount_point is not None])
+        for p in parts:
+            p.usage = usages.get(p.mount_point)
 
 
 def disk_size_bytes(disk_name):
@@ -287,24 +1193,10 @@ def disk_size_bytes(disk_name):
     """
     return {
         "Linux": _linux_disk_size_bytes,
-    }[platform.system()](disk_name)
-
-
-def _linux_partition_size_bytes(part_name):
-    # In Linux, we could use the fdisk, lshw or blockdev commands to grab disk
-    # size information, however all of these utilities require root privileges
-    # to run. We can instead find the number of 512-byte sectors for disk
-    # disks by examining the contents of /sys/block/$DEVICE/$PARTITION/size and
-    # calculate the physical bytes accordingly.
-    if part_name.startswith('/dev'):
-        part_name = part_name[5:]  # Strip the /dev/
-    disk_name = part_name[0:3]
-    path = os.path.join(_LINUX_SYS_BLOCK_DIR, disk_name, part_name, 'size')
-    if os.path.exists(path):
-        return int(open(path, 'rb').read()) * _SECTOR_SIZE
-    return 0
+    }[fs.system()](disk_name)
 
 
+@trace.collector
 def _linux_disk_size_bytes(disk_name):
     # In Linux, we could use the fdisk, lshw or blockdev commands to grab disk
     # size information, however all of these utilities require root privileges
@@ -312,8 +1204,8 @@ def _linux_disk_size_bytes(disk_name):
     # disks by examining the contents of /sys/block/$DEVICE/size and
     # calculate the physical bytes accordingly.
     path = os.path.join(_LINUX_SYS_BLOCK_DIR, disk_name, 'size')
-    if os.path.exists(path):
-        return int(open(path, 'rb').read()) * _SECTOR_SIZE
+    if fs.exists(path):
+        return int(fs.open(path, 'rb').read()) * _SYSFS_SECTOR_SIZE
     return 0
 
 
@@ -323,25 +1215,262 @@ def total_size_bytes():
     """
     return {
         "Linux": _linux_total_size_bytes,
-    }[platform.system()]()
+    }[fs.system()]()
 
 
-def _linux_total_size_bytes():
-    return sum(d.size_bytes for d in _linux_disks())
+def _linux_total_size_bytes(disks=None):
+    if disks is None:
+        disks = _linux_disks()
+    return sum(d.size_bytes for d in disks)
 
 
-def info():
+def info(include=None):
     """Returns a `hwk.block.Info` object containing information on the disk
     block devices available to the system, or None if the information could not
     be determined.
+
+    If include is supplied, only the fields it names, from those listed in
+    `hwk.block.FIELDS`, are determined, together with the disk names and bus
+    types. The host is only probed for what those fields need: for example,
+    include=['size_bytes'] reads nothing but /sys/block. Fields that are
+    otherwise determined on first access are determined for all disks at once,
+    as `hwk.block.prefetch()` does.
     """
+    fields = utils.included(include, FIELDS)
     return {
         "Linux": _linux_info,
-    }[platform.system()]()
+    }[fs.system()](fields, include is not None)
 
 
-def _linux_info():
+@trace.collector
+def _linux_info(fields, prefetch):
     res = Info()
-    res.total_size_bytes = _linux_total_size_bytes()
-    res.disks = _linux_disks()
+    res.disks = _linux_disks('size_bytes' in fields)
+    if 'size_bytes' in fields:
+        res.total_size_bytes = _linux_total_size_bytes(res.disks)
+    if prefetch:
+        _linux_prefetch(res.disks, fields & set(PREFETCH_FIELDS))
     return res
+
+
+class Device(object):
+    """Object describing a block device and the devices it is built on."""
+
+    __slots__ = (
+        'name', 'kind', 'size_bytes', 'devno', 'parent', 'dm_name',
+        'md_level', 'slaves', 'holders',
+    )
+    _SERIALIZED = __slots__
+
+    def __init__(self, name):
+        self.name = name
+        self.kind = None
+        self.size_bytes = None
+        self.devno = None
+        self.parent = None
+        self.dm_name = None
+        self.md_level = None
+        self.slaves = ()
+        self.holders = ()
+
+    def __repr__(self):
+        kind_str = self.kind
+        if self.md_level is not None:
+            kind_str += ' ' + self.md_level
+        name_str = ''
+        if self.dm_name is not None:
+            name_str = ' (' + self.dm_name + ')'
+        return "/dev/%s%s [%s] (%d MB)" % (
+            self.name,
+            name_str,
+            kind_str,
+            math.floor((self.size_bytes or 0) / units.MB),
+        )
+
+    def to_dict(self):
+        return serialize.to_dict(self)
+
+    @classmethod
+    def from_dict(cls, data):
+        res = cls(data['name'])
+        for name in cls._SERIALIZED[1:]:
+            setattr(res, name, data[name])
+        res.slaves = tuple(res.slaves)
+        res.holders = tuple(res.holders)
+        return res
+
+
+class Stack(object):
+    """Object describing how the block devices of a system are built on each
+    other, as a directed acyclic graph from devices to the devices they are
+    built on.
+    """
+
+    _SERIALIZED = ('devices', 'mounts')
+
+    def __init__(self, devices=(), mounts=None):
+        self.devices = dict((d.name, d) for d in devices)
+        self.mounts = mounts or {}
+        # The leaves under every device, and every name a device may be
+        # referred to by, are determined once so that queries never walk the
+        # graph
+        self._leaves = {}
+        for name in self.devices:
+            self._index_leaves(name)
+        self._refs = {}
+        for d in self.devices.values():
+            self._refs[d.name] = d
+            self._refs['/dev/' + d.name] = d
+            if d.dm_name is not None:
+                self._refs[d.dm_name] = d
+                self._refs['/dev/mapper/' + d.dm_name] = d
+
+    def _index_leaves(self, name):
+        res = self._leaves.get(name)
+        if res is None:
+            d = self.devices[name]
+            slaves = [s for s in d.slaves if s in self.devices]
+            if slaves:
+                res = frozenset().union(
+                    *[self._index_leaves(s) for s in slaves])
+            else:
+                res = frozenset([name])
+                # A partition of a stacked device, e.g. md126p1, sits on
+                # its parent's leaves rather than on a disk of its own
+                if d.parent in self.devices:
+                    below = self._index_leaves(d.parent)
+                    if below != frozenset([d.parent]):
+                        res = below
+            self._leaves[name] = res
+        return res
+
+    def __repr__(self):
+        return "storage stack (%d block devices, %d mounted)" % (
+            len(self.devices),
+            len(self.mounts),
+        )
+
+    def describe(self):
+        return _STACK_HELP
+
+    def find(self, ref):
+        try:
+            return self._refs[ref]
+        except KeyError:
+            return self.devices[self.mounts[ref]]
+
+    def leaves(self, ref):
+        return [
+            self.devices[name]
+            for name in sorted(self._leaves[self.find(ref).name])
+        ]
+
+    def disks(self, ref):
+        names = set(d.parent or d.name for d in self.leaves(ref))
+        return [self.devices[name] for name in sorted(names)]
+
+    def raw_bytes(self, ref):
+        return sum(d.size_bytes or 0 for d in self.leaves(ref))
+
+    def to_dict(self):
+        return {
+            'devices': [
+                self.devices[name].to_dict() for name in sorted(self.devices)
+            ],
+            'mounts': dict(self.mounts),
+        }
+
+    @classmethod
+    def from_dict(cls, data):
+        return cls(
+            [Device.from_dict(d) for d in data['devices']],
+            data['mounts'],
+        )
+
+
+def stack():
+    """Returns a `hwk.block.Stack` object describing how the block devices of
+    the host are built on each other, e.g. an LVM logical volume on a
+    dm-crypt device on an md RAID array of partitions of two disks.
+    """
+    return {
+        "Linux": _linux_stack,
+    }[fs.system()]()
+
+
+def _read_str(path):
+    try:
+        return fs.open(path, 'r').read().strip()
+    except IOError:
+        return None
+
+
+def _listdir(path):
+    try:
+        return tuple(sorted(fs.listdir(path)))
+    except OSError:
+        return ()
+
+
+# The prefixes of the UUIDs that LVM, cryptsetup and multipathd give the
+# device mapper devices they create
+_DM_UUID_KINDS = (
+    ('LVM-', 'lvm'),
+    ('CRYPT-', 'crypt'),
+    ('mpath-', 'multipath'),
+)
+
+
+@trace.collector
+def _linux_stack():
+    # Every block device, whether a disk, a partition, an md array or a device
+    # mapper device, has a directory in /sys/class/block containing:
+    #
+    # dev: the major:minor number
+    # size: the size in 512-byte sectors
+    # partition: only present for partitions, whose directory is inside the
+    #   directory of the disk they are on
+    # slaves/: an entry for each device this device is built on
+    # holders/: an entry for each device built on this device
+    # dm/name, dm/uuid: for device mapper devices
+    # md/level: for md devices
+    devices = []
+    by_devno = {}
+    for name in fs.listdir(_LINUX_SYS_CLASS_BLOCK_DIR):
+        path = _LINUX_SYS_CLASS_BLOCK_DIR + name
+        d = Device(name)
+        d.devno = _read_str(path + '/dev')
+        size = _read_str(path + '/size')
+        if size is not None:
+            d.size_bytes = int(size) * _SYSFS_SECTOR_SIZE
+        d.slaves = _listdir(path + '/slaves')
+        d.holders = _listdir(path + '/holders')
+        # Partitions come first, since md and device mapper devices may be
+        # partitioned themselves, e.g. md126p1
+        if fs.exists(path + '/partition'):
+            d.kind = 'partition'
+            d.parent = os.path.basename(
+                os.path.dirname(fs.realpath(path)))
+        elif name.startswith('dm-'):
+            d.dm_name = _read_str(path + '/dm/name')
+            uuid = _read_str(path + '/dm/uuid') or ''
+            d.kind = 'dm'
+            for prefix, kind in _DM_UUID_KINDS:
+                if uuid.startswith(prefix):
+                    d.kind = kind
+                    break
+        elif name.startswith('md'):
+            d.kind = 'md'
+            d.md_level = _read_str(path + '/md/level')
+        elif name.startswith('loop'):
+            d.kind = 'loop'
+        else:
+            d.kind = 'disk'
+        devices.append(d)
+        by_devno[d.devno] = name
+    mounts = {}
+    for key, (fstype, mount_point) in _linux_mounts().items():
+        name = by_devno.get(key)
+        if name is not None:
+            mounts[mount_point] = name
+    return Stack(devices, mounts)
@@ -0,0 +1,216 @@
+# -*- coding: utf-8 -*-
+
+# Licensed under the Apache License, Version 2.0 (the "License"); you may
+# not use this file except in compliance with the License. You may obtain
+# a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+# WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+# License for the specific language governing permissions and limitations
+# under the License.
+
+import os
+
+from hwk import fs
+from hwk import trace
+from hwk import utils
+
+_LINUX_PROC_SELF_CGROUP = '/proc/self/cgroup'
+_LINUX_PROC_SELF_MOUNTINFO = '/proc/self/mountinfo'
+# cgroup v1 reports "no limit" as the largest multiple of the page size that
+# fits in a signed 64-bit integer. Anything above this is unlimited.
+_V1_UNLIMITED_BYTES = 1 << 62
+
+
+def _mounts():
+    # Lines of /proc/self/mountinfo look like the following:
+    #
+    # 33 32 0:29 / /sys/fs/cgroup/cpu rw,relatime - cgroup cgroup rw,cpu
+    # 42 32 0:38 / /sys/fs/cgroup/unified rw,relatime - cgroup2 cgroup2 rw
+    #
+    # The fourth field is the root of the mount within the filesystem and the
+    # fifth is the mount point. After the '-' separator come the filesystem
+    # type, the mount source and the per-superblock options, which for cgroup
+    # v1 include the names of the controllers bound to the hierarchy.
+    res = []
+    try:
+        lines = fs.open(_LINUX_PROC_SELF_MOUNTINFO, 'r').readlines()
+    except IOError:
+        return res
+    for line in lines:
+        fields = line.split()
+        try:
+            sep = fields.index('-')
+        except ValueError:
+            continue
+        fstype = fields[sep + 1]
+        if fstype not in ('cgroup', 'cgroup2'):
+            continue
+        options = set(fields[sep + 3].split(',')) if len(fields) > sep + 3 \
+            else set()
+        res.append((
+            fstype,
+            utils.unescape_octal(fields[3]),
+            utils.unescape_octal(fields[4]),
+            options,
+        ))
+    return res
+
+
+def _memberships():
+    # Lines of /proc/self/cgroup look like 'hierarchy-ID:controllers:path'.
+    # cgroup v2 has a single line with an ID of 0 and no controllers, e.g.
+    # '0::/user.slice/session-1.scope'
+    res = []
+    try:
+        lines = fs.open(_LINUX_PROC_SELF_CGROUP, 'r').readlines()
+    except IOError:
+        return res
+    for line in lines:
+        parts = line.rstrip('\n').split(':', 2)
+        if len(parts) != 3:
+            continue
+        controllers = set(c for c in parts[1].split(',') if c)
+        res.append((parts[0], controllers, parts[2]))
+    return res
+
+
+def _cgroup_dirs(mount_root, mount_point, path):
+    # Returns the cgroup directory for the process and each of its ancestors up
+    # to the mount point, innermost first. Inside a container without a cgroup
+    # namespace, the path in /proc/self/cgroup is relative to the host's root
+    # cgroup while the container only has its own cgroup mounted, so we strip
+    # the mount's root from the path and fall back to the mount point itself if
+    # the directory does not exist.
+    if mount_root != '/':
+        if path == mount_root or path.startswith(mount_root + '/'):
+            path = path[len(mount_root):]
+    leaf = os.path.join(mount_point, path.lstrip('/'))
+    if not fs.isdir(leaf):
+        leaf = mount_point
+    mount_point = os.path.normpath(mount_point)
+    res = [os.path.normpath(leaf)]
+    while res[-1] != mount_point and res[-1] != os.path.dirname(res[-1]):
+        res.append(os.path.dirname(res[-1]))
+    return res
+
+
+def controller_dirs(controller):
+    """Given a cgroup controller name, e.g. 'cpu' or 'memory', returns a tuple
+    of (version, dirs), where version is 1 or 2 and dirs is a list of the
+    cgroup directories of the calling process and its ancestors, innermost
+    first. Returns (None, []) if the process is not in a cgroup with that
+    controller.
+
+    On hosts using the "hybrid" layout, a controller bound to a cgroup v1
+    hierarchy takes precedence over the v2 unified hierarchy.
+    """
+    mounts = _mounts()
+    unified_path = None
+    for hierarchy_id, controllers, path in _memberships():
+        if hierarchy_id == '0' and not controllers:
+            unified_path = path
+            continue
+        if controller not in controllers:
+            continue
+        for fstype, root, mount_point, options in mounts:
+            if fstype == 'cgroup' and controller in options:
+                return 1, _cgroup_dirs(root, mount_point, path)
+    if unified_path is not None:
+        for fstype, root, mount_point, options in mounts:
+            if fstype == 'cgroup2':
+                return 2, _cgroup_dirs(root, mount_point, unified_path)
+    return None, []
+
+
+def _read(dirname, filename):
+    try:
+        return fs.open(os.path.join(dirname, filename), 'r').read().strip()
+    except IOError:
+        return None
+
+
+@trace.collector
+def cpu_quota():
+    """Returns the number of CPUs' worth of time, as a float, the calling
+    process may use per scheduling period according to the CFS bandwidth
+    limits of its cgroup and the cgroup's ancestors, or None if unlimited.
+    """
+    version, dirs = controller_dirs('cpu')
+    res = None
+    for dirname in dirs:
+        quota = None
+        if version == 2:
+            # cpu.max contains '$MAX $PERIOD', where $MAX may be 'max'
+            contents = _read(dirname, 'cpu.max')
+            if contents:
+                parts = contents.split()
+                if parts[0] != 'max' and len(parts) == 2:
+                    quota = float(parts[0]) / float(parts[1])
+        else:
+            # cpu.cfs_quota_us is -1 if there is no limit
+            q = _read(dirname, 'cpu.cfs_quota_us')
+            p = _read(dirname, 'cpu.cfs_period_us')
+            if q and p and int(q) > 0 and int(p) > 0:
+                quota = float(q) / float(p)
+        if quota is not None and (res is None or quota < res):
+            res = quota
+    return res
+
+
+@trace.collector
+def cpuset_cpus():
+    """Returns a `hwk.utils.ProcessorSet` of the logical processors the calling
+    process' cpuset cgroup allows it to use, or None if there is no cpuset
+    cgroup.
+    """
+    version, dirs = controller_dirs('cpuset')
+    filename = 'cpuset.cpus.effective' if version == 2 \
+        else 'cpuset.effective_cpus'
+    for dirname in dirs:
+        contents = _read(dirname, filename)
+        if contents is None and version == 1:
+            # Kernels before 4.17 have no effective_cpus in cgroup v1
+            contents = _read(dirname, 'cpuset.cpus')
+        if contents:
+            return utils.ProcessorSet.from_cpulist(contents)
+    return None
+
+
+@trace.collector
+def memory_limits():
+    """Returns a tuple of (max bytes, high bytes) of memory the calling
+    process' cgroup and its ancestors allow, either of which may be None if
+    unlimited.
+
+    The max limit is a hard limit beyond which the OOM killer is invoked. The
+    high limit is a throttling threshold above which the kernel aggressively
+    reclaims memory. cgroup v1 has no equivalent of the high limit.
+    """
+    version, dirs = controller_dirs('memory')
+    limit = None
+    high = None
+
+    def _bytes(contents):
+        if not contents or contents == 'max':
+            return None
+        value = int(contents)
+        if value >= _V1_UNLIMITED_BYTES:
+            return None
+        return value
+
+    for dirname in dirs:
+        if version == 2:
+            max_bytes = _bytes(_read(dirname, 'memory.max'))
+            high_bytes = _bytes(_read(dirname, 'memory.high'))
+        else:
+            max_bytes = _bytes(_read(dirname, 'memory.limit_in_bytes'))
+            high_bytes = None
+        if max_bytes is not None and (limit is None or max_bytes < limit):
+            limit = max_bytes
+        if high_bytes is not None and (high is None or high_bytes < high):
+            high = high_bytes
+    return limit, high
@@ -0,0 +1,280 @@
+# -*- coding: utf-8 -*-
+
+# Licensed under the Apache License, Version 2.0 (the "License"); you may
+# not use this file except in compliance with the License. You may obtain
+# a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+# WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+# License for the specific language governing permissions and limitations
+# under the License.
+
+"""The `hwk` command, which prints what hwk discovers about the host:
+
+    $ hwk
+    $ hwk --json --only cpu,net
+    $ hwk --only net,block --fields mac,driver,size_bytes
+    $ hwk --watch 5
+    $ hwk capture -o host-0042.json.gz
+    $ hwk replay host-0042.json.gz cpu topology
+
+Each module's information is printed as soon as the module has been
+collected, as text or, with `--json`, as one `hwk.serialize.envelope()`
+document per line.
+
+With `--watch INTERVAL`, the host is collected again every INTERVAL seconds
+by a single `hwk.diff.Collector`, which only re-probes what may have changed,
+and only the changes are printed, along with the utilization of the CPUs
+over the interval when the cpu module is selected.
+
+The `capture` and `replay` subcommands record what hwk reads from the host
+into a snapshot and print what hwk discovers from one, as `hwk.snapshot`'s
+command does.
+"""
+
+import argparse
+import importlib
+import json
+import sys
+import time
+
+import six
+
+from hwk import cpu
+from hwk import diff
+from hwk import fs
+from hwk import snapshot
+
+MODULES = snapshot.MODULES
+_TITLES = {
+    'cpu': 'CPU',
+    'memory': 'Memory',
+    'block': 'Block',
+    'net': 'Network',
+    'gpu': 'GPU',
+    'pci': 'PCI',
+    'topology': 'Topology',
+}
+_WIDTH = 64
+# The CPU utilization printed in watch mode, in addition to the total busy
+# time
+_UTILIZATION_FIELDS = ('user', 'system', 'iowait', 'steal')
+# Subcommands handed to `hwk.snapshot.main()`
+_SNAPSHOT_COMMANDS = ('capture', 'replay')
+
+
+def _list(value):
+    return [v.strip() for v in value.split(',') if v.strip()]
+
+
+def _parser():
+    parser = argparse.ArgumentParser(
+        prog='hwk',
+        description="Print the hardware information of this host.",
+        epilog="Run '%(prog)s capture --help' or '%(prog)s replay --help' "
+               "to capture or replay a snapshot of the host.",
+    )
+    parser.add_argument(
+        '--json', action='store_true',
+        help="Print one JSON document per module and line instead of text.",
+    )
+    parser.add_argument(
+        '--only', type=_list, metavar='MODULES',
+        help="Comma-separated modules to print (default: all of %s)." % (
+            ','.join(MODULES)),
+    )
+    parser.add_argument(
+        '--fields', type=_list, metavar='FIELDS',
+        help="Comma-separated fields to determine, as for the include "
+             "argument of the modules' info() functions. Modules supporting "
+             "none of them are skipped.",
+    )
+    parser.add_argument(
+        '--watch', type=float, metavar='INTERVAL',
+        help="Keep collecting every INTERVAL seconds, printing only changes "
+             "and CPU utilization.",
+    )
+    parser.add_argument(
+        '--count', type=int,
+        help="With --watch, stop after COUNT collections.",
+    )
+    parser.add_argument(
+        '--root', default=None,
+        help="Read from a copy of a host's /sys and /proc trees under this "
+             "directory instead of the live host.",
+    )
+    return parser
+
+
+def _modules(parser, args):
+    # Returns the names of the modules to collect
+    names = args.only or MODULES
+    unknown = set(names) - set(MODULES)
+    if unknown:
+        parser.error("unknown module(s): %s" % ', '.join(sorted(unknown)))
+    if args.fields is None:
+        return names
+    fields = {}
+    for name in names:
+        module = importlib.import_module('hwk.' + name)
+        fields[name] = set(args.fields) & set(module.FIELDS)
+    unknown = set(args.fields).difference(*fields.values())
+    if unknown:
+        parser.error("unknown field(s): %s" % ', '.join(sorted(unknown)))
+    return [name for name in names if fields[name]]
+
+
+def _write(out, lines):
+    out.write(''.join(line + '\n' for line in lines))
+    out.flush()
+
+
+def _scalar(value):
+    if value is None:
+        return 'unknown'
+    if isinstance(value, list):
+        return ', '.join(_scalar(v) for v in value)
+    if isinstance(value, dict):
+        return ', '.join(
+            '%s=%s' % (k, _scalar(v)) for k, v in sorted(value.items()))
+    return six.text_type(value).strip()
+
+
+def _is_objects(value):
+    return isinstance(value, list) and value and isinstance(value[0], dict)
+
+
+def _text(data, indent):
+    # Returns the lines describing a serialized object: its attributes, then
+    # the objects it contains, indented
+    res = []
+    nested = sorted(k for k, v in data.items() if _is_objects(v))
+    for key in sorted(set(data) - set(nested)):
+        res.append('%s%s: %s' % (indent, key, _scalar(data[key])))
+    for key in nested:
+        res.append('%s%s:' % (indent, key))
+        for item in data[key]:
+            lines = _text(item, indent + '    ')
+            if lines:
+                lines[0] = indent + '  - ' + lines[0].lstrip()
+            res.extend(lines)
+    return res
+
+
+def _print_info(out, envelope, as_json):
+    if as_json:
+        _write(out, [json.dumps(envelope, sort_keys=True)])
+        return
+    title = '== %s information ' % _TITLES[envelope['module']]
+    lines = [title + '=' * (_WIDTH - len(title)), '']
+    lines.extend(_text(envelope['info'], '  '))
+    lines.append('')
+    _write(out, lines)
+
+
+def _print_changes(out, name, changes, as_json):
+    now = time.time()
+    if as_json:
+        _write(out, [json.dumps(
+            {'time': now, 'module': name, 'changes': changes},
+            sort_keys=True,
+        )])
+        return
+    prefix = time.strftime('[%H:%M:%S]', time.localtime(now))
+    lines = []
+    for change in changes:
+        path = diff.path_str(name, change['path'])
+        if change['op'] == 'add':
+            lines.append('%s + %s %s' % (prefix, name, path))
+            value = change['value']
+            if isinstance(value, dict):
+                lines.extend(_text(value, ' ' * (len(prefix) + 3)))
+            else:
+                lines[-1] += ': %s' % _scalar(value)
+        elif change['op'] == 'remove':
+            lines.append('%s - %s %s' % (prefix, name, path))
+        else:
+            lines.append('%s ~ %s %s: %s -> %s' % (
+                prefix, name, path, _scalar(change['old']),
+                _scalar(change['new'])))
+    _write(out, lines)
+
+
+def _print_utilization(out, utilization, as_json):
+    now = time.time()
+    agg = utilization.aggregate(utilization.processor_set)
+    if as_json:
+        _write(out, [json.dumps(
+            {'time': now, 'module': 'cpu', 'utilization': agg},
+            sort_keys=True,
+        )])
+        return
+    _write(out, ['%s cpu: %.1f%% busy (%s)' % (
+        time.strftime('[%H:%M:%S]', time.localtime(now)),
+        100.0 - agg['idle'],
+        ', '.join('%s %.1f%%' % (f, agg[f]) for f in _UTILIZATION_FIELDS),
+    )])
+
+
+def _collect(collector, out, as_json, first):
+    # Collects and prints every module in turn, returning 1 if any failed
+    res = 0
+    for name in collector.modules:
+        try:
+            changes = collector.collect_module(name)
+        except Exception as err:
+            sys.stderr.write("%s: %s\n" % (name, err))
+            res = 1
+            continue
+        if first:
+            _print_info(out, collector.state[name], as_json)
+        elif changes:
+            _print_changes(out, name, changes, as_json)
+    return res
+
+
+def main(argv=None):
+    if argv is None:
+        argv = sys.argv[1:]
+    if argv and argv[0] in _SNAPSHOT_COMMANDS:
+        return snapshot.main(argv, prog='hwk')
+    parser = _parser()
+    args = parser.parse_args(argv)
+    modules = _modules(parser, args)
+    out = sys.stdout
+    filesystem = fs.current()
+    if args.root is not None:
+        filesystem = fs.Filesystem(args.root)
+    with fs.use(filesystem):
+        collector = diff.Collector(modules, include=args.fields)
+        res = _collect(collector, out, args.json, True)
+        if args.watch is None:
+            return res
+        sampler = None
+        if 'cpu' in modules:
+            sampler = cpu.Sampler()
+            try:
+                sampler.sample()
+            except (IOError, OSError) as err:
+                sys.stderr.write("cpu: utilization unavailable: %s\n" % err)
+                sampler = None
+        count = 0
+        deadline = time.time()
+        try:
+            while args.count is None or count < args.count:
+                deadline += args.watch
+                time.sleep(max(0.0, deadline - time.time()))
+                res = _collect(collector, out, args.json, False) or res
+                if sampler is not None:
+                    _print_utilization(out, sampler.sample(), args.json)
+                count += 1
+        except KeyboardInterrupt:
+            pass
+    return res
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,433 @@
+# -*- coding: utf-8 -*-
+
+# Licensed under the Apache License, Version 2.0 (the "License"); you may
+# not use this file except in compliance with the License. You may obtain
+# a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+# WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+# License for the specific language governing permissions and limitations
+# under the License.
+
+"""Columnar storage of the inventories of many hosts.
+
+An `hwk.columnar.Inventory` holds one `hwk.columnar.Table` per kind of device
+(hosts, CPUs, disks, partitions, NICs and GPUs) with one column per attribute
+and one row per device. Integer columns are `array.array` objects and string
+columns are dictionary-encoded: each distinct string is stored once and rows
+hold an integer code. Questions about a whole fleet then only touch flat
+arrays of integers:
+
+    >>> from hwk import columnar
+    >>> inv = columnar.Inventory()
+    >>> inv.add('host-0042')
+    >>> inv['nics'].count_by('driver')
+    {'i40e': 4, 'igb': 2}
+    >>> inv['disks'].sum_by('vendor', 'size_bytes')
+    {'ATA': 4000787030016}
+
+Inventories are exported with `to_dict()`, or saved with
+`hwk.columnar.save()`, on each host and appended to the aggregator's
+inventory with `extend()`, which copies columns wholesale without creating an
+object per device.
+
+The arrays support the buffer protocol, so NumPy can use them without a copy,
+e.g. `numpy.asarray(inv['disks']['size_bytes'].values)`.
+"""
+
+import array
+import gzip
+import importlib
+import json
+
+import six
+
+from hwk import utils
+
+FORMAT = 'hwk-columnar'
+VERSION = 1
+
+INT = 'int'
+STR = 'str'
+# Stored in integer columns for unknown values. All integer attributes are
+# counts, sizes or IDs, which are never negative.
+NULL = -1
+# array typecode of a signed 64-bit integer. Python 2's array module has no
+# 'q', but 'l' is 64 bits wide on the LP64 platforms hwk supports.
+_INT64 = 'q' if six.PY3 else 'l'
+
+# The tables of an inventory, and the name and kind of each of their columns.
+# Every table starts with the name of the host the row describes.
+SCHEMA = (
+    ('hosts', (
+        ('host', STR),
+        ('total_cores', INT),
+        ('total_threads', INT),
+        ('total_physical_bytes', INT),
+        ('total_usable_bytes', INT),
+        ('total_disk_bytes', INT),
+    )),
+    ('cpus', (
+        ('host', STR),
+        ('id', INT),
+        ('cores', INT),
+        ('threads', INT),
+        ('vendor', STR),
+        ('model', STR),
+    )),
+    ('disks', (
+        ('host', STR),
+        ('name', STR),
+        ('size_bytes', INT),
+        ('bus_type', STR),
+        ('vendor', STR),
+        ('serial_no', STR),
+    )),
+    ('partitions', (
+        ('host', STR),
+        ('disk', STR),
+        ('name', STR),
+        ('size_bytes', INT),
+        ('type', STR),
+        ('mount_point', STR),
+    )),
+    ('nics', (
+        ('host', STR),
+        ('name', STR),
+        ('mac', STR),
+        ('bus_type', STR),
+        ('driver', STR),
+        ('model', STR),
+        ('vendor', STR),
+        ('vendor_id', STR),
+    )),
+    ('gpus', (
+        ('host', STR),
+        ('address', STR),
+        ('bus_type', STR),
+        ('driver', STR),
+        ('model', STR),
+        ('vendor', STR),
+        ('vendor_id', STR),
+    )),
+)
+# The modules whose `info()` results are added to an inventory
+_MODULES = ('cpu', 'memory', 'block', 'net', 'gpu')
+
+
+class IntColumn(object):
+    """A column of integers, stored in the `values` array with `NULL` for
+    unknown values.
+    """
+
+    __slots__ = ('values',)
+
+    kind = INT
+
+    def __init__(self, values=()):
+        self.values = array.array(_INT64, values)
+
+    def __len__(self):
+        return len(self.values)
+
+    def __getitem__(self, row):
+        value = self.values[row]
+        return None if value == NULL else value
+
+    def append(self, value):
+        self.values.append(NULL if value is None else value)
+
+    def extend(self, other):
+        self.values.extend(other.values)
+
+    def to_dict(self):
+        return {'values': self.values.tolist()}
+
+    @classmethod
+    def from_dict(cls, data):
+        return cls(data['values'])
+
+
+class StringColumn(object):
+    """A dictionary-encoded column of strings. `categories` lists each distinct
+    value once, with None always at index 0, and the `codes` array holds the
+    index into `categories` of each row's value.
+    """
+
+    __slots__ = ('categories', 'codes', '_index')
+
+    kind = STR
+
+    def __init__(self, categories=(None,), codes=()):
+        self.categories = [utils.intern_str(c) for c in categories]
+        self.codes = array.array('l', codes)
+        self._index = dict((c, x) for x, c in enumerate(self.categories))
+
+    def __len__(self):
+        return len(self.codes)
+
+    def __getitem__(self, row):
+        return self.categories[self.codes[row]]
+
+    def code(self, value):
+        """Returns the code of the supplied value, or None if no row has it."""
+        return self._index.get(value)
+
+    def _encode(self, value):
+        code = self._index.get(value)
+        if code is None:
+            code = self._index[value] = len(self.categories)
+            self.categories.append(utils.intern_str(value))
+        return code
+
+    def append(self, value):
+        self.codes.append(self._encode(value))
+
+    def extend(self, other):
+        # Only the other column's distinct values are looked up; its codes are
+        # then translated through a flat array
+        remap = array.array('l', [self._encode(c) for c in other.categories])
+        self.codes.extend(array.array('l', [remap[c] for c in other.codes]))
+
+    def to_dict(self):
+        return {'categories': self.categories, 'codes': self.codes.tolist()}
+
+    @classmethod
+    def from_dict(cls, data):
+        return cls(data['categories'], data['codes'])
+
+
+_COLUMNS = {INT: IntColumn, STR: StringColumn}
+
+
+class Table(object):
+    """One row per device and one column per attribute. Columns are looked up
+    by name with `table[name]`.
+    """
+
+    def __init__(self, name, schema):
+        self.name = name
+        self.schema = tuple(schema)
+        self.columns = dict(
+            (col, _COLUMNS[kind]()) for col, kind in self.schema
+        )
+
+    def __repr__(self):
+        return "%s (%d rows)" % (self.name, len(self))
+
+    def __len__(self):
+        return len(self.columns[self.schema[0][0]])
+
+    def __getitem__(self, name):
+        return self.columns[name]
+
+    def append(self, row):
+        """Appends a row given as a sequence of values in schema order."""
+        for (col, _), value in zip(self.schema, row):
+            self.columns[col].append(value)
+
+    def extend(self, other):
+        """Appends all rows of another table with the same schema."""
+        if other.schema != self.schema:
+            raise ValueError(
+                "Cannot extend table %s with rows of a different schema" %
+                self.name)
+        for col, _ in self.schema:
+            self.columns[col].extend(other.columns[col])
+
+    def rows(self):
+        """Yields each row as a dict of column name to value."""
+        names = [col for col, _ in self.schema]
+        for x in range(len(self)):
+            yield dict((name, self.columns[name][x]) for name in names)
+
+    def where(self, column, value):
+        """Returns an array of the indexes of the rows whose value in the named
+        column equals the supplied value.
+        """
+        col = self.columns[column]
+        if col.kind == STR:
+            code = col.code(value)
+            if code is None:
+                return array.array('l')
+            data = col.codes
+        else:
+            code = NULL if value is None else value
+            data = col.values
+        return array.array('l', [x for x, c in enumerate(data) if c == code])
+
+    def count_by(self, column, rows=None):
+        """Returns a dict of each value of the named string column to the
+        number of rows with that value, optionally only counting the rows whose
+        indexes are supplied.
+        """
+        col = self.columns[column]
+        codes = col.codes
+        counts = [0] * len(col.categories)
+        for x in (range(len(codes)) if rows is None else rows):
+            counts[codes[x]] += 1
+        return dict(
+            (col.categories[c], n) for c, n in enumerate(counts) if n
+        )
+
+    def sum_by(self, column, value_column, rows=None):
+        """Returns a dict of each value of the named string column to the sum
+        of the named integer column over the rows with that value, optionally
+        only summing the rows whose indexes are supplied. Unknown values are
+        skipped.
+        """
+        col = self.columns[column]
+        codes = col.codes
+        values = self.columns[value_column].values
+        sums = [0] * len(col.categories)
+        seen = [False] * len(col.categories)
+        for x in (range(len(codes)) if rows is None else rows):
+            seen[codes[x]] = True
+            if values[x] != NULL:
+                sums[codes[x]] += values[x]
+        return dict(
+            (col.categories[c], s) for c, s in enumerate(sums) if seen[c]
+        )
+
+    def to_dict(self):
+        return dict(
+            (col, self.columns[col].to_dict()) for col, _ in self.schema
+        )
+
+    @classmethod
+    def from_dict(cls, name, schema, data):
+        res = cls(name, schema)
+        for col, kind in res.schema:
+            res.columns[col] = _COLUMNS[kind].from_dict(data[col])
+        lengths = set(len(c) for c in res.columns.values())
+        if len(lengths) > 1:
+            raise ValueError("Columns of table %s differ in length" % name)
+        return res
+
+
+class Inventory(object):
+    """The tables, listed in `hwk.columnar.SCHEMA`, describing the devices of
+    any number of hosts. Tables are looked up by name with `inventory[name]`.
+    """
+
+    def __init__(self):
+        self.tables = dict(
+            (name, Table(name, schema)) for name, schema in SCHEMA
+        )
+
+    def __repr__(self):
+        return "inventory (%d hosts)" % len(self.tables['hosts'])
+
+    def __getitem__(self, name):
+        return self.tables[name]
+
+    def add(self, host, infos=None):
+        """Adds a host to the inventory. infos is a dict of module name, e.g.
+        'net', to the `Info` object returned by that module's `info()`.
+        Modules missing from it are run against the current
+        `hwk.fs.Filesystem`, determining every attribute.
+        """
+        infos = dict(infos or {})
+        for name in _MODULES:
+            if name not in infos:
+                module = importlib.import_module('hwk.' + name)
+                infos[name] = module.info(include=module.FIELDS)
+        cpu = infos['cpu']
+        memory = infos['memory']
+        block = infos['block']
+        net = infos['net']
+        gpu = infos['gpu']
+
+        self.tables['hosts'].append((
+            host,
+            getattr(cpu, 'total_cores', None),
+            getattr(cpu, 'total_threads', None),
+            getattr(memory, 'total_physical_bytes', None),
+            getattr(memory, 'total_usable_bytes', None),
+            getattr(block, 'total_size_bytes', None),
+        ))
+        for c in getattr(cpu, 'cpus', None) or ():
+            # /proc/cpuinfo values keep their surrounding whitespace
+            self.tables['cpus'].append((
+                host, c.id, c.cores, c.threads, _strip(c.vendor),
+                _strip(c.model),
+            ))
+        for d in getattr(block, 'disks', None) or ():
+            self.tables['disks'].append((
+                host, d.name, d.size_bytes, d.bus_type, d.vendor, d.serial_no,
+            ))
+            for p in d.partitions:
+                self.tables['partitions'].append((
+                    host, d.name, p.name, p.size_bytes, p.type, p.mount_point,
+                ))
+        for n in getattr(net, 'nics', None) or ():
+            self.tables['nics'].append((
+                host, n.name, n.mac, n.bus_type, n.driver, n.model, n.vendor,
+                n.vendor_id,
+            ))
+        for g in getattr(gpu, 'gpus', None) or ():
+            self.tables['gpus'].append((
+                host, g.address, g.bus_type, g.driver, g.model, g.vendor,
+                g.vendor_id,
+            ))
+
+    def extend(self, other):
+        """Appends every host of another inventory."""
+        for name, _ in SCHEMA:
+            self.tables[name].extend(other.tables[name])
+
+    def to_dict(self):
+        return {
+            'format': FORMAT,
+            'version': VERSION,
+            'tables': dict(
+                (name, self.tables[name].to_dict()) for name, _ in SCHEMA
+            ),
+        }
+
+    @classmethod
+    def from_dict(cls, data):
+        if data.get('format') != FORMAT:
+            raise ValueError("Not an hwk columnar inventory")
+        if data.get('version') != VERSION:
+            raise ValueError(
+                "Unsupported columnar inventory version %r" %
+                data.get('version'))
+        res = cls()
+        for name, schema in SCHEMA:
+            res.tables[name] = Table.from_dict(
+                name, schema, data['tables'][name])
+        return res
+
+
+def _strip(value):
+    if value is None:
+        return None
+    return value.strip()
+
+
+def collect(host):
+    """Returns an `hwk.columnar.Inventory` of the host described by the
+    current `hwk.fs.Filesystem`, named host.
+    """
+    res = Inventory()
+    res.add(host)
+    return res
+
+
+def save(inventory, path):
+    """Writes an `hwk.columnar.Inventory` to a gzip-compressed JSON file."""
+    data = json.dumps(
+        inventory.to_dict(), sort_keys=True, separators=(',', ':'))
+    with gzip.open(path, 'wb') as f:
+        f.write(data.encode('utf-8'))
+
+
+def load(path):
+    """Reads an `hwk.columnar.Inventory` written by `hwk.columnar.save()`."""
+    with gzip.open(path, 'rb') as f:
+        data = f.read()
+    return Inventory.from_dict(json.loads(data.decode('utf-8')))
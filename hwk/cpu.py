@@ -12,7 +12,16 @@
 # License for the specific language governing permissions and limitations
 # under the License.
 
-import platform
+import array
+import math
+import os
+import time
+
+from hwk import cgroup
+from hwk import fs
+from hwk import serialize
+from hwk import trace
+from hwk import utils
 
 _INFO_HELP = """CPU subsystem
 ===============================================================================
@@ -26,6 +35,30 @@ total_threads (int)
 
   Number of physical CPU threads
 
+affinity (`hwk.utils.ProcessorSet`)
+
+  The logical processors the calling process may be scheduled on, according to
+  its CPU affinity mask. This reflects any cgroup cpuset the process (e.g. a
+  container) is confined to
+
+cpuset (`hwk.utils.ProcessorSet`)
+
+  The effective logical processors of the calling process' cpuset cgroup, or
+  None if it is not in a cpuset cgroup
+
+quota (float)
+
+  The number of CPUs' worth of time the calling process' cgroup may use per
+  scheduling period (cgroup v2 cpu.max or v1 cpu.cfs_quota_us), or None if
+  unlimited. For example, a container limited to 1.5 CPUs has a quota of 1.5
+
+usable_parallelism (int)
+
+  The recommended number of CPU-bound workers for the calling process: the
+  number of processors it may run on, further limited by its CPU quota
+  (rounded up) and never less than 1. Use this, not total_threads, to size
+  worker pools
+
 cpus (list of `hwk.cpu.CPU` objects)
 
   A list of objects describing the physical CPUs
@@ -54,7 +87,8 @@ cpus (list of `hwk.cpu.CPU` objects)
 
   processor_map (dict)
 
-    A mapping of each of this CPU's cores to a set of system processor IDs.
+    A mapping of each of this CPU's cores to a `hwk.utils.ProcessorSet` of
+    system processor IDs.
 
     For example, assume a system has 2 CPUs, each with 4 cores and each core
     has 2 hardware threads. The total number of processors in the system would
@@ -63,25 +97,149 @@ cpus (list of `hwk.cpu.CPU` objects)
     processor_map might look like the following:
 
         {
-            0: set([4, 5]),
-            1: set([6, 7]),
-            2: set([12, 13]),
-            3: set([14, 15]),
+            0: ProcessorSet('4-5'),
+            1: ProcessorSet('6-7'),
+            2: ProcessorSet('12-13'),
+            3: ProcessorSet('14-15'),
         }
 
-  features (set of strings)
+  features (frozenset of strings)
 
     A set of strings listing features of the CPU. This set of strings will be
     highly dependent on the vendor of the processor.
 """
+_UTILIZATION_HELP = """CPU utilization
+===============================================================================
+`hwk.cpu.Utilization` attributes:
+
+processor_set (`hwk.utils.ProcessorSet`)
+
+  The logical processors that reported time in the sample
+
+user, nice, system, idle, iowait, irq, softirq, steal (array of float)
+
+  Arrays indexed by logical processor ID containing the percentage of time
+  each processor spent in that state during the sample interval. Entries for
+  processors not in processor_set are 0.0
+
+ticks (array of float)
+
+  Array indexed by logical processor ID containing the total number of clock
+  ticks each processor accounted for during the sample interval
+
+`hwk.cpu.Utilization` methods:
+
+aggregate(processor_set)
+
+  Returns a dict of state name to percentage for the supplied set of
+  processors, weighted by the ticks of each processor. Accepts a
+  `hwk.utils.ProcessorSet` or any object with a processor_set attribute, such
+  as `hwk.topology.Node`, `hwk.topology.Core` or `hwk.topology.Cache`
+"""
+_FREQUENCY_HELP = """CPU frequency and idle states
+===============================================================================
+`hwk.cpu.Frequency` attributes:
+
+processor_set (`hwk.utils.ProcessorSet`)
+
+  The logical processors with cpufreq information
+
+cur_khz, min_khz, max_khz (array of int)
+
+  Arrays indexed by logical processor ID containing the current frequency and
+  the minimum and maximum frequencies the scaling governor may select, in kHz
+  (cpufreq scaling_cur_freq, scaling_min_freq and scaling_max_freq)
+
+hw_min_khz, hw_max_khz (array of int)
+
+  Arrays indexed by logical processor ID containing the minimum and maximum
+  frequencies the hardware supports, in kHz
+
+governor (list of string)
+
+  List indexed by logical processor ID containing the scaling governor, e.g.
+  'performance' or 'powersave', or None
+
+energy_performance_preference (list of string)
+
+  List indexed by logical processor ID containing the energy/performance
+  preference hint, e.g. 'balance_performance', or None if the driver does not
+  support it
+
+idle_states (list of string)
+
+  Names of the processor idle (C-) states, e.g. ['POLL', 'C1', 'C1E', 'C6']
+
+idle_time_us (dict of string to array of int, or of float on Python 2)
+
+  For each idle state name, an array indexed by logical processor ID
+  containing the total time the processor has spent in that state, in
+  microseconds
+
+idle_residency (dict of string to array of float)
+
+  For each idle state name, an array indexed by logical processor ID
+  containing the percentage of wall time the processor spent in that state
+  since the previous sample, or 0.0 for the first sample
+
+`hwk.cpu.Frequency` methods:
+
+aggregate(processor_set)
+
+  Returns a dict summarizing the supplied set of processors: the mean current
+  frequency ('cur_khz'), the lowest minimum and highest maximum frequencies
+  ('min_khz', 'max_khz'), the set of governors ('governors') and the mean
+  residency of each idle state ('idle_residency'). Accepts a
+  `hwk.utils.ProcessorSet` or any object with a processor_set attribute, such
+  as `hwk.topology.Core`
+"""
+# Attributes of `Info` objects that may be passed to `info(include=...)`
+FIELDS = (
+    'cpus', 'total_cores', 'total_threads', 'affinity', 'cpuset', 'quota',
+    'usable_parallelism',
+)
+# The subset of FIELDS that come from /proc/cpuinfo
+_CPUINFO_FIELDS = frozenset(('cpus', 'total_cores', 'total_threads'))
+_LINUX_PROC_STAT = '/proc/stat'
+_LINUX_SYS_DEVICES_SYSTEM_CPU_DIR = '/sys/devices/system/cpu/'
+# Total idle state residency in microseconds passes 2**31 after about 36
+# minutes, too much for a 32-bit C long, so it is kept in 64-bit integers, or
+# in doubles where the array module has none (Python 2)
+try:
+    array.array('q')
+    _IDLE_TIME_TYPECODE = 'q'
+except ValueError:
+    _IDLE_TIME_TYPECODE = 'd'
+# The per-processor lines of /proc/stat contain clock ticks spent in each of
+# these states, in this order. Later fields (guest and guest_nice) are already
+# included in user and nice, so we ignore them.
+_STAT_FIELDS = (
+    'user',
+    'nice',
+    'system',
+    'idle',
+    'iowait',
+    'irq',
+    'softirq',
+    'steal',
+)
 
 
 class Info(object):
     """Object describing the CPU information about a system."""
 
+    _SERIALIZED = (
+        'total_cores', 'total_threads', 'affinity', 'cpuset', 'quota',
+        'usable_parallelism', 'cpus',
+    )
+
     def __init__(self):
         self.total_cores = None
         self.total_threads = None
+        self.affinity = None
+        self.cpuset = None
+        self.quota = None
+        self.usable_parallelism = None
         self.cpus = []
 
     def __repr__(self):
@@ -94,16 +252,39 @@ class Info(object):
     def describe(self):
         return _INFO_HELP
 
+    def to_dict(self):
+        return serialize.to_dict(self)
+
+    @classmethod
+    def from_dict(cls, data):
+        res = cls()
+        res.total_cores = data['total_cores']
+        res.total_threads = data['total_threads']
+        for field in ('affinity', 'cpuset'):
+            if data[field] is not None:
+                setattr(res, field,
+                        utils.ProcessorSet.from_cpulist(data[field]))
+        res.quota = data['quota']
+        res.usable_parallelism = data['usable_parallelism']
+        res.cpus = [CPU.from_dict(c) for c in data['cpus']]
+        return res
+
 
 class CPU(object):
 
+    __slots__ = (
+        'cores', 'threads', 'model', 'vendor', 'id', 'features',
+        'processor_map',
+    )
+    _SERIALIZED = __slots__
+
     def __init__(self, proc_id):
         self.cores = None
         self.threads = None
         self.model = None
         self.vendor = None
         self.id = int(proc_id)
-        self.features = set()
+        self.features = frozenset()
         self.processor_map = {}
 
     def __repr__(self):
@@ -123,6 +304,24 @@ class CPU(object):
             model_str,
         )
 
+    def to_dict(self):
+        return serialize.to_dict(self)
+
+    @classmethod
+    def from_dict(cls, data):
+        res = cls(data['id'])
+        res.cores = data['cores']
+        res.threads = data['threads']
+        res.model = utils.intern_str(data['model'])
+        res.vendor = utils.intern_str(data['vendor'])
+        res.features = utils.intern_set(data['features'])
+        # JSON object keys are always strings
+        res.processor_map = dict(
+            (int(core), utils.ProcessorSet.from_cpulist(lps))
+            for core, lps in data['processor_map'].items()
+        )
+        return res
+
 
 def total_cores():
     """Returns the total physical cores or None if the information could not be
@@ -130,7 +329,7 @@ def total_cores():
     """
     return {
         "Linux": _linux_total_cores,
-    }[platform.system()]()
+    }[fs.system()]()
 
 
 def _linux_total_cores():
@@ -144,7 +343,7 @@ def total_threads():
     """
     return {
         "Linux": _linux_total_threads,
-    }[platform.system()]()
+    }[fs.system()]()
 
 
 def _linux_total_threads():
@@ -152,18 +351,85 @@ def _linux_total_threads():
     return i.total_threads
 
 
-def info():
+def usable_parallelism():
+    """Returns the recommended number of CPU-bound workers for the calling
+    process, taking its CPU affinity, cgroup cpuset and cgroup CPU quota into
+    account, or None if the information could not be determined.
+    """
+    try:
+        return {
+            "Linux": _linux_usable_parallelism,
+        }[fs.system()]()
+    except KeyError:
+        return None
+
+
+def _linux_usable_parallelism():
+    i = info()
+    return i.usable_parallelism
+
+
+def _linux_affinity(total_threads):
+    if fs.current().is_local and hasattr(os, 'sched_getaffinity'):
+        return utils.ProcessorSet(os.sched_getaffinity(0))
+    return utils.ProcessorSet(range(total_threads))
+
+
+def _linux_usable_parallelism_from(affinity, cpuset, quota):
+    allowed = affinity
+    if cpuset:
+        allowed = allowed & cpuset or allowed
+    res = len(allowed)
+    if quota is not None:
+        res = min(res, int(math.ceil(quota)))
+    return max(1, res)
+
+
+def info(include=None):
     """Returns a `hwk.cpu.Info` object containing information on the CPUs
     available to the system, or None if the information could not be
     determined.
+
+    If include is supplied, only the attributes it names, from those listed
+    in `hwk.cpu.FIELDS`, are determined. For example, include=['quota'] only
+    reads the cgroup CPU controller's files and never parses /proc/cpuinfo.
     """
+    fields = utils.included(include, FIELDS)
     return {
         "Linux": _linux_info,
-    }[platform.system()]()
+    }[fs.system()](fields)
+
 
+@trace.collector
+def _linux_info(fields):
+    needed = set(fields)
+    if 'usable_parallelism' in needed:
+        needed.update(('affinity', 'cpuset', 'quota'))
+    # The affinity of a process on the live host comes from the kernel, but
+    # for other hosts it is assumed to be every hardware thread
+    affinity_from_cpuinfo = 'affinity' in needed and not (
+        fs.current().is_local and hasattr(os, 'sched_getaffinity'))
 
-def _linux_info():
-    cpu_info = open('/proc/cpuinfo', 'r').readlines()
+    res = Info()
+    if needed & _CPUINFO_FIELDS or affinity_from_cpuinfo:
+        cpus = _linux_cpus()
+        res.total_cores = sum(c.cores for c in cpus)
+        res.total_threads = sum(c.threads for c in cpus)
+        res.cpus = cpus
+    if 'affinity' in needed:
+        res.affinity = _linux_affinity(res.total_threads)
+    if 'cpuset' in needed:
+        res.cpuset = cgroup.cpuset_cpus()
+    if 'quota' in needed:
+        res.quota = cgroup.cpu_quota()
+    if 'usable_parallelism' in needed:
+        res.usable_parallelism = _linux_usable_parallelism_from(
+            res.affinity, res.cpuset, res.quota)
+    return res
+
+
+def _linux_cpus():
+    cpu_info = fs.open('/proc/cpuinfo', 'r').readlines()
     cpu_attrs = []
     cur_cpu_attrs = {}
     for line in cpu_info:
@@ -182,11 +448,11 @@ def _linux_info():
         cpu = CPU(cpu_id)
         procs_in_cpu = [c for c in cpu_attrs if c['physical id'] == cpu_id]
         first = procs_in_cpu[0]
-        cpu.model = first['model name']
-        cpu.vendor = first['vendor_id']
+        cpu.model = utils.intern_str(first['model name'])
+        cpu.vendor = utils.intern_str(first['vendor_id'])
         cpu.cores = int(first['cpu cores'])
         cpu.threads = int(first['siblings'])
-        cpu.features = set(
+        cpu.features = utils.intern_set(
             s.strip() for s in first['flags'].split(' ')
             if len(s.strip()) > 0
         )
@@ -210,16 +476,389 @@ def _linux_info():
             for core_id in core_ids
         }
         pmap = {
-            core_id_index[core_id]: set(
+            core_id_index[core_id]: utils.ProcessorSet(
                 int(c['processor']) for c in procs_in_cpu
                 if c['core id'] == core_id
             ) for core_id in core_ids
         }
         cpu.processor_map = pmap
         cpus.append(cpu)
+    return cpus
 
-    res = Info()
-    res.total_cores = sum(c.cores for c in cpus)
-    res.total_threads = sum(c.threads for c in cpus)
-    res.cpus = cpus
-    return res
+
+class Utilization(object):
+    """Object describing the utilization of each logical processor between two
+    samples of the processors' time accounting.
+    """
+
+    def __init__(self, size):
+        self.size = size
+        self.processor_set = utils.ProcessorSet()
+        self.ticks = array.array('d', [0.0]) * size
+        for field in _STAT_FIELDS:
+            setattr(self, field, array.array('d', [0.0]) * size)
+
+    def __repr__(self):
+        busy = 100.0 - self.aggregate(self.processor_set)['idle']
+        return "utilization (%d processors, %.1f%% busy)" % (
+            len(self.processor_set),
+            busy,
+        )
+
+    def describe(self):
+        return _UTILIZATION_HELP
+
+    def _grow(self, size):
+        extra = size - self.size
+        self.ticks.extend([0.0] * extra)
+        for field in _STAT_FIELDS:
+            getattr(self, field).extend([0.0] * extra)
+        self.size = size
+
+    def aggregate(self, processor_set):
+        """Returns a dict of state name to the percentage of time the supplied
+        processors spent in that state, weighted by each processor's ticks.
+        """
+        processor_set = getattr(processor_set, 'processor_set', processor_set)
+        ids = [
+            x for x in utils.ProcessorSet(processor_set) & self.processor_set
+            if x < self.size
+        ]
+        ticks = self.ticks
+        total = sum(ticks[x] for x in ids)
+        res = {}
+        for field in _STAT_FIELDS:
+            values = getattr(self, field)
+            if total:
+                res[field] = sum(values[x] * ticks[x] for x in ids) / total
+            else:
+                res[field] = 0.0
+        return res
+
+
+class Sampler(object):
+    """Samples the utilization of every logical processor.
+
+    Each call to `sample()` reads /proc/stat once for all processors and
+    returns a `hwk.cpu.Utilization` describing the interval since the previous
+    call (or since boot, for the first call). Counters and results are kept in
+    preallocated arrays indexed by processor ID, so no per-processor objects
+    are retained between samples. The returned `Utilization` object is reused
+    and overwritten by the next call to `sample()`.
+    """
+
+    def __init__(self):
+        self._size = 0
+        self._prev = array.array('d')
+        self._delta = array.array('d', [0.0]) * len(_STAT_FIELDS)
+        self._result = Utilization(0)
+        self._result_arrays = [
+            getattr(self._result, field) for field in _STAT_FIELDS
+        ]
+
+    def _grow(self, size):
+        self._prev.extend([0.0] * ((size - self._size) * len(_STAT_FIELDS)))
+        self._result._grow(size)
+        self._size = size
+
+    def sample(self):
+        return {
+            "Linux": self._linux_sample,
+        }[fs.system()]()
+
+    def _linux_sample(self):
+        # The top of /proc/stat looks like the following, with one line for the
+        # system as a whole and one line per online logical processor:
+        #
+        # cpu  2777 0 1728 45873 146 0 0 27 0 0
+        # cpu0 1380 0 861 22950 70 0 0 13 0 0
+        # cpu1 1397 0 867 22923 76 0 0 14 0 0
+        # intr 54291 0 0 ...
+        #
+        # We only need the lines up to 'intr', which is by far the longest.
+        data = fs.open(_LINUX_PROC_STAT, 'rb').read()
+        end = data.find(b'\nintr')
+        if end != -1:
+            data = data[:end]
+        tokens = data.split()
+
+        num_fields = len(_STAT_FIELDS)
+        prev = self._prev
+        delta = self._delta
+        result = self._result
+        arrays = self._result_arrays
+        ticks = result.ticks
+        mask = 0
+        i = 0
+        num_tokens = len(tokens)
+        while i < num_tokens:
+            label = tokens[i]
+            i += 1
+            j = i
+            while j < num_tokens and not tokens[j].startswith(b'cpu'):
+                j += 1
+            if len(label) > 3:
+                lp_id = int(label[3:])
+                if lp_id >= self._size:
+                    self._grow(lp_id + 1)
+                    prev = self._prev
+                base = lp_id * num_fields
+                total = 0.0
+                for k in range(num_fields):
+                    if i + k < j:
+                        value = float(tokens[i + k])
+                        d = value - prev[base + k]
+                        prev[base + k] = value
+                        # Counters may go backwards when a processor is
+                        # hot-plugged
+                        if d < 0.0:
+                            d = 0.0
+                    else:
+                        d = 0.0
+                    delta[k] = d
+                    total += d
+                ticks[lp_id] = total
+                for k in range(num_fields):
+                    if total:
+                        arrays[k][lp_id] = delta[k] * 100.0 / total
+                    else:
+                        arrays[k][lp_id] = 0.0
+                mask |= 1 << lp_id
+            i = j
+        # Processors that went offline since the previous sample are left
+        # out of the processor set, and their entries are zeroed
+        for lp_id in utils.ProcessorSet.from_mask(
+                result.processor_set.mask & ~mask):
+            ticks[lp_id] = 0.0
+            for k in range(num_fields):
+                arrays[k][lp_id] = 0.0
+        result.processor_set = utils.ProcessorSet.from_mask(mask)
+        return result
+
+
+class Frequency(object):
+    """Object describing the clock frequencies and idle state residency of each
+    logical processor.
+    """
+
+    def __init__(self, size):
+        self.size = size
+        self.processor_set = utils.ProcessorSet()
+        self.cur_khz = array.array('l', [0]) * size
+        self.min_khz = array.array('l', [0]) * size
+        self.max_khz = array.array('l', [0]) * size
+        self.hw_min_khz = array.array('l', [0]) * size
+        self.hw_max_khz = array.array('l', [0]) * size
+        self.governor = [None] * size
+        self.energy_performance_preference = [None] * size
+        self.idle_states = []
+        self.idle_time_us = {}
+        self.idle_residency = {}
+
+    def __repr__(self):
+        agg = self.aggregate(self.processor_set)
+        return "frequency (%d processors, %d MHz mean)" % (
+            len(self.processor_set),
+            agg['cur_khz'] // 1000,
+        )
+
+    def describe(self):
+        return _FREQUENCY_HELP
+
+    def aggregate(self, processor_set):
+        """Returns a dict summarizing the frequencies and idle state residency
+        of the supplied processors.
+        """
+        processor_set = getattr(processor_set, 'processor_set', processor_set)
+        ids = [
+            x for x in utils.ProcessorSet(processor_set) & self.processor_set
+            if x < self.size
+        ]
+        res = {
+            'cur_khz': 0,
+            'min_khz': None,
+            'max_khz': None,
+            'governors': set(self.governor[x] for x in ids) - set([None]),
+            'idle_residency': {},
+        }
+        if ids:
+            res['cur_khz'] = sum(self.cur_khz[x] for x in ids) // len(ids)
+            res['min_khz'] = min(self.min_khz[x] for x in ids)
+            res['max_khz'] = max(self.max_khz[x] for x in ids)
+            for name in self.idle_states:
+                values = self.idle_residency[name]
+                res['idle_residency'][name] = (
+                    sum(values[x] for x in ids) / len(ids)
+                )
+        return res
+
+
+def _read_int(path):
+    try:
+        return int(fs.open(path, 'rb').read())
+    except (IOError, ValueError):
+        return 0
+
+
+def _read_str(path):
+    try:
+        return fs.open(path, 'r').read().strip()
+    except IOError:
+        return None
+
+
+class FrequencySampler(object):
+    """Samples the clock frequency and idle state residency of every logical
+    processor.
+
+    The layout of the cpufreq policies and idle states is discovered once, when
+    the sampler is created. The first call to `sample()` reads every cpufreq
+    attribute once per policy rather than once per processor, since processors
+    sharing a clock share a policy. Subsequent calls only re-read the
+    attributes that change at runtime: scaling_cur_freq and the idle state
+    'time' counters, unless `refresh()` is called to re-read everything. The
+    returned `hwk.cpu.Frequency` object is reused and overwritten by the next
+    call to `sample()`.
+    """
+
+    def __init__(self):
+        self._policies = []
+        self._idle_dirs = []
+        self._result = Frequency(0)
+        self._prev_time = None
+        self._prev_idle = {}
+        self._static_read = False
+        {
+            "Linux": self._linux_discover,
+        }[fs.system()]()
+
+    def _linux_discover(self):
+        # /sys/devices/system/cpu/cpufreq contains a policyX directory for each
+        # group of logical processors sharing a clock. The related_cpus file
+        # lists the processors in the policy. Older kernels have no policy
+        # directories, only a cpufreq directory under each cpuX directory.
+        cpu_dir = _LINUX_SYS_DEVICES_SYSTEM_CPU_DIR
+        policy_dir = os.path.join(cpu_dir, 'cpufreq')
+        size = 0
+        try:
+            names = sorted(
+                n for n in fs.listdir(policy_dir) if n.startswith('policy')
+            )
+        except OSError:
+            names = []
+        for name in names:
+            path = os.path.join(policy_dir, name)
+            cpus = _read_str(os.path.join(path, 'related_cpus'))
+            if cpus is None:
+                cpus = _read_str(os.path.join(path, 'affected_cpus'))
+            # related_cpus is space-separated, e.g. '0 8'
+            ps = utils.ProcessorSet.from_cpulist(
+                (cpus or '').replace(' ', ','))
+            if ps:
+                self._policies.append((path, list(ps)))
+                size = max(size, max(ps) + 1)
+
+        lp_ids = sorted(
+            int(n[3:]) for n in fs.listdir(cpu_dir)
+            if n.startswith('cpu') and n[3:].isdigit()
+        )
+        for lp_id in lp_ids:
+            lp_path = os.path.join(cpu_dir, 'cpu%d' % lp_id)
+            if not names:
+                path = os.path.join(lp_path, 'cpufreq')
+                if fs.isdir(path):
+                    self._policies.append((path, [lp_id]))
+                    size = max(size, lp_id + 1)
+            # /sys/devices/system/cpu/cpuX/cpuidle contains a stateY directory
+            # per idle state, with 'name' and 'time' (total residency in
+            # microseconds) files
+            idle_path = os.path.join(lp_path, 'cpuidle')
+            try:
+                states = sorted(
+                    (int(n[5:]), n) for n in fs.listdir(idle_path)
+                    if n.startswith('state') and n[5:].isdigit()
+                )
+            except OSError:
+                continue
+            for _, state in states:
+                state_path = os.path.join(idle_path, state)
+                name = _read_str(os.path.join(state_path, 'name')) or state
+                self._idle_dirs.append(
+                    (lp_id, name, os.path.join(state_path, 'time')))
+            size = max(size, lp_id + 1)
+
+        result = Frequency(size)
+        for lp_id, name, _ in self._idle_dirs:
+            if name not in result.idle_time_us:
+                result.idle_states.append(name)
+                result.idle_time_us[name] = array.array(
+                    _IDLE_TIME_TYPECODE, [0]) * size
+                result.idle_residency[name] = array.array('d', [0.0]) * size
+                self._prev_idle[name] = array.array(
+                    _IDLE_TIME_TYPECODE, [0]) * size
+        self._result = result
+
+    def refresh(self):
+        """Makes the next call to `sample()` re-read the governor, scaling
+        limits and energy/performance preference, which only change when an
+        administrator changes them.
+        """
+        self._static_read = False
+
+    def sample(self):
+        result = self._result
+        mask = 0
+        read_static = not self._static_read
+        for path, lp_ids in self._policies:
+            cur = _read_int(os.path.join(path, 'scaling_cur_freq'))
+            if read_static:
+                attrs = (
+                    _read_int(os.path.join(path, 'scaling_min_freq')),
+                    _read_int(os.path.join(path, 'scaling_max_freq')),
+                    _read_int(os.path.join(path, 'cpuinfo_min_freq')),
+                    _read_int(os.path.join(path, 'cpuinfo_max_freq')),
+                    _read_str(os.path.join(path, 'scaling_governor')),
+                    _read_str(os.path.join(
+                        path, 'energy_performance_preference')),
+                )
+            for lp_id in lp_ids:
+                result.cur_khz[lp_id] = cur
+                if read_static:
+                    (result.min_khz[lp_id], result.max_khz[lp_id],
+                     result.hw_min_khz[lp_id], result.hw_max_khz[lp_id],
+                     result.governor[lp_id],
+                     result.energy_performance_preference[lp_id]) = attrs
+                mask |= 1 << lp_id
+        self._static_read = True
+
+        now = time.time()
+        elapsed_us = None
+        if self._prev_time is not None:
+            elapsed_us = (now - self._prev_time) * 1000000.0
+        self._prev_time = now
+        for lp_id, name, path in self._idle_dirs:
+            value = _read_int(path)
+            prev = self._prev_idle[name]
+            residency = 0.0
+            if elapsed_us:
+                residency = min(
+                    100.0,
+                    max(0.0, (value - prev[lp_id]) * 100.0 / elapsed_us),
+                )
+            result.idle_time_us[name][lp_id] = value
+            result.idle_residency[name][lp_id] = residency
+            prev[lp_id] = value
+        result.processor_set = utils.ProcessorSet.from_mask(mask)
+        return result
+
+
+def frequencies():
+    """Returns a `hwk.cpu.Frequency` object describing the clock frequencies
+    and idle state time of every logical processor, or None if the information
+    could not be determined. Use a `hwk.cpu.FrequencySampler` to sample
+    repeatedly.
+    """
+    try:
+        return FrequencySampler().sample()
+    except KeyError:
+        return None
@@ -0,0 +1,373 @@
+# -*- coding: utf-8 -*-
+
+# Licensed under the Apache License, Version 2.0 (the "License"); you may
+# not use this file except in compliance with the License. You may obtain
+# a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+# WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+# License for the specific language governing permissions and limitations
+# under the License.
+
+"""Comparison of `Info` objects, and collection that reports only changes.
+
+`hwk.diff.diff()` compares two `Info` objects returned by the same module's
+`info()` function, or their `hwk.serialize.envelope()` forms, and returns the
+differences as a list of changes:
+
+    >>> from hwk import diff, block
+    >>> before = block.info()
+    >>> # ... a partition is unmounted ...
+    >>> diff.diff(before, block.info())
+    [{'op': 'modify', 'path': ['disks', 'S3Z9NB0K', 'partitions', 'sda1',
+      'mount_point'], 'old': '/srv', 'new': None}]
+
+Each change is a dict with an `op` of 'add', 'remove' or 'modify' and the
+`path` to the value within the serialized form of the `Info` object. Objects
+in lists are identified by a stable identity rather than their position, so
+that the order discovery happens to find devices in does not matter:
+
+* disks by serial number, or by name if it is unknown
+* partitions by name
+* NICs by MAC address, or by name if they have none
+* GPUs and PCI devices by PCI address
+* CPUs by physical package id
+* NUMA nodes and cores by id, and caches by level, type and processors
+
+An 'add' change carries the added `value`, a 'modify' change the `old` and
+`new` values, and a 'remove' change nothing else. `hwk.diff.apply()` applies
+changes to the envelope of the older object, so a receiver holding the last
+full inventory of a host can keep it up to date from changes alone.
+
+`hwk.diff.Collector` collects the inventory of the host repeatedly and returns
+only the changes since its previous collection. It only runs the `info()`
+functions of modules whose source in sysfs may have changed. See
+`hwk.diff.Collector` for how that is determined.
+"""
+
+import copy
+import importlib
+
+import six
+
+from hwk import fs
+from hwk import serialize
+from hwk import snapshot
+
+# The kernel increments this for every uevent it sends, so it changes whenever
+# a device is added, removed, bound to a driver or otherwise changes in a way
+# udev is told about
+_LINUX_SYS_KERNEL_UEVENT_SEQNUM = '/sys/kernel/uevent_seqnum'
+
+
+def _first_known(*fields):
+    # Returns a function returning the first of the supplied fields of a
+    # serialized object that is not None or 'unknown'
+    def identity(data):
+        for field in fields:
+            value = data.get(field)
+            if value is not None and value != 'unknown':
+                return value
+        return None
+    return identity
+
+
+def _nic_identity(data):
+    # Loopback and many virtual interfaces have an all-zero MAC address
+    mac = data.get('mac')
+    if mac and mac.strip('0:'):
+        return mac
+    return data.get('name')
+
+
+def _cache_identity(data):
+    return 'L%s-%s-%s' % (data['level'], data['type'], data['processor_set'])
+
+
+# Functions returning the identity of the objects in each list of the
+# serialized form of each module's `Info` objects, keyed by the path to the
+# list with identities omitted
+_IDENTITIES = {
+    ('block', 'disks'): _first_known('serial_no', 'name'),
+    ('block', 'disks', 'partitions'): _first_known('name'),
+    ('net', 'nics'): _nic_identity,
+    ('gpu', 'gpus'): _first_known('address'),
+    ('pci', 'devices'): _first_known('address'),
+    ('cpu', 'cpus'): _first_known('id'),
+    ('topology', 'nodes'): _first_known('id'),
+    ('topology', 'nodes', 'cores'): _first_known('id'),
+    ('topology', 'nodes', 'caches'): _cache_identity,
+    ('topology', 'nodes', 'cores', 'caches'): _cache_identity,
+}
+
+
+def _by_identity(identity, items):
+    # Returns a list of (identity, item) tuples, or None if any item has no
+    # identity or shares its identity with another item
+    res = [(identity(item), item) for item in items]
+    ids = set(i for i, item in res)
+    if None in ids or len(ids) != len(res):
+        return None
+    return res
+
+
+def _diff(old, new, path, spec, changes):
+    if isinstance(old, dict) and isinstance(new, dict):
+        for key in sorted(set(old) | set(new), key=str):
+            if key not in new:
+                changes.append({'op': 'remove', 'path': path + [key]})
+            elif key not in old:
+                changes.append(
+                    {'op': 'add', 'path': path + [key], 'value': new[key]})
+            else:
+                _diff(old[key], new[key], path + [key], spec + (key,),
+                      changes)
+        return
+    identity = _IDENTITIES.get(spec)
+    if identity is not None and isinstance(old, list) \
+            and isinstance(new, list):
+        old_items = _by_identity(identity, old)
+        new_items = _by_identity(identity, new)
+        if old_items is not None and new_items is not None:
+            new_ids = set(i for i, item in new_items)
+            old_by_id = dict(old_items)
+            for ident, item in old_items:
+                if ident not in new_ids:
+                    changes.append({'op': 'remove', 'path': path + [ident]})
+            for ident, item in new_items:
+                if ident in old_by_id:
+                    _diff(old_by_id[ident], item, path + [ident], spec,
+                          changes)
+                else:
+                    changes.append(
+                        {'op': 'add', 'path': path + [ident], 'value': item})
+            return
+    if old != new:
+        changes.append({'op': 'modify', 'path': path, 'old': old, 'new': new})
+
+
+def _envelope(obj):
+    if obj is None or (isinstance(obj, dict) and 'schema' in obj):
+        return obj
+    return serialize.envelope(obj)
+
+
+def diff(old, new):
+    """Returns the list of changes between the supplied `Info` objects, or
+    their `hwk.serialize.envelope()` forms, as described in the documentation
+    of `hwk.diff`. Returns an empty list if there are none.
+
+    If `old` is None, the result is a single change adding the whole of `new`,
+    with an empty path.
+    """
+    old = _envelope(old)
+    new = _envelope(new)
+    if old is None:
+        return [{'op': 'add', 'path': [], 'value': new}]
+    if old['module'] != new['module']:
+        raise ValueError(
+            "Cannot compare %s information with %s information" % (
+                old['module'], new['module']))
+    changes = []
+    _diff(old['info'], new['info'], [], (new['module'],), changes)
+    return changes
+
+
+def path_str(module, path):
+    """Returns the path of a change to the information of the supplied
+    module as a string, e.g. 'disks[S3Z9NB0K].partitions[sda1].mount_point'.
+    """
+    spec = (module,)
+    res = []
+    i = 0
+    while i < len(path):
+        spec += (path[i],)
+        res.append(('.' if res else '') + six.text_type(path[i]))
+        i += 1
+        if spec in _IDENTITIES and i < len(path):
+            res.append('[%s]' % path[i])
+            i += 1
+    return ''.join(res)
+
+
+def _child(container, key, spec):
+    # Returns the index or key of the item with the supplied identity in the
+    # supplied list, or the supplied key of a dict
+    if isinstance(container, list):
+        identity = _IDENTITIES[spec]
+        for index, item in enumerate(container):
+            if identity(item) == key:
+                return index
+        raise KeyError(key)
+    return key
+
+
+def apply(envelope, changes):
+    """Returns a copy of the supplied `hwk.serialize.envelope()` form of an
+    `Info` object with the supplied changes, as returned by
+    `hwk.diff.diff()`, applied to it. Objects added to lists are appended.
+
+    Raises KeyError if a change refers to something that does not exist.
+    """
+    res = copy.deepcopy(envelope)
+    for change in changes:
+        path = change['path']
+        if not path:
+            res = copy.deepcopy(change['value'])
+            continue
+        spec = (res['module'],)
+        container = res['info']
+        for key in path[:-1]:
+            if isinstance(container, list):
+                container = container[_child(container, key, spec)]
+            else:
+                container = container[key]
+                spec += (key,)
+        key = path[-1]
+        if change['op'] == 'add':
+            if isinstance(container, list):
+                container.append(copy.deepcopy(change['value']))
+            else:
+                container[key] = copy.deepcopy(change['value'])
+        elif change['op'] == 'remove':
+            del container[_child(container, key, spec)]
+        else:
+            container[_child(container, key, spec)] = copy.deepcopy(
+                change['new'])
+    return res
+
+
+def _read(path):
+    try:
+        with fs.open(path, 'r') as f:
+            return f.read()
+    except (IOError, OSError):
+        return None
+
+
+def _getmtime(path):
+    try:
+        return fs.getmtime(path)
+    except (IOError, OSError):
+        return None
+
+
+# The directories whose modification times, and the files whose contents,
+# determine each module's information in addition to the uevent sequence
+# number. The kernel updates a sysfs directory's modification time whenever
+# an entry is added to or removed from it, so devices appearing and
+# disappearing are noticed even where no uevent is sent. None means the
+# module is always re-probed: memory and CPU information includes cgroup
+# limits and CPU affinity, which change without any uevent, and they take a
+# handful of reads to determine anyway.
+_LINUX_SOURCES = {
+    'cpu': None,
+    'memory': None,
+    'block': (('/sys/block',), ('/proc/self/mountinfo',)),
+    'net': (('/sys/class/net',), ()),
+    'gpu': (('/sys/bus/pci/devices',), ()),
+    'pci': (('/sys/bus/pci/devices',), ()),
+    'topology': (
+        ('/sys/devices/system/node', '/sys/devices/system/cpu'),
+        ('/sys/devices/system/cpu/online',),
+    ),
+}
+
+
+def _linux_stamp(module_name):
+    sources = _LINUX_SOURCES[module_name]
+    if sources is None:
+        return None
+    dirs, files = sources
+    return (
+        _read(_LINUX_SYS_KERNEL_UEVENT_SEQNUM),
+        tuple(_getmtime(path) for path in dirs),
+        tuple(_read(path) for path in files),
+    )
+
+
+class Collector(object):
+    """Collects the information of the supplied modules, all of hwk's modules
+    by default, from the current `hwk.fs.Filesystem` each time `collect()` is
+    called, and returns the changes since the previous call.
+
+    Before re-probing a module, the collector reads a few cheap indicators of
+    whether the module's information may have changed: the kernel's uevent
+    sequence number, the modification times of the sysfs directories listing
+    the module's devices, and for block devices the mount table. Modules for
+    which none of these changed are not re-probed. Changes the kernel sends no
+    uevent for, such as NIC offload features toggled with ethtool, are only
+    noticed by a full collection, which `collect(full=True)` forces.
+
+    If `include` is supplied, only those fields are collected, as by the
+    `include` argument of the modules' `info()` functions. Each module is
+    passed the fields it supports. By default, every field is collected
+    except those a module lists in its `VOLATILE_FIELDS`, such as the usage
+    of partitions, which change all the time without the hardware changing.
+    """
+
+    def __init__(self, modules=None, include=None):
+        self.modules = tuple(modules or snapshot.MODULES)
+        self.include = None if include is None else tuple(include)
+        self._filesystem = fs.current()
+        # Keyed by module name
+        self._stamps = {}
+        self._envelopes = {}
+
+    def __repr__(self):
+        return "Collector(%s)" % ', '.join(self.modules)
+
+    @property
+    def state(self):
+        """A dict, keyed by module name, of the `hwk.serialize.envelope()`
+        form of each module's information as of the last collection.
+        """
+        return dict(self._envelopes)
+
+    def collect(self, full=False):
+        """Returns a dict, keyed by module name, of the list of changes to the
+        information of each module since the previous collection, as returned
+        by `hwk.diff.diff()`. Modules without changes are omitted. The first
+        collection returns every module's information in full.
+        """
+        res = {}
+        for name in self.modules:
+            changes = self.collect_module(name, full)
+            if changes:
+                res[name] = changes
+        return res
+
+    def collect_module(self, name, full=False):
+        """Like `collect()`, for the named module alone. Returns its list of
+        changes, which is empty if there are none.
+        """
+        with fs.on_host(self._filesystem):
+            return self._collect(name, full)
+
+    def _collect(self, name, full):
+        stamp = {"Linux": _linux_stamp}[fs.system()](name)
+        known = stamp is not None and name in self._envelopes
+        if known and not full and self._stamps.get(name) == stamp:
+            return []
+        module = importlib.import_module('hwk.' + name)
+        if self.include is None:
+            volatile = getattr(module, 'VOLATILE_FIELDS', ())
+            include = [f for f in module.FIELDS if f not in volatile]
+        else:
+            include = [f for f in self.include if f in module.FIELDS]
+        # Some modules memoize what they discover for the lifetime of the
+        # process, which is exactly what must not happen here
+        for value in vars(module).values():
+            cache_clear = getattr(value, 'cache_clear', None)
+            if cache_clear is not None:
+                cache_clear()
+        # Fields that were not included are left out rather than determined
+        envelope = serialize.envelope(
+            module.info(include=include), resolve=False)
+        changes = diff(self._envelopes.get(name), envelope)
+        self._stamps[name] = stamp
+        self._envelopes[name] = envelope
+        return changes
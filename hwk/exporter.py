@@ -0,0 +1,571 @@
+# -*- coding: utf-8 -*-
+
+# Licensed under the Apache License, Version 2.0 (the "License"); you may
+# not use this file except in compliance with the License. You may obtain
+# a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+# WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+# License for the specific language governing permissions and limitations
+# under the License.
+
+"""Exports hwk's information as Prometheus metrics, over HTTP on a local port
+or a unix socket:
+
+    $ hwk-exporter --listen 127.0.0.1:9101
+    $ hwk-exporter --unix /run/hwk/metrics.sock
+
+The exporter serves two kinds of metrics. The inventory (CPU packages,
+memory, disks, partitions, NICs, GPUs and NUMA nodes) is collected once and
+then kept up to date by a `hwk.diff.Collector`, which only re-probes what may
+have changed. CPU utilization, memory usage, disk I/O and NIC traffic are read
+by samplers on background timers.
+
+Each inventory module and each sampler renders its own section of the
+exposition text whenever it changes, and the sections are joined into a
+single buffer that replaces the previous one. Scrapes are answered with
+whichever buffer is current, so a scrape costs the same whatever the size of
+the host, and never waits for a collector or sampler.
+"""
+
+import argparse
+import os
+import stat
+import sys
+import threading
+import time
+
+import six
+from six.moves import BaseHTTPServer
+from six.moves import socketserver
+
+from hwk import cpu
+from hwk import diff
+from hwk import fs
+from hwk import memory
+from hwk import snapshot
+from hwk import utils
+
+DEFAULT_LISTEN = '127.0.0.1:9101'
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+_LINUX_PROC_DISKSTATS = '/proc/diskstats'
+_LINUX_PROC_NET_DEV = '/proc/net/dev'
+# The kernel counts disk I/O in 512-byte sectors whatever the size of the
+# device's blocks
+_DISKSTATS_SECTOR_SIZE = 512
+_CPU_MODES = (
+    'user', 'nice', 'system', 'idle', 'iowait', 'irq', 'softirq', 'steal',
+)
+# /proc/meminfo fields exported by the memory sampler
+_MEMINFO_METRICS = (
+    ('MemFree', 'hwk_memory_free_bytes', "Memory not in use at all."),
+    ('MemAvailable', 'hwk_memory_available_bytes',
+     "Memory available for new allocations without swapping."),
+    ('Buffers', 'hwk_memory_buffers_bytes', "Memory used by block buffers."),
+    ('Cached', 'hwk_memory_cached_bytes', "Memory used by the page cache."),
+    ('Dirty', 'hwk_memory_dirty_bytes',
+     "Memory waiting to be written back to disk."),
+    ('SwapTotal', 'hwk_memory_swap_total_bytes', "Total swap space."),
+    ('SwapFree', 'hwk_memory_swap_free_bytes', "Unused swap space."),
+)
+# (field index, metric name, scale, help) of the /proc/diskstats fields
+# exported by the block sampler. Field indexes count from the device name.
+_DISKSTATS_METRICS = (
+    (1, 'hwk_disk_reads_completed_total', 1, "Reads completed."),
+    (3, 'hwk_disk_read_bytes_total', _DISKSTATS_SECTOR_SIZE, "Bytes read."),
+    (4, 'hwk_disk_read_time_seconds_total', 0.001,
+     "Time spent on reads."),
+    (5, 'hwk_disk_writes_completed_total', 1, "Writes completed."),
+    (7, 'hwk_disk_written_bytes_total', _DISKSTATS_SECTOR_SIZE,
+     "Bytes written."),
+    (8, 'hwk_disk_write_time_seconds_total', 0.001,
+     "Time spent on writes."),
+    (9, 'hwk_disk_io_now', 1, "I/Os currently in progress."),
+    (10, 'hwk_disk_io_time_seconds_total', 0.001,
+     "Time spent doing I/O."),
+)
+# (field index, metric name, help) of the /proc/net/dev fields exported by
+# the network sampler. Field indexes count from the first receive field.
+_NET_DEV_METRICS = (
+    (0, 'hwk_nic_receive_bytes_total', "Bytes received."),
+    (1, 'hwk_nic_receive_packets_total', "Packets received."),
+    (2, 'hwk_nic_receive_errors_total', "Receive errors."),
+    (3, 'hwk_nic_receive_drop_total', "Received packets dropped."),
+    (8, 'hwk_nic_transmit_bytes_total', "Bytes transmitted."),
+    (9, 'hwk_nic_transmit_packets_total', "Packets transmitted."),
+    (10, 'hwk_nic_transmit_errors_total', "Transmit errors."),
+    (11, 'hwk_nic_transmit_drop_total', "Transmitted packets dropped."),
+)
+
+
+def _escape(value):
+    return six.text_type(value).strip().replace('\\', '\\\\').replace(
+        '"', '\\"').replace('\n', '\\n')
+
+
+def _value(value):
+    if isinstance(value, float):
+        return repr(value)
+    return six.text_type(value)
+
+
+def _render(families):
+    # Renders metric families, each a (name, type, help, samples) tuple in
+    # which samples are (labels, value) tuples and labels a tuple of (name,
+    # value) tuples, as Prometheus exposition text. Samples whose value is
+    # None are left out.
+    out = []
+    for name, kind, text, samples in families:
+        out.append('# HELP %s %s\n# TYPE %s %s\n' % (name, text, name, kind))
+        for labels, value in samples:
+            if value is None:
+                continue
+            if labels:
+                out.append('%s{%s} %s\n' % (name, ','.join(
+                    '%s="%s"' % (k, _escape(v)) for k, v in labels
+                    if v is not None
+                ), _value(value)))
+            else:
+                out.append('%s %s\n' % (name, _value(value)))
+    return ''.join(out).encode('utf-8')
+
+
+def _cpu_inventory(data):
+    cpus = data['cpus']
+    labels = [(('package', c['id']),) for c in cpus]
+    return [
+        ('hwk_cpu_info', 'gauge', "Physical CPU packages.", [
+            (label + (('vendor', c['vendor']), ('model', c['model'])), 1)
+            for label, c in zip(labels, cpus)
+        ]),
+        ('hwk_cpu_cores', 'gauge', "Physical cores of each package.", [
+            (label, c['cores']) for label, c in zip(labels, cpus)
+        ]),
+        ('hwk_cpu_threads', 'gauge', "Hardware threads of each package.", [
+            (label, c['threads']) for label, c in zip(labels, cpus)
+        ]),
+        ('hwk_cpu_usable_parallelism', 'gauge',
+         "Processors this process may use after cgroup limits.",
+         [((), data['usable_parallelism'])]),
+    ]
+
+
+def _memory_inventory(data):
+    return [
+        ('hwk_memory_physical_bytes', 'gauge', "Physical memory.",
+         [((), data['total_physical_bytes'])]),
+        ('hwk_memory_usable_bytes', 'gauge', "Memory usable by the kernel.",
+         [((), data['total_usable_bytes'])]),
+        ('hwk_memory_effective_bytes', 'gauge',
+         "Usable memory after cgroup limits.",
+         [((), data['effective_bytes'])]),
+    ]
+
+
+def _block_inventory(data):
+    disks = data['disks']
+    parts = [(d, p) for d in disks for p in d['partitions']]
+    return [
+        ('hwk_disk_info', 'gauge', "Disks.", [
+            ((('disk', d['name']), ('vendor', d['vendor']),
+              ('serial', d['serial_no']), ('bus_type', d['bus_type'])), 1)
+            for d in disks
+        ]),
+        ('hwk_disk_size_bytes', 'gauge', "Size of each disk.", [
+            ((('disk', d['name']),), d['size_bytes']) for d in disks
+        ]),
+        ('hwk_partition_size_bytes', 'gauge', "Size of each partition.", [
+            ((('disk', d['name']), ('partition', p['name']),
+              ('type', p['type']), ('mount_point', p['mount_point'])),
+             p['size_bytes'])
+            for d, p in parts
+        ]),
+    ]
+
+
+def _net_inventory(data):
+    return [
+        ('hwk_nic_info', 'gauge', "Network interfaces.", [
+            ((('nic', n['name']), ('mac', n['mac']), ('driver', n['driver']),
+              ('vendor', n['vendor']), ('model', n['model'])), 1)
+            for n in data['nics']
+        ]),
+    ]
+
+
+def _gpu_inventory(data):
+    return [
+        ('hwk_gpu_info', 'gauge', "Graphics processors.", [
+            ((('address', g['address']), ('driver', g['driver']),
+              ('vendor', g['vendor']), ('model', g['model'])), 1)
+            for g in data['gpus']
+        ]),
+    ]
+
+
+def _pci_inventory(data):
+    # Only devices with a PCI Express link, so that the virtual functions of
+    # SR-IOV capable NICs, which may number in the hundreds, are left out
+    devices = [d for d in data['devices'] if d['max_link_width'] is not None]
+    labels = [
+        (('address', d['address']), ('vendor_id', d['vendor_id']),
+         ('device_id', d['device_id']), ('driver', d['driver']),
+         ('node', d['numa_node']))
+        for d in devices
+    ]
+    return [
+        ('hwk_pci_link_width', 'gauge',
+         "Lanes the PCI Express link of each device runs with.", [
+             (label, d['current_link_width'])
+             for label, d in zip(labels, devices)
+         ]),
+        ('hwk_pci_link_max_width', 'gauge',
+         "Lanes each PCI Express device supports.", [
+             (label, d['max_link_width']) for label, d in zip(labels, devices)
+         ]),
+        ('hwk_pci_link_speed_gts', 'gauge',
+         "Speed of the PCI Express link of each device, in GT/s per lane.", [
+             (label, d['current_link_speed'])
+             for label, d in zip(labels, devices)
+         ]),
+    ]
+
+
+def _topology_inventory(data):
+    nodes = data['nodes']
+    return [
+        ('hwk_numa_node_processors', 'gauge',
+         "Logical processors of each NUMA node.", [
+             ((('node', n['id']),),
+              len(utils.ProcessorSet.from_cpulist(n['processor_set'])))
+             for n in nodes
+         ]),
+        ('hwk_numa_node_cores', 'gauge', "Physical cores of each NUMA node.", [
+            ((('node', n['id']),), len(n['cores'])) for n in nodes
+        ]),
+    ]
+
+
+_INVENTORY = {
+    'cpu': _cpu_inventory,
+    'memory': _memory_inventory,
+    'block': _block_inventory,
+    'net': _net_inventory,
+    'gpu': _gpu_inventory,
+    'pci': _pci_inventory,
+    'topology': _topology_inventory,
+}
+
+
+class CPUSampler(object):
+    """Renders the utilization of each logical processor over the interval
+    since the previous call, using a `hwk.cpu.Sampler`.
+    """
+
+    name = 'cpu'
+
+    def __init__(self):
+        self._sampler = cpu.Sampler()
+
+    def render(self, inventory):
+        u = self._sampler.sample()
+        ids = list(u.processor_set)
+        return _render([(
+            'hwk_cpu_utilization_ratio', 'gauge',
+            "Share of the last sampling interval each processor spent in "
+            "each mode.",
+            [((('cpu', x), ('mode', mode)), getattr(u, mode)[x] / 100.0)
+             for x in ids for mode in _CPU_MODES],
+        )])
+
+
+class MemorySampler(object):
+    """Renders memory usage from /proc/meminfo."""
+
+    name = 'memory'
+
+    def render(self, inventory):
+        values = memory._linux_meminfo()
+        return _render([
+            (metric, 'gauge', text, [((), values.get(six.b(key)))])
+            for key, metric, text in _MEMINFO_METRICS
+        ])
+
+
+class BlockSampler(object):
+    """Renders the I/O counters of the inventory's disks from
+    /proc/diskstats, which the kernel keeps for every block device in a single
+    file.
+    """
+
+    name = 'block'
+
+    def render(self, inventory):
+        disks = None
+        if 'block' in inventory:
+            disks = set(d['name'] for d in inventory['block']['disks'])
+        rows = []
+        with fs.open(_LINUX_PROC_DISKSTATS, 'r') as f:
+            for line in f:
+                fields = line.split()[2:]
+                if disks is None or fields[0] in disks:
+                    rows.append(fields)
+        return _render([
+            (metric, 'gauge' if metric.endswith('_now') else 'counter', text,
+             [((('disk', r[0]),), int(r[index]) * scale) for r in rows])
+            for index, metric, scale, text in _DISKSTATS_METRICS
+        ])
+
+
+class NetSampler(object):
+    """Renders the traffic counters of the inventory's NICs from
+    /proc/net/dev, which the kernel keeps for every interface in a single
+    file.
+    """
+
+    name = 'net'
+
+    def render(self, inventory):
+        nics = None
+        if 'net' in inventory:
+            nics = set(n['name'] for n in inventory['net']['nics'])
+        rows = []
+        with fs.open(_LINUX_PROC_NET_DEV, 'r') as f:
+            # The first two lines are headers
+            for line in list(f)[2:]:
+                name, _, counters = line.partition(':')
+                name = name.strip()
+                if nics is None or name in nics:
+                    rows.append((name, counters.split()))
+        return _render([
+            (metric, 'counter', text,
+             [((('nic', name),), int(c[index])) for name, c in rows])
+            for index, metric, text in _NET_DEV_METRICS
+        ])
+
+
+class Exporter(object):
+    """Maintains the Prometheus exposition text of the current
+    `hwk.fs.Filesystem` in `buffer`.
+
+    `start()` collects the inventory and runs every sampler once, then keeps
+    the inventory up to date every `inventory_interval` seconds and runs the
+    samplers every `interval` seconds, each on its own thread, until `stop()`
+    is called. Each update replaces `buffer` with a new bytes object, so
+    readers never see a partial update.
+    """
+
+    def __init__(self, interval=15.0, inventory_interval=300.0,
+                 modules=None, samplers=None):
+        self.interval = interval
+        self.inventory_interval = inventory_interval
+        self.buffer = b''
+        self._filesystem = fs.current()
+        self._collector = diff.Collector(modules)
+        if samplers is None:
+            samplers = [CPUSampler(), MemorySampler(), BlockSampler(),
+                        NetSampler()]
+        self._samplers = samplers
+        # Rendered sections and the seconds taken to render them, keyed by
+        # inventory module or sampler name
+        self._inventory = {}
+        self._samples = {}
+        self._durations = {}
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._threads = []
+
+    def __repr__(self):
+        return "Exporter(%r)" % self._filesystem
+
+    def refresh_inventory(self):
+        """Collects the inventory, re-rendering the modules that changed."""
+        for name in self._collector.modules:
+            start = time.time()
+            try:
+                changes = self._collector.collect_module(name)
+            except Exception as err:
+                sys.stderr.write("%s: %s\n" % (name, err))
+                continue
+            if changes:
+                info = self._collector.state[name]['info']
+                section = _render(_INVENTORY[name](info))
+                self._publish(
+                    self._inventory, name, section, time.time() - start)
+
+    def sample(self, sampler):
+        """Runs the supplied sampler and publishes what it renders."""
+        inventory = dict(
+            (name, e['info']) for name, e in self._collector.state.items())
+        start = time.time()
+        try:
+            with fs.on_host(self._filesystem):
+                section = sampler.render(inventory)
+        except Exception as err:
+            sys.stderr.write("%s sampler: %s\n" % (sampler.name, err))
+            section = None
+        self._publish(
+            self._samples, sampler.name, section, time.time() - start)
+
+    def _publish(self, sections, name, section, seconds):
+        # Stores the supplied section, or removes it if it is None, and
+        # replaces the buffer. The lock keeps two threads from publishing at
+        # once, where the buffer built from older sections could replace the
+        # newer one.
+        with self._lock:
+            if section is None:
+                sections.pop(name, None)
+            else:
+                sections[name] = section
+            key = name if sections is self._inventory else 'sampler:' + name
+            self._durations[key] = seconds
+            sections = [
+                self._inventory[name] for name in self._collector.modules
+                if name in self._inventory
+            ]
+            sections.extend(
+                self._samples[s.name] for s in self._samplers
+                if s.name in self._samples
+            )
+            sections.append(_render([(
+                'hwk_exporter_collect_seconds', 'gauge',
+                "Time taken by the last run of each collector.",
+                [((('collector', name),), seconds)
+                 for name, seconds in sorted(self._durations.items())],
+            )]))
+            self.buffer = b''.join(sections)
+
+    def _run(self, interval, fn, *args):
+        with fs.use(self._filesystem):
+            while not self._stop.wait(interval):
+                fn(*args)
+
+    def start(self):
+        with fs.use(self._filesystem):
+            self.refresh_inventory()
+            for sampler in self._samplers:
+                self.sample(sampler)
+        self._stop.clear()
+        targets = [(self.inventory_interval, self.refresh_inventory)]
+        targets.extend(
+            (self.interval, self.sample, s) for s in self._samplers)
+        for args in targets:
+            thread = threading.Thread(target=self._run, args=args)
+            thread.daemon = True
+            thread.start()
+            self._threads.append(thread)
+
+    def stop(self):
+        self._stop.set()
+        for thread in self._threads:
+            thread.join()
+        self._threads = []
+
+
+class _Handler(BaseHTTPServer.BaseHTTPRequestHandler):
+
+    def do_GET(self):
+        if self.path.split('?', 1)[0] not in ('/', '/metrics'):
+            self.send_error(404)
+            return
+        body = self.server.exporter.buffer
+        self.send_response(200)
+        self.send_header('Content-Type', CONTENT_TYPE)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+class _HTTPServer(socketserver.ThreadingMixIn, BaseHTTPServer.HTTPServer):
+    daemon_threads = True
+
+
+class _UnixHTTPServer(socketserver.ThreadingMixIn,
+                      socketserver.UnixStreamServer):
+    daemon_threads = True
+
+    def get_request(self):
+        # Unix sockets have no client address, which the request handler
+        # expects to be a (host, port) tuple
+        request, _ = self.socket.accept()
+        return request, ('', 0)
+
+
+def make_server(exporter, listen=None, unix_socket=None):
+    """Returns a server answering HTTP requests for / or /metrics with the
+    supplied `hwk.exporter.Exporter`'s buffer. It listens on the supplied unix
+    socket path if there is one, or on the supplied '[HOST:]PORT' address,
+    by default 127.0.0.1:9101. Call its `serve_forever()` method to serve.
+    """
+    if unix_socket is not None:
+        # A socket left behind by a previous run would make binding fail
+        try:
+            if stat.S_ISSOCK(os.stat(unix_socket).st_mode):
+                os.unlink(unix_socket)
+        except OSError:
+            pass
+        server = _UnixHTTPServer(unix_socket, _Handler)
+    else:
+        host, _, port = (listen or DEFAULT_LISTEN).rpartition(':')
+        server = _HTTPServer((host or '127.0.0.1', int(port)), _Handler)
+    server.exporter = exporter
+    return server
+
+
+def _parser():
+    parser = argparse.ArgumentParser(
+        prog='hwk-exporter',
+        description="Serve hwk's information as Prometheus metrics.",
+    )
+    parser.add_argument(
+        '--listen', default=DEFAULT_LISTEN, metavar='[HOST:]PORT',
+        help="Address to serve HTTP on (default: %(default)s).",
+    )
+    parser.add_argument(
+        '--unix', metavar='PATH',
+        help="Serve HTTP on this unix socket instead.",
+    )
+    parser.add_argument(
+        '--interval', type=float, default=15.0,
+        help="Seconds between samples (default: %(default)s).",
+    )
+    parser.add_argument(
+        '--inventory-interval', type=float, default=300.0,
+        help="Seconds between inventory updates (default: %(default)s).",
+    )
+    parser.add_argument(
+        '--root', default=None,
+        help="Read from a copy of a host's /sys and /proc trees under this "
+             "directory instead of the live host.",
+    )
+    return parser
+
+
+def main(argv=None):
+    args = _parser().parse_args(argv)
+    filesystem = fs.current()
+    if args.root is not None:
+        filesystem = fs.Filesystem(args.root)
+    with fs.use(filesystem):
+        exporter = Exporter(args.interval, args.inventory_interval,
+                            snapshot.MODULES)
+    exporter.start()
+    server = make_server(exporter, args.listen, args.unix)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        exporter.stop()
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
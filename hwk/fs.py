@@ -0,0 +1,273 @@
+# -*- coding: utf-8 -*-
+
+# Licensed under the Apache License, Version 2.0 (the "License"); you may
+# not use this file except in compliance with the License. You may obtain
+# a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+# WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+# License for the specific language governing permissions and limitations
+# under the License.
+
+"""All of hwk's reads of sysfs, procfs and friends, and all of the commands it
+runs, go through the functions in this module. They delegate to the
+`hwk.fs.Filesystem` that is current for the calling thread, which is the live
+host unless the caller selected another one with `hwk.fs.use()`:
+
+    >>> from hwk import fs, topology
+    >>> with fs.use('/srv/snapshots/host-0042'):
+    ...     topology.info()
+
+Since the current filesystem is tracked per thread, many threads may run
+discovery against different roots in the same process at once.
+"""
+
+import contextlib
+import os
+import platform
+import subprocess
+import threading
+
+import six
+
+_open = open
+
+
+class Filesystem(object):
+    """Provides access to the files and commands of a host.
+
+    All absolute paths are resolved relative to `root`, so a copy of a host's
+    /sys, /proc and /dev trees laid out under a directory can be inspected as
+    if it were the live host. Commands can only be run against the live host
+    (a root of '/'); for other roots `check_output()` raises
+    `subprocess.CalledProcessError`, which hwk's collectors already treat as
+    "information not available".
+    """
+
+    def __init__(self, root='/'):
+        self.root = os.path.abspath(root)
+        self.is_local = self.root == '/'
+
+    def __repr__(self):
+        return "%s(%r)" % (self.__class__.__name__, self.root)
+
+    @property
+    def key(self):
+        """A hashable value identifying the host this filesystem describes,
+        used to key caches of discovered information.
+        """
+        return (self.__class__.__name__, self.root)
+
+    def path(self, path):
+        """Returns the real path of the supplied host path."""
+        if self.is_local:
+            return path
+        return os.path.join(self.root, path.lstrip('/'))
+
+    def open(self, path, mode='r'):
+        return _open(self.path(path), mode)
+
+    def listdir(self, path):
+        return os.listdir(self.path(path))
+
+    def isdir(self, path):
+        return os.path.isdir(self.path(path))
+
+    def exists(self, path):
+        return os.path.exists(self.path(path))
+
+    def islink(self, path):
+        return os.path.islink(self.path(path))
+
+    def readlink(self, path):
+        return os.readlink(self.path(path))
+
+    def getmtime(self, path):
+        """Returns the last modification time of the host path, in seconds
+        since the epoch. Raises `OSError` if it cannot be determined.
+        """
+        return os.path.getmtime(self.path(path))
+
+    def statvfs(self, path):
+        """Returns the `os.statvfs()` result for the filesystem mounted at, or
+        containing, the host path. Raises `OSError` if it cannot be
+        determined. This may block for as long as the filesystem takes to
+        answer, which for a network filesystem may be forever.
+        """
+        return os.statvfs(self.path(path))
+
+    def realpath(self, path):
+        """Returns the host path with all symbolic links resolved."""
+        if self.is_local:
+            return os.path.realpath(path)
+        real = os.path.realpath(self.path(path))
+        if real == self.root:
+            return '/'
+        if real.startswith(self.root + os.sep):
+            return real[len(self.root):]
+        return real
+
+    def check_output(self, cmd, stderr=None):
+        if not self.is_local:
+            raise subprocess.CalledProcessError(127, cmd)
+        return subprocess.check_output(cmd, stderr=stderr)
+
+    def system(self):
+        """Returns the name of the host's operating system, as returned by
+        `platform.system()`.
+        """
+        if self.is_local:
+            return platform.system()
+        # Non-local roots are copies of Linux sysfs and procfs trees
+        return 'Linux'
+
+
+class Proxy(Filesystem):
+    """A `hwk.fs.Filesystem` that delegates everything to another filesystem.
+    Subclasses override the operations they want to observe or alter.
+    """
+
+    def __init__(self, filesystem):
+        self.filesystem = filesystem
+        self.root = filesystem.root
+        self.is_local = filesystem.is_local
+
+    def __repr__(self):
+        return "%s(%r)" % (self.__class__.__name__, self.filesystem)
+
+    @property
+    def key(self):
+        return self.filesystem.key
+
+    def path(self, path):
+        return self.filesystem.path(path)
+
+    def open(self, path, mode='r'):
+        return self.filesystem.open(path, mode)
+
+    def listdir(self, path):
+        return self.filesystem.listdir(path)
+
+    def isdir(self, path):
+        return self.filesystem.isdir(path)
+
+    def exists(self, path):
+        return self.filesystem.exists(path)
+
+    def islink(self, path):
+        return self.filesystem.islink(path)
+
+    def readlink(self, path):
+        return self.filesystem.readlink(path)
+
+    def getmtime(self, path):
+        return self.filesystem.getmtime(path)
+
+    def statvfs(self, path):
+        return self.filesystem.statvfs(path)
+
+    def realpath(self, path):
+        return self.filesystem.realpath(path)
+
+    def check_output(self, cmd, stderr=None):
+        return self.filesystem.check_output(cmd, stderr=stderr)
+
+    def system(self):
+        return self.filesystem.system()
+
+
+_default = Filesystem()
+_local = threading.local()
+
+
+def current():
+    """Returns the `hwk.fs.Filesystem` in use by the calling thread."""
+    return getattr(_local, 'filesystem', None) or _default
+
+
+def set_default(filesystem):
+    """Sets the `hwk.fs.Filesystem`, or root directory, used by threads that
+    have not selected one with `hwk.fs.use()`.
+    """
+    global _default
+    if isinstance(filesystem, six.string_types):
+        filesystem = Filesystem(filesystem)
+    _default = filesystem
+
+
+@contextlib.contextmanager
+def use(filesystem):
+    """Context manager that makes the calling thread use the supplied
+    `hwk.fs.Filesystem`, or root directory, for the duration of the block.
+    """
+    if isinstance(filesystem, six.string_types):
+        filesystem = Filesystem(filesystem)
+    prev = getattr(_local, 'filesystem', None)
+    _local.filesystem = filesystem
+    try:
+        yield filesystem
+    finally:
+        _local.filesystem = prev
+
+
+@contextlib.contextmanager
+def on_host(filesystem):
+    """Context manager like `hwk.fs.use()`, except that the calling thread's
+    current filesystem is kept if it describes the same host as the supplied
+    one, e.g. because it is a `hwk.fs.Proxy` for it. Objects that resolve
+    attributes after discovery use this to read from the host they were
+    discovered on without bypassing any tracing or metering in effect.
+    """
+    filesystem_now = current()
+    if filesystem_now.key == filesystem.key:
+        yield filesystem_now
+    else:
+        with use(filesystem) as res:
+            yield res
+
+
+def open(path, mode='r'):
+    return current().open(path, mode)
+
+
+def listdir(path):
+    return current().listdir(path)
+
+
+def isdir(path):
+    return current().isdir(path)
+
+
+def exists(path):
+    return current().exists(path)
+
+
+def islink(path):
+    return current().islink(path)
+
+
+def readlink(path):
+    return current().readlink(path)
+
+
+def realpath(path):
+    return current().realpath(path)
+
+
+def getmtime(path):
+    return current().getmtime(path)
+
+
+def statvfs(path):
+    return current().statvfs(path)
+
+
+def check_output(cmd, stderr=None):
+    return current().check_output(cmd, stderr=stderr)
+
+
+def system():
+    return current().system()
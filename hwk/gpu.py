@@ -13,11 +13,21 @@
 # under the License.
 
 import subprocess
-import sys
 
+import six
+
+from hwk import fs
+from hwk import serialize
+from hwk import trace
 from hwk import udev
+from hwk import utils
 
 _LINUX_SYS_BUS_PCI_DEVICES_DIR = '/sys/bus/pci/devices/'
+# Attributes of `GPU` objects that are determined on first access, and may be
+# determined for many GPUs at once with `prefetch()`
+PREFETCH_FIELDS = ('driver', 'model', 'vendor', 'vendor_id')
+# Fields that may be passed to `info(include=...)`
+FIELDS = PREFETCH_FIELDS
 _INFO_HELP = """GPU subsystem
 ===============================================================================
 `hwk.gpu.Info` attributes:
@@ -52,12 +62,17 @@ gpus (list of `hwk.gpu.GPU` objects)
   vendor_id (string)
 
     The ID of the vendor in hexadecimal, if known, e.g. '0x8086' or '0x168c'
+
+The driver, model, vendor and vendor_id attributes are determined on first
+access. Use `hwk.gpu.prefetch()` to determine them for many GPUs at once.
 """
 
 
 class Info(object):
     """Object describing the graphical processing units in a system."""
 
+    _SERIALIZED = ('gpus',)
+
     def __init__(self):
         self.gpus = []
 
@@ -69,15 +84,60 @@ class Info(object):
     def describe(self):
         return _INFO_HELP
 
+    def _prefetch(self):
+        prefetch(self.gpus)
+
+    def to_dict(self):
+        return serialize.to_dict(self)
+
+    @classmethod
+    def from_dict(cls, data):
+        res = cls()
+        res.gpus = [GPU.from_dict(g) for g in data['gpus']]
+        return res
+
 
 class GPU(object):
 
+    __slots__ = (
+        '_filesystem', '_udev', 'bus_type', 'address', '_driver', '_model',
+        '_vendor', '_vendor_id',
+    )
+    _SERIALIZED = ('bus_type', 'address') + PREFETCH_FIELDS
+
     def __init__(self):
-        self.model = None
-        self.vendor = None
+        self._filesystem = fs.current()
+        # The GPU's udev properties, if known
+        self._udev = None
         self.bus_type = None
         self.address = None
-        self.driver = None
+
+    def _properties(self):
+        if self._udev is None:
+            self._udev = udev.device_properties(
+                _LINUX_SYS_BUS_PCI_DEVICES_DIR + self.address)
+        return self._udev
+
+    @utils.lazy
+    def driver(self):
+        return utils.intern_str(self._properties().get('DRIVER'))
+
+    @utils.lazy
+    def model(self):
+        return utils.intern_str(
+            self._properties().get('ID_MODEL_FROM_DATABASE'))
+
+    @utils.lazy
+    def vendor(self):
+        return utils.intern_str(
+            self._properties().get('ID_VENDOR_FROM_DATABASE'))
+
+    @utils.lazy
+    def vendor_id(self):
+        pci_id = self._properties().get('PCI_ID')
+        if pci_id is None:
+            return None
+        return utils.intern_str('0x%s' % pci_id.split(':')[0].lower())
 
     def __repr__(self):
         vendor_str = ''
@@ -93,25 +153,50 @@ class GPU(object):
             model_str,
         )
 
+    def to_dict(self):
+        return serialize.to_dict(self)
+
+    @classmethod
+    def from_dict(cls, data):
+        res = cls()
+        res.bus_type = data['bus_type']
+        res.address = data['address']
+        for field in PREFETCH_FIELDS:
+            setattr(res, field, utils.intern_str(data[field]))
+        return res
 
-def info():
+
+def info(include=None):
     """Returns a `hwk.gpu.Info` object containing information on the GPUs
     available to the system, or None if the information could not be
     determined.
+
+    If include is supplied, only the fields it names, from those listed in
+    `hwk.gpu.FIELDS`, are determined, together with the bus type and address
+    of each GPU. They are determined for all GPUs at once, as
+    `hwk.gpu.prefetch()` does, rather than on first access.
     """
+    fields = utils.included(include, FIELDS)
     try:
-        return {
-            "linux2": _linux_info,
-        }[sys.platform]()
+        fn = {
+            "Linux": _linux_info,
+        }[fs.system()]
     except KeyError:
         return None
+    return fn(fields, include is not None)
 
 
-def _linux_info():
+@trace.collector
+def _linux_info(fields, prefetch):
     gpus = []
     cmd = ['lspci', '-D']
-    out = subprocess.check_output(cmd).strip()
-    for line in out.split('\n'):
+    try:
+        out = fs.check_output(cmd).strip()
+    except (OSError, subprocess.CalledProcessError):
+        # lspci is not installed, or we are inspecting a host we can't run
+        # commands on
+        out = six.b('')
+    for line in out.decode('utf8').split('\n'):
         if 'VGA' not in line:
             # TODO(jaypipes): Figure out if there are any GPUs that do **NOT**
             # indicate they are a VGA-compatible controller...
@@ -119,24 +204,54 @@ def _linux_info():
         # Matching lines look like:
         # 0000:03:00.0 VGA compatible controller: NVIDIA Corporation GF114\
         # [GeForce GTX 560 Ti] (rev a1)
-        pci_address = line[:12]
-        udev_path = _LINUX_SYS_BUS_PCI_DEVICES_DIR + pci_address
-        d_info = udev.device_properties(udev_path)
-
+        # The udev properties are determined when first accessed
         gpu = GPU()
-        gpu.address = pci_address
+        gpu.address = line[:12]
         gpu.bus_type = 'pci'
-
-        gpu.vendor = d_info.get('ID_VENDOR_FROM_DATABASE')
-        pci_id = d_info.get('PCI_ID')
-        if pci_id is not None:
-            vendor_id, product_id = pci_id.split(':')
-            vendor_id = '0x%s' % vendor_id.lower()
-            gpu.vendor_id = vendor_id
-        gpu.model = d_info.get('ID_MODEL_FROM_DATABASE')
-        gpu.driver = d_info.get('DRIVER')
         gpus.append(gpu)
 
     res = Info()
     res.gpus = gpus
+    if prefetch:
+        _linux_prefetch(gpus, fields)
     return res
+
+
+def prefetch(gpus, fields=None):
+    """Determines the named attributes, by default all of those listed in
+    `hwk.gpu.PREFETCH_FIELDS`, of the supplied `hwk.gpu.GPU` objects. The udev
+    properties of all GPUs are read with a single udevadm call rather than one
+    for each GPU. Attributes already determined are left as they are.
+    """
+    fields = utils.included(fields, PREFETCH_FIELDS)
+    if not gpus:
+        return
+    with fs.on_host(gpus[0]._filesystem):
+        {
+            "Linux": _linux_prefetch,
+        }[fs.system()](gpus, fields)
+
+
+def _linux_prefetch(gpus, fields):
+    lazy_fields = [GPU.__dict__[f] for f in fields]
+    missing = [
+        g for g in gpus
+        if g._udev is None and not all(f.is_resolved(g) for f in lazy_fields)
+    ]
+    db = udev.database() if fields and len(missing) > 1 else None
+    if db is not None:
+        for gpu in missing:
+            # The udev database is keyed by the path relative to /sys of the
+            # device /sys/bus/pci/devices/$ADDRESS links to
+            devpath = fs.realpath(_LINUX_SYS_BUS_PCI_DEVICES_DIR + gpu.address)
+            if devpath.startswith('/sys/'):
+                devpath = devpath[4:]
+            gpu._udev = db.get(devpath, {})
+    lazy_all = [GPU.__dict__[f] for f in PREFETCH_FIELDS]
+    for gpu in gpus:
+        for field in fields:
+            getattr(gpu, field)
+        # As for NICs, the udev properties are dropped once every attribute
+        # derived from them is determined
+        if gpu._udev is not None and all(f.is_resolved(gpu) for f in lazy_all):
+            gpu._udev = None
@@ -13,14 +13,20 @@
 # under the License.
 
 import gzip
+import io
 import math
 import os
-import platform
 import re
 import sys
 
 import six
 
+from hwk import cgroup
+from hwk import fs
+from hwk import serialize
+from hwk import trace
+from hwk import utils
+
 _INFO_HELP = """Memory subsystem
 ===============================================================================
 `hwk.memory.Info` attributes:
@@ -37,16 +43,44 @@ total_usable_bytes (int)
 supported_page_sizes (set of int)
 
   A set of ints indicating memory page sizes the system can utilize, in bytes
+
+limit_bytes (int)
+
+  The hard memory limit of the calling process' cgroup (cgroup v2 memory.max or
+  v1 memory.limit_in_bytes), or None if unlimited
+
+high_bytes (int)
+
+  The memory throttling threshold of the calling process' cgroup (cgroup v2
+  memory.high), or None if unlimited
+
+effective_bytes (int)
+
+  Number of bytes the calling process can actually use: total_usable_bytes
+  further limited by limit_bytes and high_bytes. Use this, not
+  total_usable_bytes, to size memory caches and pools inside containers
 """
 
 
+# Attributes of `Info` objects that may be passed to `info(include=...)`
+FIELDS = (
+    'total_physical_bytes', 'total_usable_bytes', 'supported_page_sizes',
+    'limit_bytes', 'high_bytes', 'effective_bytes',
+)
+
+
 class Info(object):
     """Object describing the memory information about a system."""
 
+    _SERIALIZED = FIELDS
+
     def __init__(self):
         self.total_physical_bytes = None
         self.total_usable_bytes = None
         self.supported_page_sizes = None
+        self.limit_bytes = None
+        self.high_bytes = None
+        self.effective_bytes = None
 
     def __repr__(self):
         tpb = 'unknown'
@@ -62,6 +96,18 @@ class Info(object):
     def describe(self):
         return _INFO_HELP
 
+    def to_dict(self):
+        return serialize.to_dict(self)
+
+    @classmethod
+    def from_dict(cls, data):
+        res = cls()
+        for field in FIELDS:
+            setattr(res, field, data[field])
+        if res.supported_page_sizes is not None:
+            res.supported_page_sizes = set(res.supported_page_sizes)
+        return res
+
 
 def supported_page_sizes():
     """Returns a set() containing the memory page sizes, in KB, supported by
@@ -70,18 +116,19 @@ def supported_page_sizes():
     try:
         return {
             "Linux": _linux_supported_page_sizes,
-        }[platform.system()]()
+        }[fs.system()]()
     except KeyError:
         return None
 
 
+@trace.collector
 def _linux_supported_page_sizes():
     # In Linux, /sys/kernel/mm/hugepages contains a directory per page size
     # supported by the kernel. The directory name corresponds to the pattern
     # 'hugepages-{pagesize}kb'
     hp_dir = '/sys/kernel/mm/hugepages'
-    return set([int(parts.split('-')[1][0:-2]) for parts in os.listdir(hp_dir)
-                if os.path.isdir(os.path.join(hp_dir, parts))])
+    return set([int(parts.split('-')[1][0:-2]) for parts in fs.listdir(hp_dir)
+                if fs.isdir(os.path.join(hp_dir, parts))])
 
 
 def total_physical_bytes():
@@ -91,7 +138,7 @@ def total_physical_bytes():
     try:
         return {
             "Linux": _linux_total_physical_bytes,
-        }[platform.system()]()
+        }[fs.system()]()
     except KeyError:
         return None
 
@@ -99,8 +146,13 @@ def total_physical_bytes():
 # System log lines will look similar to the following:
 # ... kernel: [0.000000] Memory: 24633272K/25155024K ...
 _SYSLOG_MEM_LINE_RE = re.compile(r'Memory:\s+\d+K\/(\d+)K')
+# Whether the warning that total physical bytes fell back to total usable
+# bytes has been written. It is written once per process, since watch loops
+# and exporters determine memory information over and over.
+_warned_physical_bytes = False
 
 
+@trace.collector
 def _linux_total_physical_bytes():
     # In Linux, the total physical memory can be determined by looking at the
     # output of dmidecode, however dmidecode requires root privileges to run,
@@ -113,22 +165,25 @@ def _linux_total_physical_bytes():
         return None
 
     log_dir = '/var/log'
-    log_files = sorted([
-        filename for filename in os.listdir(log_dir)
-        # /var/log will contain a file called syslog and 0 or more files called
-        # syslog.$NUMBER or syslog.$NUMBER.gz containing system log records. We
-        # search each, stopping when we match a system log record line that
-        # contains physical memory information.
-        if filename.startswith('syslog')
-    ])
+    try:
+        log_files = sorted([
+            filename for filename in fs.listdir(log_dir)
+            # /var/log will contain a file called syslog and 0 or more files
+            # called syslog.$NUMBER or syslog.$NUMBER.gz containing system log
+            # records. We search each, stopping when we match a system log
+            # record line that contains physical memory information.
+            if filename.startswith('syslog')
+        ])
+    except OSError:
+        return None
 
-    for filename in log_files:
-        unzip = filename.endswith('.gz')
-        if unzip:
-            opener = gzip.open
-        else:
-            opener = open
+    def opener(path, mode):
+        if path.endswith('.gz'):
+            with fs.open(path, mode) as f:
+                return gzip.GzipFile(fileobj=io.BytesIO(f.read()), mode=mode)
+        return fs.open(path, mode)
 
+    for filename in log_files:
         try:
             path = os.path.join(log_dir, filename)
             with opener(path, 'rb') as f:
@@ -141,17 +196,63 @@ def _linux_total_physical_bytes():
     return None
 
 
-def info():
+def info(include=None):
     """Returns a `hwk.memory.Info` object containing information on the memory
     available to the system, or None if the information could not be
     determined.
+
+    If include is supplied, only the attributes it names, from those listed
+    in `hwk.memory.FIELDS`, are determined. For example,
+    include=['total_usable_bytes'] reads /proc/meminfo but not the syslog or
+    the cgroup memory controller's files.
     """
+    fields = utils.included(include, FIELDS)
     return {
         "Linux": _linux_info,
-    }[platform.system()]()
+    }[fs.system()](fields)
+
+
+@trace.collector
+def _linux_info(fields):
+    global _warned_physical_bytes
+    res = Info()
+    if 'supported_page_sizes' in fields:
+        res.supported_page_sizes = _linux_supported_page_sizes()
+    # The effective bytes are the smallest of the usable bytes and the cgroup
+    # limits
+    if fields & set(('limit_bytes', 'high_bytes', 'effective_bytes')):
+        res.limit_bytes, res.high_bytes = cgroup.memory_limits()
+    tub = None
+    if fields & set(('total_usable_bytes', 'effective_bytes')):
+        tub = _linux_meminfo()[six.b('MemTotal')]
+        res.total_usable_bytes = tub
+    if 'effective_bytes' in fields:
+        res.effective_bytes = min(
+            b for b in (tub, res.limit_bytes, res.high_bytes)
+            if b is not None
+        )
+    if 'total_physical_bytes' in fields:
+        tpb = _linux_total_physical_bytes()
+        if tpb is None:
+            msg = """
+WARNING: Could not determine total physical bytes of memory. This may be due to
+the host being a virtual machine or container with no /var/log/syslog file, or
+the current user may not have necessary privileges to read the syslog. We are
+falling back to setting the total physical amount of memory to the total usable
+amount of memory
+"""
+            if not _warned_physical_bytes:
+                sys.stderr.write(msg)
+                sys.stderr.flush()
+                _warned_physical_bytes = True
+            if tub is None:
+                tub = _linux_meminfo()[six.b('MemTotal')]
+            tpb = tub
+        res.total_physical_bytes = tpb
+    return res
 
 
-def _linux_info():
+def _linux_meminfo():
     # In Linux, /proc/meminfo contains a set of memory-related amounts, with
     # lines looking like the following:
     #
@@ -175,32 +276,14 @@ def _linux_info():
     #
     #  https://www.kernel.org/doc/Documentation/filesystems/proc.txt
     mem_filepath = '/proc/meminfo'
-    meminfo_lines = open(mem_filepath, 'rb').readlines()
+    meminfo_lines = fs.open(mem_filepath, 'rb').readlines()
     values = {}
     for line in meminfo_lines:
         parts = line.split()
         key = parts[0].strip(six.b(': '))
         value = int(parts[1].strip())
-        in_kb = (len(parts) == 3 and parts[2].strip() == 'kB')
+        in_kb = (len(parts) == 3 and parts[2].strip() == six.b('kB'))
         if in_kb:
             value = value * 1024
         values[key] = value
-
-    res = Info()
-    res.supported_page_sizes = _linux_supported_page_sizes()
-    tub = values[six.b('MemTotal')]
-    tpb = _linux_total_physical_bytes()
-    if tpb is None:
-        msg = """
-WARNING: Could not determine total physical bytes of memory. This may be due to
-the host being a virtual machine or container with no /var/log/syslog file, or
-the current user may not have necessary privileges to read the syslog. We are
-falling back to setting the total physical amount of memory to the total usable
-amount of memory
-"""
-        sys.stderr.write(msg)
-        sys.stderr.flush()
-        tpb = tub
-    res.total_physical_bytes = tpb
-    res.total_usable_bytes = tub
-    return res
+    return values
@@ -14,14 +14,38 @@
 
 import os
 import subprocess
-import platform
 
 import six
 
+from hwk import fs
+from hwk import serialize
+from hwk import trace
 from hwk import udev
+from hwk import utils
 
 
 _LINUX_SYS_CLASS_NET_DIR = '/sys/class/net'
+# Attributes of `NIC` objects that are determined on first access, and may be
+# determined for many NICs at once with `prefetch()`
+PREFETCH_FIELDS = (
+    'bus_type', 'driver', 'model', 'vendor', 'vendor_id', 'enabled_features',
+    'speed', 'duplex', 'carrier', 'operstate', 'mtu', 'tx_queue_len',
+    'numa_node',
+)
+# The subset of PREFETCH_FIELDS that come from udev
+_UDEV_FIELDS = ('bus_type', 'driver', 'model', 'vendor', 'vendor_id')
+# The subset of PREFETCH_FIELDS describing the state of the link, which
+# `refresh()` reads again
+LINK_FIELDS = (
+    'speed', 'duplex', 'carrier', 'operstate', 'mtu', 'tx_queue_len',
+    'numa_node',
+)
+# Fields that may be passed to `info(include=...)`
+FIELDS = ('mac',) + PREFETCH_FIELDS
+# Fields whose values change continually rather than when the hardware or its
+# configuration changes. `hwk.diff.Collector` leaves them out unless asked for
+# them.
+VOLATILE_FIELDS = ('speed', 'duplex', 'carrier', 'operstate')
 _INFO_HELP = """Network subsystem
 ===============================================================================
 `hwk.net.Info` attributes:
@@ -61,16 +85,57 @@ nics (list of `hwk.net.NIC` objects)
 
     The ID of the vendor in hexadecimal, if known, e.g. '0x8086' or '0x168c'
 
-  enabled_features (set of string)
+  enabled_features (frozenset of string)
 
     The set of features the NIC supports and has enabled, e.g.
     'rx-vlan-offload', 'tx-gso-partial', etc
+
+  speed (int)
+
+    The speed of the link in Mb/s, or None if it is down or unknown
+
+  duplex (string)
+
+    'full' or 'half', or None if the link is down or the duplex is unknown
+
+  carrier (bool)
+
+    True if the NIC detects a link, or None if the NIC is administratively
+    down
+
+  operstate (string)
+
+    The operational state of the interface as defined by RFC 2863, e.g. 'up',
+    'down', 'dormant' or 'lowerlayerdown', or 'unknown' for interfaces, such
+    as some virtual ones, that do not report one
+
+  mtu (int)
+
+    The maximum transmission unit in bytes
+
+  tx_queue_len (int)
+
+    The length of the transmit queue in packets
+
+  numa_node (int)
+
+    The NUMA node the NIC's device is attached to, or None if unknown, e.g.
+    for virtual interfaces and on hosts with a single node
+
+All attributes other than name and mac_address are determined on first
+access. Use `hwk.net.prefetch()` to determine them for many NICs at once.
+
+The link attributes, speed through numa_node, are read from sysfs together,
+one file each. `hwk.net.refresh()` reads them again for many NICs, and nothing
+else, which makes it cheap enough to poll the health of links with.
 """
 
 
 class Info(object):
     """Object describing the network information about a system."""
 
+    _SERIALIZED = ('nics',)
+
     def __init__(self):
         self.nics = []
 
@@ -82,37 +147,140 @@ class Info(object):
     def describe(self):
         return _INFO_HELP
 
+    def _prefetch(self):
+        prefetch(self.nics)
+
+    def to_dict(self):
+        return serialize.to_dict(self)
+
+    @classmethod
+    def from_dict(cls, data):
+        res = cls()
+        res.nics = [NIC.from_dict(n) for n in data['nics']]
+        return res
+
 
 class NIC(object):
 
+    __slots__ = (
+        '_filesystem', '_link', '_udev', 'name', 'mac', '_bus_type',
+        '_driver', '_model', '_vendor', '_vendor_id', '_enabled_features',
+        '_speed', '_duplex', '_carrier', '_operstate', '_mtu',
+        '_tx_queue_len', '_numa_node',
+    )
+    _SERIALIZED = ('name', 'mac') + PREFETCH_FIELDS
+
     def __init__(self, name):
+        self._filesystem = fs.current()
+        # Target of the /sys/class/net/$NAME link and the NIC's udev
+        # properties, if known
+        self._link = None
+        self._udev = None
         self.name = name
-        self.bus_type = None
-        self.driver = None
         self.mac = None
-        self.model = None
-        self.vendor = None
-        self.vendor_id = None
-        self.enabled_features = set()
+
+    def _properties(self):
+        if self._udev is None:
+            self._udev = _linux_nic_properties(self.name, self._link)
+        return self._udev
+
+    @utils.lazy
+    def bus_type(self):
+        return utils.intern_str(self._properties().get('ID_BUS'))
+
+    @utils.lazy
+    def driver(self):
+        return utils.intern_str(self._properties().get('ID_NET_DRIVER'))
+
+    @utils.lazy
+    def model(self):
+        return utils.intern_str(
+            self._properties().get('ID_MODEL_FROM_DATABASE'))
+
+    @utils.lazy
+    def vendor(self):
+        return utils.intern_str(
+            self._properties().get('ID_VENDOR_FROM_DATABASE'))
+
+    @utils.lazy
+    def vendor_id(self):
+        return utils.intern_str(self._properties().get('ID_VENDOR_ID'))
+
+    @utils.lazy
+    def enabled_features(self):
+        features = _linux_nic_features(self.name)
+        if features is None:
+            return utils.intern_set(())
+        return utils.intern_set(features[1])
+
+    # The link attributes are read together by `refresh()`, whichever of them
+    # is accessed first
+    def _link_state(self, field):
+        _linux_refresh([self])
+        return getattr(self, field)
+
+    @utils.lazy
+    def speed(self):
+        return self._link_state('speed')
+
+    @utils.lazy
+    def duplex(self):
+        return self._link_state('duplex')
+
+    @utils.lazy
+    def carrier(self):
+        return self._link_state('carrier')
+
+    @utils.lazy
+    def operstate(self):
+        return self._link_state('operstate')
+
+    @utils.lazy
+    def mtu(self):
+        return self._link_state('mtu')
+
+    @utils.lazy
+    def tx_queue_len(self):
+        return self._link_state('tx_queue_len')
+
+    @utils.lazy
+    def numa_node(self):
+        return self._link_state('numa_node')
 
     def __repr__(self):
         vendor_str = ''
         if self.vendor is not None:
-            vendor_str = ' [' + self.vendor.strip().decode('utf8') + ']'
+            vendor_str = ' [' + self.vendor.strip() + ']'
         model_str = ''
         if self.model is not None:
-            model_str = ' - ' + self.model.strip().decode('utf8')
+            model_str = ' - ' + self.model.strip()
         return "NIC %s%s%s" % (
             self.name,
             vendor_str,
             model_str,
         )
 
+    def to_dict(self):
+        return serialize.to_dict(self)
+
+    @classmethod
+    def from_dict(cls, data):
+        res = cls(data['name'])
+        res.mac = data['mac']
+        for field in _UDEV_FIELDS:
+            setattr(res, field, utils.intern_str(data[field]))
+        res.enabled_features = utils.intern_set(data['enabled_features'])
+        # Serialized before NICs had link attributes
+        for field in LINK_FIELDS:
+            setattr(res, field, data.get(field))
+        return res
+
 
+@trace.collector
 def _linux_nic_features(nic_name):
     cmd = ['ethtool', '-k', nic_name]
     try:
-        out = subprocess.check_output(cmd)
+        out = fs.check_output(cmd)
         # The output of `ethtool -k <nic>` looks like the following:
         # $ ethtool -k enp0s25
         # Features for enp0s25:
@@ -179,7 +347,8 @@ def _linux_nic_features(nic_name):
             if on:
                 enabled.add(feature)
         return all_features, enabled
-    except subprocess.CalledProcessError:
+    except (OSError, subprocess.CalledProcessError):
+        # ethtool is missing or failed
         return None
 
 
@@ -190,9 +359,10 @@ def nic_features(nic_name):
     """
     return {
         "Linux": _linux_nic_features,
-    }[platform.system()](nic_name)
+    }[fs.system()](nic_name)
 
 
+@trace.collector
 def _linux_net_device_mac_address(dev):
     # Instead of use udevadm, we can get the device's MAC address by examing
     # the /sys/class/net/$DEVICE/address file in sysfs. However, for devices
@@ -204,55 +374,591 @@ def _linux_net_device_mac_address(dev):
             dev,
             'addr_assign_type',
         )
-        aat = int(open(aat_path, 'r').read().strip())
+        aat = int(fs.open(aat_path, 'r').read().strip())
         if aat != 0:
             return None
         addr_path = os.path.join(_LINUX_SYS_CLASS_NET_DIR, dev, 'address')
-        return open(addr_path, 'r').read().strip()
+        return fs.open(addr_path, 'r').read().strip()
     except IOError:
         return None
 
 
-def info():
+def info(include=None):
     """Returns a `hwk.net.Info` object containing information on the network
     subsystem, or None if the information could not be determined.
+
+    If include is supplied, only the fields it names, from those listed in
+    `hwk.net.FIELDS`, are determined, together with the NIC names. For
+    example, include=['mac', 'driver'] reads the MAC addresses and the udev
+    database but never runs ethtool. Fields that are otherwise determined on
+    first access are determined for all NICs at once, as `hwk.net.prefetch()`
+    does.
     """
+    fields = utils.included(include, FIELDS)
     return {
         "Linux": _linux_info,
-    }[platform.system()]()
+    }[fs.system()](fields, include is not None)
 
 
-def _linux_info():
+@trace.collector
+def _linux_info(fields, prefetch):
     nics = []
-    for filename in os.listdir(_LINUX_SYS_CLASS_NET_DIR):
+    for filename in fs.listdir(_LINUX_SYS_CLASS_NET_DIR):
         # Ignore loopback...
         if filename == 'lo':
             continue
 
         net_path = os.path.join(_LINUX_SYS_CLASS_NET_DIR, filename)
-        dest = os.readlink(net_path)
-        if 'virtio' in dest:
-            # Don't bother using udevadm for virtual devices... we'll get an
-            # error "query needs a valid device specified by --path= or
-            # --name="
-            d_info = {}
-        else:
-            udev_path = _LINUX_SYS_CLASS_NET_DIR + '/' + filename
-            d_info = udev.device_properties(udev_path)
-
         nic = NIC(filename)
-
-        nic.mac = _linux_net_device_mac_address(filename)
-        nic.vendor = d_info.get('ID_VENDOR_FROM_DATABASE')
-        nic.vendor_id = d_info.get('ID_VENDOR_ID')
-        nic.model = d_info.get('ID_MODEL_FROM_DATABASE')
-        nic.bus_type = d_info.get('ID_BUS')
-        nic.driver = d_info.get('ID_NET_DRIVER')
-        features = _linux_nic_features(filename)
-        if features is not None:
-            nic.enabled_features = features[1]
+        nic._link = fs.readlink(net_path)
+        if 'mac' in fields:
+            nic.mac = _linux_net_device_mac_address(filename)
+        # The udev properties and features are determined when first accessed
         nics.append(nic)
 
     res = Info()
     res.nics = nics
+    if prefetch:
+        _linux_prefetch(nics, fields & set(PREFETCH_FIELDS))
+    return res
+
+
+def refresh(nics):
+    """Reads the link attributes listed in `hwk.net.LINK_FIELDS`, such as
+    speed, carrier and operstate, of the supplied `hwk.net.NIC` objects again,
+    and returns the NICs. Each attribute is read from sysfs once per NIC, and
+    nothing else is determined, so this is cheap enough to call every few
+    seconds to watch the health of links:
+
+        >>> nics = net.info().nics
+        >>> while True:
+        ...     for nic in net.refresh(nics):
+        ...         if nic.carrier is False:
+        ...             alert(nic.name)
+        ...     time.sleep(5)
+    """
+    if not nics:
+        return nics
+    with fs.on_host(nics[0]._filesystem):
+        {
+            "Linux": _linux_refresh,
+        }[fs.system()](nics)
+    return nics
+
+
+def _read(path):
+    # Some attributes cannot be read in some states: speed and duplex fail
+    # with EINVAL when the link is down, and carrier when the interface is
+    # administratively down
+    try:
+        with fs.open(path, 'r') as f:
+            return f.read().strip()
+    except (IOError, OSError):
+        return None
+
+
+def _int(value):
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def _speed(value):
+    # Drivers report -1, or 4294967295 as an unsigned number, for an unknown
+    # speed
+    speed = _int(value)
+    if speed is not None and not 0 < speed < 0xffffffff:
+        return None
+    return speed
+
+
+def _duplex(value):
+    # 'unknown' if the driver does not know
+    if value not in ('full', 'half'):
+        return None
+    return utils.intern_str(value)
+
+
+def _carrier(value):
+    return None if value is None else value == '1'
+
+
+def _numa_node(value):
+    # The kernel reports -1 for devices on hosts without NUMA
+    node = _int(value)
+    if node is not None and node < 0:
+        return None
+    return node
+
+
+# The file under /sys/class/net/$NIC holding each link attribute, and the
+# function converting its contents. Virtual interfaces have no device, so no
+# NUMA node.
+_LINUX_LINK_FILES = {
+    'speed': ('speed', _speed),
+    'duplex': ('duplex', _duplex),
+    'carrier': ('carrier', _carrier),
+    'operstate': ('operstate', utils.intern_str),
+    'mtu': ('mtu', _int),
+    'tx_queue_len': ('tx_queue_len', _int),
+    'numa_node': ('device/numa_node', _numa_node),
+}
+
+
+@trace.collector
+def _linux_refresh(nics, fields=LINK_FIELDS):
+    files = [(f,) + _LINUX_LINK_FILES[f] for f in LINK_FIELDS if f in fields]
+    for nic in nics:
+        path = _LINUX_SYS_CLASS_NET_DIR + '/' + nic.name + '/'
+        for field, filename, convert in files:
+            setattr(nic, field, convert(_read(path + filename)))
+
+
+def _linux_nic_properties(nic_name, link):
+    if link is not None and 'virtio' in link:
+        # Don't bother using udevadm for virtual devices... we'll get an
+        # error "query needs a valid device specified by --path= or
+        # --name="
+        return {}
+    return udev.device_properties(_LINUX_SYS_CLASS_NET_DIR + '/' + nic_name)
+
+
+def prefetch(nics, fields=None):
+    """Determines the named attributes, by default all of those listed in
+    `hwk.net.PREFETCH_FIELDS`, of the supplied `hwk.net.NIC` objects. The udev
+    properties of all NICs are read with a single udevadm call rather than one
+    for each NIC. Attributes already determined are left as they are.
+    """
+    fields = utils.included(fields, PREFETCH_FIELDS)
+    if not nics:
+        return
+    with fs.on_host(nics[0]._filesystem):
+        {
+            "Linux": _linux_prefetch,
+        }[fs.system()](nics, fields)
+
+
+def _linux_prefetch(nics, fields):
+    # Only the link attributes asked for are read, since the volatile ones
+    # must be left out of what `hwk.diff.Collector` collects
+    link_fields = [f for f in LINK_FIELDS if f in fields]
+    if link_fields:
+        lazy_link = [NIC.__dict__[f] for f in link_fields]
+        _linux_refresh([
+            n for n in nics if not all(f.is_resolved(n) for f in lazy_link)
+        ], link_fields)
+    udev_fields = [NIC.__dict__[f] for f in _UDEV_FIELDS if f in fields]
+    if udev_fields:
+        missing = [
+            n for n in nics if n._udev is None
+            if not all(f.is_resolved(n) for f in udev_fields)
+        ]
+        db = udev.database() if len(missing) > 1 else None
+        if db is not None:
+            for nic in missing:
+                if nic._link is not None and 'virtio' in nic._link:
+                    nic._udev = {}
+                    continue
+                # The link's target is relative to /sys/class/net, e.g.
+                # '../../devices/pci0000:00/0000:00:19.0/net/enp0s25', while
+                # the udev database is keyed by the path relative to /sys
+                devpath = os.path.normpath(os.path.join(
+                    _LINUX_SYS_CLASS_NET_DIR, nic._link or nic.name))
+                if devpath.startswith('/sys/'):
+                    devpath = devpath[4:]
+                nic._udev = db.get(devpath, {})
+    lazy_udev = [NIC.__dict__[f] for f in _UDEV_FIELDS]
+    for nic in nics:
+        for field in fields:
+            getattr(nic, field)
+        # Once every udev attribute is determined, the NIC's udev properties
+        # are no longer needed, and are by far the largest thing it holds
+        if nic._udev is not None and \
+                all(f.is_resolved(nic) for f in lazy_udev):
+            nic._udev = None
+
+
+_LINUX_SYS_BUS_PCI_DEVICES_DIR = '/sys/bus/pci/devices'
+# Drivers that hand a PCI device over to user space or a virtual machine
+# rather than drive it in the kernel
+_PASSTHROUGH_DRIVERS = frozenset([
+    'vfio-pci', 'pci-stub', 'uio_pci_generic', 'igb_uio',
+])
+_GRAPH_HELP = """Network interface graph
+===============================================================================
+`hwk.net.Graph` attributes:
+
+pfs (dict of string to `hwk.net.PF` object)
+
+  The SR-IOV capable NICs (physical functions) of the host, keyed by name
+
+  `hwk.net.PF` attributes:
+
+  name (string)
+
+    Name of the NIC, e.g. 'enp130s0f0'
+
+  address (string)
+
+    PCI address of the NIC, e.g. '0000:82:00.0'
+
+  numa_node (int)
+
+    The NUMA node the NIC is attached to, or None if unknown
+
+  total_vfs (int)
+
+    The most virtual functions the NIC supports
+
+  num_vfs (int)
+
+    The number of virtual functions enabled
+
+  vfs (list of `hwk.net.VF` objects)
+
+    The enabled virtual functions, in order
+
+    `hwk.net.VF` attributes:
+
+    index (int)
+
+      The number of the virtual function on its PF
+
+    address (string)
+
+      PCI address of the virtual function
+
+    pf (string)
+
+      Name of the PF
+
+    numa_node (int)
+
+      The NUMA node of the PF
+
+    driver (string)
+
+      The driver bound to the virtual function, or None, e.g. 'iavf' or
+      'vfio-pci'
+
+    name (string)
+
+      Name of the virtual function's network interface, if it has one
+
+    in_use (bool)
+
+      True if the virtual function is bound to a driver that passes it
+      through to user space or a virtual machine, such as vfio-pci, or its
+      network interface is a port of a bond or bridge
+
+bonds (dict of string to `hwk.net.Bond` object)
+
+  The bonding interfaces of the host, keyed by name
+
+  `hwk.net.Bond` attributes:
+
+  name (string)
+
+  mode (string)
+
+    The bonding mode, e.g. '802.3ad' or 'active-backup'
+
+  slaves (tuple of string)
+
+    Names of the interfaces in the bond
+
+bridges (dict of string to `hwk.net.Bridge` object)
+
+  The bridges of the host, keyed by name
+
+  `hwk.net.Bridge` attributes:
+
+  name (string)
+
+  ports (tuple of string)
+
+    Names of the interfaces attached to the bridge
+
+masters (dict of string to string)
+
+  The bond or bridge each interface belongs to, keyed by interface name
+
+`hwk.net.Graph` methods:
+
+free_vfs(numa_node=None, pf=None)
+
+  Returns the virtual functions that are not in use, of all PFs, of the PFs
+  attached to the supplied NUMA node, or of the named PF
+"""
+
+
+class VF(object):
+    """Object describing a virtual function of an SR-IOV capable NIC."""
+
+    __slots__ = (
+        'index', 'address', 'pf', 'numa_node', 'driver', 'name', 'in_use',
+    )
+    _SERIALIZED = __slots__
+
+    def __init__(self, index, address, pf):
+        self.index = index
+        self.address = address
+        self.pf = pf
+        self.numa_node = None
+        self.driver = None
+        self.name = None
+        self.in_use = None
+
+    def __repr__(self):
+        return "VF %s#%d @pci:%s [%s]%s" % (
+            self.pf,
+            self.index,
+            self.address,
+            self.driver,
+            ' (in use)' if self.in_use else '',
+        )
+
+    def to_dict(self):
+        return serialize.to_dict(self)
+
+    @classmethod
+    def from_dict(cls, data):
+        res = cls(data['index'], data['address'], data['pf'])
+        for name in cls._SERIALIZED[3:]:
+            setattr(res, name, data[name])
+        return res
+
+
+class PF(object):
+    """Object describing an SR-IOV capable NIC, or physical function."""
+
+    __slots__ = (
+        'name', 'address', 'numa_node', 'total_vfs', 'num_vfs', 'vfs',
+    )
+    _SERIALIZED = __slots__
+
+    def __init__(self, name, address):
+        self.name = name
+        self.address = address
+        self.numa_node = None
+        self.total_vfs = None
+        self.num_vfs = None
+        self.vfs = []
+
+    def __repr__(self):
+        return "PF %s @pci:%s (%s of %s VFs, node %s)" % (
+            self.name,
+            self.address,
+            self.num_vfs,
+            self.total_vfs,
+            self.numa_node,
+        )
+
+    def to_dict(self):
+        return serialize.to_dict(self)
+
+    @classmethod
+    def from_dict(cls, data):
+        res = cls(data['name'], data['address'])
+        res.numa_node = data['numa_node']
+        res.total_vfs = data['total_vfs']
+        res.num_vfs = data['num_vfs']
+        res.vfs = [VF.from_dict(v) for v in data['vfs']]
+        return res
+
+
+class Bond(object):
+    """Object describing a bonding interface."""
+
+    __slots__ = ('name', 'mode', 'slaves')
+    _SERIALIZED = __slots__
+
+    def __init__(self, name, mode=None, slaves=()):
+        self.name = name
+        self.mode = mode
+        self.slaves = tuple(slaves)
+
+    def __repr__(self):
+        return "bond %s [%s] (%s)" % (
+            self.name, self.mode, ', '.join(self.slaves))
+
+    def to_dict(self):
+        return serialize.to_dict(self)
+
+    @classmethod
+    def from_dict(cls, data):
+        return cls(data['name'], data['mode'], data['slaves'])
+
+
+class Bridge(object):
+    """Object describing a bridge."""
+
+    __slots__ = ('name', 'ports')
+    _SERIALIZED = __slots__
+
+    def __init__(self, name, ports=()):
+        self.name = name
+        self.ports = tuple(ports)
+
+    def __repr__(self):
+        return "bridge %s (%s)" % (self.name, ', '.join(self.ports))
+
+    def to_dict(self):
+        return serialize.to_dict(self)
+
+    @classmethod
+    def from_dict(cls, data):
+        return cls(data['name'], data['ports'])
+
+
+class Graph(object):
+    """Object describing how the network interfaces of a system relate to
+    each other: the virtual functions of SR-IOV capable NICs, and the
+    interfaces in bonds and bridges.
+    """
+
+    _SERIALIZED = ('pfs', 'bonds', 'bridges')
+
+    def __init__(self, pfs=(), bonds=(), bridges=()):
+        self.pfs = dict((p.name, p) for p in pfs)
+        self.bonds = dict((b.name, b) for b in bonds)
+        self.bridges = dict((b.name, b) for b in bridges)
+        self.masters = _masters(bonds, bridges)
+        # The free virtual functions of each PF and of the PFs on each NUMA
+        # node are determined once, so that a scheduler's queries are
+        # dictionary lookups
+        self._free_by_pf = {}
+        self._free_by_node = {}
+        for pf in sorted(self.pfs.values(), key=lambda p: p.name):
+            free = [vf for vf in pf.vfs if not vf.in_use]
+            self._free_by_pf[pf.name] = free
+            self._free_by_node.setdefault(pf.numa_node, []).extend(free)
+
+    def __repr__(self):
+        return "net graph (%d PFs, %d VFs, %d bonds, %d bridges)" % (
+            len(self.pfs),
+            sum(len(p.vfs) for p in self.pfs.values()),
+            len(self.bonds),
+            len(self.bridges),
+        )
+
+    def describe(self):
+        return _GRAPH_HELP
+
+    def free_vfs(self, numa_node=None, pf=None):
+        if pf is not None:
+            return list(self._free_by_pf.get(pf, ()))
+        if numa_node is not None:
+            return list(self._free_by_node.get(numa_node, ()))
+        return [vf for vfs in self._free_by_pf.values() for vf in vfs]
+
+    def to_dict(self):
+        res = {}
+        for name in self._SERIALIZED:
+            objs = getattr(self, name)
+            res[name] = [objs[key].to_dict() for key in sorted(objs)]
+        return res
+
+    @classmethod
+    def from_dict(cls, data):
+        return cls(
+            [PF.from_dict(p) for p in data['pfs']],
+            [Bond.from_dict(b) for b in data['bonds']],
+            [Bridge.from_dict(b) for b in data['bridges']],
+        )
+
+
+def _masters(bonds, bridges):
+    # Returns a dict of the name of each interface in the supplied bonds and
+    # bridges to the name of the bond or bridge
+    res = {}
+    for bond in bonds:
+        for name in bond.slaves:
+            res[name] = bond.name
+    for bridge in bridges:
+        for name in bridge.ports:
+            res[name] = bridge.name
     return res
+
+
+def graph():
+    """Returns a `hwk.net.Graph` object describing the SR-IOV virtual
+    functions, bonds and bridges of the host's network interfaces.
+    """
+    return {
+        "Linux": _linux_graph,
+    }[fs.system()]()
+
+
+def _listdir(path):
+    try:
+        return fs.listdir(path)
+    except OSError:
+        return None
+
+
+def _link_name(path):
+    # Returns the last component of the target of the link at the supplied
+    # path, or None if there is no link
+    try:
+        return os.path.basename(fs.readlink(path))
+    except OSError:
+        return None
+
+
+@trace.collector
+def _linux_graph():
+    # Every interface in /sys/class/net is looked at once:
+    #
+    # bonding/mode and bonding/slaves: only present for bonds, e.g.
+    #   '802.3ad 4' and 'ens1f0 ens2f0'
+    # brif/: only present for bridges, with an entry for each port
+    # device/sriov_totalvfs and device/sriov_numvfs: only present for SR-IOV
+    #   capable NICs
+    # device/virtfn0, device/virtfn1, ...: links to the PCI devices of the
+    #   enabled virtual functions, e.g. ../0000:82:02.0
+    #
+    # The driver and network interface of each virtual function are found in
+    # its PCI device's directory.
+    pfs = []
+    bonds = []
+    bridges = []
+    for name in sorted(fs.listdir(_LINUX_SYS_CLASS_NET_DIR)):
+        path = _LINUX_SYS_CLASS_NET_DIR + '/' + name + '/'
+        mode = _read(path + 'bonding/mode')
+        if mode is not None:
+            slaves = (_read(path + 'bonding/slaves') or '').split()
+            bonds.append(Bond(name, utils.intern_str(mode.split()[0]), slaves))
+            continue
+        ports = _listdir(path + 'brif')
+        if ports is not None:
+            bridges.append(Bridge(name, sorted(ports)))
+            continue
+        total_vfs = _int(_read(path + 'device/sriov_totalvfs'))
+        if total_vfs is None:
+            continue
+        pf = PF(name, _link_name(path + 'device'))
+        pf.total_vfs = total_vfs
+        pf.num_vfs = _int(_read(path + 'device/sriov_numvfs'))
+        pf.numa_node = _numa_node(_read(path + 'device/numa_node'))
+        for filename in fs.listdir(path + 'device'):
+            if not filename.startswith('virtfn'):
+                continue
+            vf = VF(int(filename[6:]), _link_name(path + 'device/' + filename),
+                    name)
+            vf.numa_node = pf.numa_node
+            vf_path = _LINUX_SYS_BUS_PCI_DEVICES_DIR + '/' + vf.address + '/'
+            vf.driver = utils.intern_str(_link_name(vf_path + 'driver'))
+            vf_names = _listdir(vf_path + 'net')
+            if vf_names:
+                vf.name = vf_names[0]
+            pf.vfs.append(vf)
+        pf.vfs.sort(key=lambda v: v.index)
+        pfs.append(pf)
+    masters = _masters(bonds, bridges)
+    for pf in pfs:
+        for vf in pf.vfs:
+            passthrough = vf.driver in _PASSTHROUGH_DRIVERS
+            vf.in_use = passthrough or vf.name in masters
+    return Graph(pfs, bonds, bridges)
@@ -0,0 +1,377 @@
+# -*- coding: utf-8 -*-
+
+# Licensed under the Apache License, Version 2.0 (the "License"); you may
+# not use this file except in compliance with the License. You may obtain
+# a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+# WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+# License for the specific language governing permissions and limitations
+# under the License.
+
+import os
+import re
+
+from hwk import fs
+from hwk import serialize
+from hwk import topology
+from hwk import trace
+from hwk import utils
+
+_LINUX_SYS_BUS_PCI_DEVICES_DIR = '/sys/bus/pci/devices/'
+# PCI addresses look like '0000:82:00.0'. Domains may have more than four
+# digits, e.g. the '10000' domain Intel VMD puts the devices behind it in.
+_ADDRESS_RE = re.compile(r'^[0-9a-f]{4,}:[0-9a-f]{2}:[0-9a-f]{2}\.[0-7]$')
+# Fields that may be passed to `info(include=...)`. The link fields cover
+# both the current and the maximum speed and width of the link.
+FIELDS = (
+    'class_id', 'vendor_id', 'device_id', 'driver', 'numa_node',
+    'local_processor_set', 'link', 'bridges',
+)
+# The names of the PCI base classes, from the top byte of the class code
+_CLASSES = {
+    0x00: 'unclassified',
+    0x01: 'storage',
+    0x02: 'network',
+    0x03: 'display',
+    0x04: 'multimedia',
+    0x05: 'memory',
+    0x06: 'bridge',
+    0x07: 'communication',
+    0x08: 'system',
+    0x09: 'input',
+    0x0a: 'docking',
+    0x0b: 'processor',
+    0x0c: 'serial',
+    0x0d: 'wireless',
+    0x0e: 'intelligent',
+    0x0f: 'satellite',
+    0x10: 'encryption',
+    0x11: 'signal-processing',
+    0x12: 'accelerator',
+    0x13: 'instrumentation',
+    0xff: 'unassigned',
+}
+_INFO_HELP = """PCI subsystem
+===============================================================================
+`hwk.pci.Info` attributes:
+
+devices (list of `hwk.pci.Device` objects)
+
+  A list of objects describing every PCI device of the system, bridges
+  included, ordered by address
+
+  `hwk.pci.Device` attributes:
+
+  address (string)
+
+    The complete PCI address of the device, e.g. '0000:82:00.0'
+
+  class_id (string)
+
+    The class code of the device in hexadecimal, e.g. '0x020000' for an
+    Ethernet controller or '0x010802' for an NVMe drive
+
+  class_name (string)
+
+    The name of the device's base class, e.g. 'network', 'storage',
+    'display' or 'bridge'
+
+  vendor_id (string)
+
+    The ID of the vendor in hexadecimal, e.g. '0x8086'
+
+  device_id (string)
+
+    The ID of the device model in hexadecimal, e.g. '0x1572'
+
+  driver (string)
+
+    The kernel driver bound to the device, if any, e.g. 'i40e' or 'nvme'
+
+  numa_node (int)
+
+    The NUMA node the device is attached to. For devices the kernel reports
+    no node for, e.g. on hosts without NUMA, this is the
+    `hwk.topology.Node` whose processors include all of the device's local
+    processors, if there is one. Otherwise None.
+
+  local_processor_set (`hwk.utils.ProcessorSet`)
+
+    The logical processors local to the device, from its local_cpulist
+
+  current_link_speed, max_link_speed (float)
+
+    The speed the device's PCI Express link is running at, and the fastest
+    the device supports, in GT/s per lane, e.g. 8.0 for PCIe 3.0. None for
+    devices without a PCI Express link, such as virtual functions.
+
+  current_link_width, max_link_width (int)
+
+    The number of lanes the device's link is running with, and the most the
+    device supports, e.g. 8 and 16 for a x16 card in a x8 slot
+
+  is_degraded (bool)
+
+    True if the link runs with fewer lanes than the device supports. A
+    slower speed than the device supports is not counted, since many
+    devices, GPUs in particular, slow their link down when idle to save
+    power.
+
+  bridges (tuple of string)
+
+    The addresses of the bridges between the device and the root complex,
+    nearest the root complex first
+
+`hwk.pci.Info` methods:
+
+find(address)
+
+  Returns the `hwk.pci.Device` with the supplied address, or None
+
+parent(address)
+
+  Returns the `hwk.pci.Device` of the bridge the device with the supplied
+  address is behind, or None if it is on a root bus or there is no such
+  device
+
+on_node(node_id)
+
+  Returns the devices attached to the supplied NUMA node
+
+degraded()
+
+  Returns the devices other than bridges whose links run with fewer lanes
+  than they support
+"""
+
+
+class Info(object):
+    """Object describing the PCI devices of a system."""
+
+    _SERIALIZED = ('devices',)
+
+    def __init__(self, devices=()):
+        self.devices = sorted(devices, key=lambda d: d.address)
+        # Devices are looked up by address and NUMA node without scanning the
+        # list
+        self._by_address = dict((d.address, d) for d in self.devices)
+        self._by_node = {}
+        for d in self.devices:
+            self._by_node.setdefault(d.numa_node, []).append(d)
+
+    def __repr__(self):
+        return "pci (%d devices)" % (
+            len(self.devices),
+        )
+
+    def describe(self):
+        return _INFO_HELP
+
+    def find(self, address):
+        return self._by_address.get(address)
+
+    def parent(self, address):
+        d = self._by_address.get(address)
+        if d is None or not d.bridges:
+            return None
+        return self._by_address.get(d.bridges[-1])
+
+    def on_node(self, node_id):
+        return list(self._by_node.get(node_id, ()))
+
+    def degraded(self):
+        return [
+            d for d in self.devices
+            if d.is_degraded and d.class_name != 'bridge'
+        ]
+
+    def to_dict(self):
+        return serialize.to_dict(self)
+
+    @classmethod
+    def from_dict(cls, data):
+        return cls([Device.from_dict(d) for d in data['devices']])
+
+
+class Device(object):
+    """Object describing a PCI device."""
+
+    __slots__ = (
+        'address', 'class_id', 'vendor_id', 'device_id', 'driver',
+        'numa_node', 'local_processor_set', 'current_link_speed',
+        'current_link_width', 'max_link_speed', 'max_link_width', 'bridges',
+    )
+    _SERIALIZED = __slots__
+
+    def __init__(self, address):
+        self.address = address
+        for name in self.__slots__[1:]:
+            setattr(self, name, None)
+
+    @property
+    def class_name(self):
+        if self.class_id is None:
+            return None
+        return _CLASSES.get(int(self.class_id, 16) >> 16)
+
+    @property
+    def is_degraded(self):
+        if self.current_link_width is None or self.max_link_width is None:
+            return False
+        return self.current_link_width < self.max_link_width
+
+    def __repr__(self):
+        link_str = ''
+        if self.current_link_width is not None:
+            link_str = ' x%d' % self.current_link_width
+            if self.is_degraded:
+                link_str += ' (of x%d)' % self.max_link_width
+        driver_str = ''
+        if self.driver is not None:
+            driver_str = ' [' + self.driver + ']'
+        return "PCI %s %s %s:%s%s%s" % (
+            self.address,
+            self.class_name,
+            self.vendor_id,
+            self.device_id,
+            driver_str,
+            link_str,
+        )
+
+    def to_dict(self):
+        return serialize.to_dict(self)
+
+    @classmethod
+    def from_dict(cls, data):
+        res = cls(data['address'])
+        for name in cls._SERIALIZED[1:]:
+            setattr(res, name, data[name])
+        if res.local_processor_set is not None:
+            res.local_processor_set = utils.ProcessorSet.from_cpulist(
+                res.local_processor_set)
+        if res.bridges is not None:
+            res.bridges = tuple(res.bridges)
+        return res
+
+
+def info(include=None):
+    """Returns a `hwk.pci.Info` object containing information on the PCI
+    devices of the system, or None if the information could not be
+    determined.
+
+    If include is supplied, only the fields it names, from those listed in
+    `hwk.pci.FIELDS`, are determined, together with the device addresses.
+    'link' covers the current and maximum speed and width of each device's
+    link. For example, include=['class_id', 'link'] is enough to find
+    degraded links, and reads nothing else.
+    """
+    fields = utils.included(include, FIELDS)
+    try:
+        fn = {
+            "Linux": _linux_info,
+        }[fs.system()]
+    except KeyError:
+        return None
+    return fn(fields)
+
+
+def _read(path):
+    try:
+        with fs.open(path, 'r') as f:
+            return f.read().strip()
+    except (IOError, OSError):
+        return None
+
+
+def _int(value):
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def _link_speed(value):
+    # Speeds look like '8.0 GT/s PCIe', or '8 GT/s' on older kernels, and are
+    # 'Unknown' or 'Unknown speed' when the link is down
+    try:
+        return float(value.split()[0])
+    except (AttributeError, IndexError, ValueError):
+        return None
+
+
+def _is_address(name):
+    # The directories of root buses under /sys/devices, which look like
+    # 'pci0000:80', are not addresses
+    return _ADDRESS_RE.match(name) is not None
+
+
+def _node_of(nodes, processor_set):
+    # Returns the id of the only node whose processors include all of the
+    # supplied ones, or None
+    if not processor_set:
+        return None
+    matches = [
+        n.id for n in nodes if processor_set.issubset(n.processor_set)
+    ]
+    if len(matches) == 1:
+        return matches[0]
+    return None
+
+
+@trace.collector
+def _linux_info(fields):
+    # Every PCI device has a link in /sys/bus/pci/devices to its directory
+    # under /sys/devices, which is nested in the directories of the bridges
+    # between it and the root complex, e.g.
+    # /sys/devices/pci0000:80/0000:80:03.0/0000:82:00.0. The device's
+    # directory contains:
+    #
+    # class, vendor, device: hexadecimal IDs, e.g. '0x020000'
+    # driver: a link to the bound driver, e.g. ../../bus/pci/drivers/i40e
+    # numa_node: the NUMA node, or -1 if the kernel does not know it
+    # local_cpulist: the logical processors local to the device, e.g. '0-15'
+    # current_link_speed, current_link_width, max_link_speed,
+    #   max_link_width: only present for PCI Express devices with a link
+    devices = []
+    nodes = None
+    for address in sorted(fs.listdir(_LINUX_SYS_BUS_PCI_DEVICES_DIR)):
+        path = _LINUX_SYS_BUS_PCI_DEVICES_DIR + address + '/'
+        d = Device(address)
+        for field in ('class_id', 'vendor_id', 'device_id'):
+            if field in fields:
+                value = _read(path + field[:-3])
+                setattr(d, field, utils.intern_str(value))
+        if 'driver' in fields:
+            try:
+                d.driver = utils.intern_str(
+                    os.path.basename(fs.readlink(path + 'driver')))
+            except OSError:
+                pass
+        if 'local_processor_set' in fields or 'numa_node' in fields:
+            cpulist = _read(path + 'local_cpulist')
+            if cpulist is not None:
+                d.local_processor_set = utils.ProcessorSet.from_cpulist(
+                    cpulist)
+        if 'numa_node' in fields:
+            d.numa_node = _int(_read(path + 'numa_node'))
+            if d.numa_node is not None and d.numa_node < 0:
+                if nodes is None:
+                    nodes = topology._linux_nodes(distances=False)[0]
+                d.numa_node = _node_of(nodes, d.local_processor_set)
+            if 'local_processor_set' not in fields:
+                d.local_processor_set = None
+        if 'link' in fields:
+            d.current_link_speed = _link_speed(
+                _read(path + 'current_link_speed'))
+            d.max_link_speed = _link_speed(_read(path + 'max_link_speed'))
+            d.current_link_width = _int(_read(path + 'current_link_width'))
+            d.max_link_width = _int(_read(path + 'max_link_width'))
+        if 'bridges' in fields:
+            parts = fs.realpath(path[:-1]).split('/')[:-1]
+            d.bridges = tuple(p for p in parts if _is_address(p))
+        devices.append(d)
+    return Info(devices)
@@ -0,0 +1,400 @@
+# -*- coding: utf-8 -*-
+
+# Licensed under the Apache License, Version 2.0 (the "License"); you may
+# not use this file except in compliance with the License. You may obtain
+# a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+# WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+# License for the specific language governing permissions and limitations
+# under the License.
+
+"""Serialization of the `Info` objects returned by hwk's `info()` functions.
+
+Every `Info` class, and the classes of the objects it contains, has a
+`to_dict()` method returning plain dicts, lists, strings and numbers, and a
+`from_dict()` class method that rebuilds the object. The functions here wrap
+an `Info` object in an envelope recording the module it came from and the
+schema version, and encode it as JSON or as MessagePack:
+
+    >>> from hwk import net, serialize
+    >>> data = serialize.dumps(net.info())
+    >>> serialize.loads(data)
+    net (3 NICs)
+
+The MessagePack encoder writes objects' attributes straight to the output
+rather than building a dict per object first, and needs no third-party
+package. Its output can be read by any MessagePack implementation.
+
+Attributes that are otherwise determined on first access are all determined
+before an object is serialized, using the module's `prefetch()` function, so
+that deserialized objects never probe the host they were loaded on.
+"""
+
+import importlib
+import json
+import struct
+
+import six
+
+from hwk import utils
+
+# Incremented whenever a change to the serialized form would stop an older
+# version of hwk from reading it
+SCHEMA_VERSION = 1
+
+
+def _primitive(value, resolve=True):
+    # Returns the supplied attribute value as plain dicts, lists, strings and
+    # numbers
+    if value is None or isinstance(
+            value, (bool, float, six.integer_types, six.string_types)):
+        return value
+    if isinstance(value, utils.ProcessorSet):
+        return value.to_cpulist()
+    if isinstance(value, (set, frozenset)):
+        return sorted(value)
+    if isinstance(value, (list, tuple)):
+        return [_primitive(v, resolve) for v in value]
+    if isinstance(value, dict):
+        return dict((k, _primitive(v, resolve)) for k, v in value.items())
+    return to_dict(value, resolve)
+
+
+def _is_resolved(obj, name):
+    attr = getattr(type(obj), name, None)
+    return not isinstance(attr, utils.lazy) or attr.is_resolved(obj)
+
+
+def to_dict(obj, resolve=True):
+    """Returns a dict of the serialized attributes, listed in the `_SERIALIZED`
+    attribute of its class, of the supplied hwk object. This is what the
+    objects' own `to_dict()` methods return.
+
+    If `resolve` is False, attributes that are determined on first access and
+    have not been determined yet, e.g. because they were not included in the
+    `info(include=...)` call that discovered the object, are left out rather
+    than determined.
+    """
+    names = obj._SERIALIZED
+    if resolve:
+        prefetch = getattr(obj, '_prefetch', None)
+        if prefetch is not None:
+            prefetch()
+    else:
+        names = [name for name in names if _is_resolved(obj, name)]
+    return dict(
+        (name, _primitive(getattr(obj, name), resolve)) for name in names
+    )
+
+
+def _module_name(info):
+    module = type(info).__module__
+    if not module.startswith('hwk.') or type(info).__name__ != 'Info':
+        raise TypeError("%r is not an hwk Info object" % info)
+    return module[4:]
+
+
+def _info_class(data):
+    if not isinstance(data, dict) or 'schema' not in data:
+        raise ValueError("Not a serialized hwk Info object")
+    if data['schema'] > SCHEMA_VERSION:
+        raise ValueError(
+            "Serialized with schema version %s, but only versions up to %d "
+            "are supported" % (data['schema'], SCHEMA_VERSION))
+    module = importlib.import_module('hwk.' + data['module'])
+    return module.Info
+
+
+def envelope(info, resolve=True):
+    """Returns a dict wrapping the serialized form of the supplied `Info`
+    object with the name of its module and the schema version. `resolve` is
+    passed to `hwk.serialize.to_dict()`.
+    """
+    return {
+        'schema': SCHEMA_VERSION,
+        'module': _module_name(info),
+        'info': to_dict(info, resolve),
+    }
+
+
+def from_envelope(data):
+    """Returns the `Info` object wrapped by `hwk.serialize.envelope()`."""
+    return _info_class(data).from_dict(data['info'])
+
+
+def dumps_json(info, **kwargs):
+    """Returns the supplied `Info` object encoded as a JSON string. Keyword
+    arguments are passed to `json.dumps()`.
+    """
+    kwargs.setdefault('sort_keys', True)
+    kwargs.setdefault('separators', (',', ':'))
+    return json.dumps(envelope(info), **kwargs)
+
+
+def loads_json(data):
+    """Returns the `Info` object encoded by `hwk.serialize.dumps_json()`."""
+    if isinstance(data, six.binary_type):
+        data = data.decode('utf-8')
+    return from_envelope(json.loads(data))
+
+
+# MessagePack type markers. See
+# https://github.com/msgpack/msgpack/blob/master/spec.md
+_NIL = b'\xc0'
+_FALSE = b'\xc2'
+_TRUE = b'\xc3'
+_FLOAT64 = struct.Struct('>Bd')
+# (largest magnitude, struct format, marker) of each integer type
+_UINT = ((0xff, 'B', 0xcc), (0xffff, 'H', 0xcd),
+         (0xffffffff, 'I', 0xce), (0xffffffffffffffff, 'Q', 0xcf))
+_INT = ((0x80, 'b', 0xd0), (0x8000, 'h', 0xd1),
+        (0x80000000, 'i', 0xd2), (0x8000000000000000, 'q', 0xd3))
+_INT_STRUCTS = dict(
+    (fmt, struct.Struct('>B' + fmt)) for _, fmt, _ in _UINT + _INT
+)
+_SIZE16 = struct.Struct('>BH')
+_SIZE32 = struct.Struct('>BI')
+# (fixed size marker, largest fixed size, 8-bit, 16-bit and 32-bit markers)
+_STR_MARKERS = (0xa0, 31, 0xd9, 0xda, 0xdb)
+_ARRAY_MARKERS = (0x90, 15, None, 0xdc, 0xdd)
+_MAP_MARKERS = (0x80, 15, None, 0xde, 0xdf)
+# Maps each class of hwk object packed so far to the packed map header and
+# field names of its serialized attributes
+_packed_fields = {}
+
+
+def _pack_header(out, size, markers):
+    fix, fix_max, marker8, marker16, marker32 = markers
+    if size <= fix_max:
+        out.append(fix | size)
+    elif marker8 is not None and size <= 0xff:
+        out.append(marker8)
+        out.append(size)
+    elif size <= 0xffff:
+        out.extend(_SIZE16.pack(marker16, size))
+    else:
+        out.extend(_SIZE32.pack(marker32, size))
+
+
+def _pack_str(out, value):
+    if not isinstance(value, six.binary_type):
+        value = value.encode('utf-8')
+    _pack_header(out, len(value), _STR_MARKERS)
+    out.extend(value)
+
+
+def _pack_int(out, value):
+    if 0 <= value < 0x80:
+        out.append(value)
+        return
+    if -32 <= value < 0:
+        out.append(value & 0xff)
+        return
+    if value > 0:
+        for limit, fmt, marker in _UINT:
+            if value <= limit:
+                out.extend(_INT_STRUCTS[fmt].pack(marker, value))
+                return
+    else:
+        for limit, fmt, marker in _INT:
+            if value >= -limit:
+                out.extend(_INT_STRUCTS[fmt].pack(marker, value))
+                return
+    raise OverflowError("%d is too large to serialize" % value)
+
+
+def _pack_none(out, value):
+    out.extend(_NIL)
+
+
+def _pack_bool(out, value):
+    out.extend(_TRUE if value else _FALSE)
+
+
+def _pack_float(out, value):
+    out.extend(_FLOAT64.pack(0xcb, value))
+
+
+def _pack_processor_set(out, value):
+    _pack_str(out, value.to_cpulist())
+
+
+def _pack_list(out, value):
+    _pack_header(out, len(value), _ARRAY_MARKERS)
+    for v in value:
+        _PACKERS.get(type(v), _pack_object)(out, v)
+
+
+def _pack_set(out, value):
+    _pack_list(out, sorted(value))
+
+
+def _pack_dict(out, value):
+    _pack_header(out, len(value), _MAP_MARKERS)
+    for k, v in value.items():
+        _PACKERS.get(type(k), _pack_object)(out, k)
+        _PACKERS.get(type(v), _pack_object)(out, v)
+
+
+def _pack_object(out, value):
+    # An hwk object, whose attributes are written as a map without building a
+    # dict of them first. The map header and field names are the same for
+    # every object of a class, so they are only packed once.
+    prefetch = getattr(value, '_prefetch', None)
+    if prefetch is not None:
+        prefetch()
+    cls = type(value)
+    fields = _packed_fields.get(cls)
+    if fields is None:
+        header = bytearray()
+        _pack_header(header, len(cls._SERIALIZED), _MAP_MARKERS)
+        names = []
+        for name in cls._SERIALIZED:
+            packed = bytearray()
+            _pack_str(packed, name)
+            names.append((bytes(packed), name))
+        fields = _packed_fields[cls] = (bytes(header), names)
+    out.extend(fields[0])
+    for packed, name in fields[1]:
+        out.extend(packed)
+        v = getattr(value, name)
+        _PACKERS.get(type(v), _pack_object)(out, v)
+
+
+_PACKERS = {
+    type(None): _pack_none,
+    bool: _pack_bool,
+    float: _pack_float,
+    list: _pack_list,
+    tuple: _pack_list,
+    set: _pack_set,
+    frozenset: _pack_set,
+    dict: _pack_dict,
+    utils.ProcessorSet: _pack_processor_set,
+}
+for _type in six.integer_types:
+    _PACKERS[_type] = _pack_int
+for _type in (six.binary_type, six.text_type):
+    _PACKERS[_type] = _pack_str
+del _type
+
+
+def _pack(out, value):
+    _PACKERS.get(type(value), _pack_object)(out, value)
+
+
+def _unpack_str(data, pos, size):
+    value = data[pos:pos + size].decode('utf-8')
+    if six.PY2:
+        try:
+            value = value.encode('ascii')
+        except UnicodeEncodeError:
+            pass
+    return value, pos + size
+
+
+def _unpack_array(data, pos, size):
+    res = []
+    append = res.append
+    unpackers = _UNPACKERS
+    for x in range(size):
+        value, pos = unpackers[data[pos]](data, pos + 1)
+        append(value)
+    return res, pos
+
+
+def _unpack_map(data, pos, size):
+    res = {}
+    unpackers = _UNPACKERS
+    for x in range(size):
+        key, pos = unpackers[data[pos]](data, pos + 1)
+        res[key], pos = unpackers[data[pos]](data, pos + 1)
+    return res, pos
+
+
+def _unsupported(data, pos):
+    raise ValueError("Unsupported MessagePack type 0x%02x" % data[pos - 1])
+
+
+def _fixed(value):
+    return lambda data, pos: (value, pos)
+
+
+def _fixed_size(fn, size):
+    return lambda data, pos: fn(data, pos, size)
+
+
+def _sized(fn, fmt):
+    fmt = struct.Struct(fmt)
+
+    def unpack(data, pos):
+        size = fmt.unpack_from(data, pos)[0]
+        return fn(data, pos + fmt.size, size)
+    return unpack
+
+
+def _number(fmt):
+    fmt = struct.Struct(fmt)
+    return lambda data, pos: (fmt.unpack_from(data, pos)[0], pos + fmt.size)
+
+
+# Indexed by the first byte of each value, returning a tuple of (value,
+# position after it) given the data and the position after the first byte
+_UNPACKERS = [_unsupported] * 256
+for _b in range(0x80):
+    _UNPACKERS[_b] = _fixed(_b)
+for _b in range(0xe0, 0x100):
+    _UNPACKERS[_b] = _fixed(_b - 0x100)
+for _b in range(16):
+    _UNPACKERS[0x80 | _b] = _fixed_size(_unpack_map, _b)
+    _UNPACKERS[0x90 | _b] = _fixed_size(_unpack_array, _b)
+for _b in range(32):
+    _UNPACKERS[0xa0 | _b] = _fixed_size(_unpack_str, _b)
+del _b
+_UNPACKERS[0xc0] = _fixed(None)
+_UNPACKERS[0xc2] = _fixed(False)
+_UNPACKERS[0xc3] = _fixed(True)
+_UNPACKERS[0xcb] = _number('>d')
+for _, _fmt, _marker in _UINT + _INT:
+    _UNPACKERS[_marker] = _number('>' + _fmt)
+del _, _fmt, _marker
+_UNPACKERS[0xd9] = _sized(_unpack_str, 'B')
+_UNPACKERS[0xda] = _sized(_unpack_str, '>H')
+_UNPACKERS[0xdb] = _sized(_unpack_str, '>I')
+_UNPACKERS[0xdc] = _sized(_unpack_array, '>H')
+_UNPACKERS[0xdd] = _sized(_unpack_array, '>I')
+_UNPACKERS[0xde] = _sized(_unpack_map, '>H')
+_UNPACKERS[0xdf] = _sized(_unpack_map, '>I')
+
+
+def _unpack(data, pos):
+    # Returns a tuple of (value, position after it)
+    return _UNPACKERS[data[pos]](data, pos + 1)
+
+
+def dumps(info):
+    """Returns the supplied `Info` object encoded as MessagePack bytes."""
+    out = bytearray()
+    _pack_header(out, 3, _MAP_MARKERS)
+    _pack(out, 'schema')
+    _pack(out, SCHEMA_VERSION)
+    _pack(out, 'module')
+    _pack(out, _module_name(info))
+    _pack(out, 'info')
+    _pack(out, info)
+    return bytes(out)
+
+
+def loads(data):
+    """Returns the `Info` object encoded by `hwk.serialize.dumps()`."""
+    if not isinstance(data, (bytes, bytearray)) or six.PY2:
+        # Indexing Python 2 strings returns characters rather than ints
+        data = bytearray(data)
+    value, pos = _unpack(data, 0)
+    if pos != len(data):
+        raise ValueError("Trailing data after serialized Info object")
+    return from_envelope(value)
@@ -0,0 +1,446 @@
+# -*- coding: utf-8 -*-
+
+# Licensed under the Apache License, Version 2.0 (the "License"); you may
+# not use this file except in compliance with the License. You may obtain
+# a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+# WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+# License for the specific language governing permissions and limitations
+# under the License.
+
+"""Capture and replay of the host information hwk reads.
+
+A snapshot records exactly the files, directory listings, symbolic links and
+command outputs that hwk's `info()` functions read from a host, and nothing
+else. Replaying a snapshot feeds those back through the normal collectors, so
+discovery on a customer's host can be reproduced, profiled and benchmarked
+elsewhere:
+
+    $ hwk capture -o host-0042.json.gz
+    $ hwk replay host-0042.json.gz topology
+
+`python -m hwk.snapshot capture|replay` does the same where hwk is not
+installed.
+
+or, from Python:
+
+    >>> from hwk import snapshot, topology
+    >>> with snapshot.replay('host-0042.json.gz'):
+    ...     topology.info()
+
+Snapshots are stored as gzip-compressed JSON documents. File contents and
+command outputs are stored as Latin-1 decoded strings so that arbitrary bytes
+round-trip unchanged.
+"""
+
+import argparse
+import contextlib
+import errno
+import gzip
+import importlib
+import io
+import itertools
+import json
+import os
+import subprocess
+import sys
+
+import six
+
+from hwk import fs
+
+FORMAT = 'hwk-snapshot'
+VERSION = 1
+MODULES = ('cpu', 'memory', 'block', 'net', 'gpu', 'pci', 'topology')
+
+# Used to give each recorder and archive a distinct key, so that memoized
+# results from one are never returned for another
+_counter = itertools.count()
+
+
+def _reader(data, mode):
+    # Returns a file-like object over the supplied bytes that behaves like a
+    # file opened in the supplied mode would
+    if 'b' in mode or six.PY2:
+        return io.BytesIO(data)
+    return io.StringIO(data.decode('utf-8', 'replace'))
+
+
+def _to_str(data):
+    return data.decode('latin-1')
+
+
+def _to_bytes(data):
+    return data.encode('latin-1')
+
+
+class Recorder(fs.Proxy):
+    """A `hwk.fs.Filesystem` that delegates to another filesystem, by default
+    the live host, and records everything read through it.
+
+    The recorder never reports itself as the local host, so collectors make
+    the same reads while recording as they will when the snapshot is
+    replayed.
+    """
+
+    def __init__(self, filesystem=None):
+        super(Recorder, self).__init__(filesystem or fs.current())
+        self.is_local = False
+        self._id = next(_counter)
+        self._system = None
+        self.files = {}
+        self.dirs = {}
+        self.links = {}
+        self.paths = {}
+        self.realpaths = {}
+        self.errors = {'open': {}, 'listdir': {}, 'readlink': {}}
+        self.commands = []
+
+    @property
+    def key(self):
+        return (self.__class__.__name__, self._id)
+
+    def open(self, path, mode='r'):
+        if 'r' not in mode:
+            return self.filesystem.open(path, mode)
+        # Files read more than once, e.g. /proc/stat by a sampler, keep the
+        # contents of the last read
+        try:
+            with self.filesystem.open(path, 'rb') as f:
+                data = f.read()
+        except (IOError, OSError) as err:
+            self.errors['open'][path] = err.errno
+            raise
+        self.files[path] = _to_str(data)
+        return _reader(data, mode)
+
+    def listdir(self, path):
+        try:
+            res = self.filesystem.listdir(path)
+        except OSError as err:
+            self.errors['listdir'][path] = err.errno
+            raise
+        self.dirs[path] = list(res)
+        return res
+
+    def _record_path(self, path):
+        # isdir(), exists() and islink() are recorded together as a string of
+        # flags: 'e' if the path exists, 'd' if it is a directory and 'l' if
+        # it is a symbolic link
+        flags = self.paths.get(path)
+        if flags is None:
+            flags = self.paths[path] = ''.join((
+                'e' if self.filesystem.exists(path) else '',
+                'd' if self.filesystem.isdir(path) else '',
+                'l' if self.filesystem.islink(path) else '',
+            ))
+        return flags
+
+    def isdir(self, path):
+        return 'd' in self._record_path(path)
+
+    def exists(self, path):
+        return 'e' in self._record_path(path)
+
+    def islink(self, path):
+        return 'l' in self._record_path(path)
+
+    def readlink(self, path):
+        try:
+            res = self.filesystem.readlink(path)
+        except OSError as err:
+            self.errors['readlink'][path] = err.errno
+            raise
+        self.links[path] = res
+        return res
+
+    def realpath(self, path):
+        res = self.realpaths[path] = self.filesystem.realpath(path)
+        return res
+
+    def check_output(self, cmd, stderr=None):
+        record = {'argv': list(cmd)}
+        self.commands.append(record)
+        try:
+            out = self.filesystem.check_output(cmd, stderr=stderr)
+        except subprocess.CalledProcessError as err:
+            record['returncode'] = err.returncode
+            record['output'] = _to_str(err.output or six.b(''))
+            raise
+        except OSError as err:
+            record['errno'] = err.errno
+            raise
+        record['returncode'] = 0
+        record['output'] = _to_str(out)
+        return out
+
+    def system(self):
+        if self._system is None:
+            self._system = self.filesystem.system()
+        return self._system
+
+    def snapshot(self):
+        """Returns a dict, suitable for serializing as JSON, of everything
+        recorded so far.
+        """
+        return {
+            'format': FORMAT,
+            'version': VERSION,
+            'system': self.system(),
+            'files': self.files,
+            'dirs': self.dirs,
+            'links': self.links,
+            'paths': self.paths,
+            'realpaths': self.realpaths,
+            'errors': self.errors,
+            'commands': self.commands,
+        }
+
+
+class Archive(fs.Filesystem):
+    """A `hwk.fs.Filesystem` that serves the files and command outputs of a
+    snapshot produced by `hwk.snapshot.Recorder`.
+
+    Reads of anything not in the snapshot fail the way reads of a missing
+    file do, and commands not in the snapshot fail with
+    `subprocess.CalledProcessError`, as they would for any non-local root.
+    """
+
+    def __init__(self, snapshot, name='<snapshot>'):
+        if snapshot.get('format') != FORMAT:
+            raise ValueError("%s is not a hwk snapshot" % name)
+        if snapshot.get('version', 0) > VERSION:
+            raise ValueError(
+                "%s is a version %s snapshot. This version of hwk reads "
+                "snapshots up to version %d." % (
+                    name, snapshot.get('version'), VERSION,
+                )
+            )
+        self.root = name
+        self.is_local = False
+        self._id = next(_counter)
+        self._system = snapshot.get('system', 'Linux')
+        self.files = snapshot.get('files', {})
+        self.dirs = snapshot.get('dirs', {})
+        self.links = snapshot.get('links', {})
+        self.paths = snapshot.get('paths', {})
+        self.realpaths = snapshot.get('realpaths', {})
+        self.errors = snapshot.get('errors', {})
+        self.commands = {}
+        for record in snapshot.get('commands', []):
+            self.commands[tuple(record['argv'])] = record
+
+    @property
+    def key(self):
+        return (self.__class__.__name__, self._id)
+
+    def path(self, path):
+        return path
+
+    def _error(self, op, path):
+        code = self.errors.get(op, {}).get(path) or errno.ENOENT
+        return IOError(code, os.strerror(code), path)
+
+    def open(self, path, mode='r'):
+        if 'r' not in mode:
+            raise IOError(errno.EROFS, os.strerror(errno.EROFS), path)
+        try:
+            data = self.files[path]
+        except KeyError:
+            raise self._error('open', path)
+        return _reader(_to_bytes(data), mode)
+
+    def listdir(self, path):
+        try:
+            return list(self.dirs[path])
+        except KeyError:
+            err = self._error('listdir', path)
+            raise OSError(err.errno, err.strerror, path)
+
+    def _flags(self, path):
+        # Paths that were listed, opened or read as links exist even if no
+        # explicit isdir()/exists()/islink() call was recorded for them
+        flags = self.paths.get(path)
+        if flags is not None:
+            return flags
+        exists = (
+            path in self.files or path in self.dirs or path in self.links
+        )
+        return ''.join((
+            'e' if exists else '',
+            'd' if path in self.dirs else '',
+            'l' if path in self.links else '',
+        ))
+
+    def isdir(self, path):
+        return 'd' in self._flags(path)
+
+    def exists(self, path):
+        return 'e' in self._flags(path)
+
+    def islink(self, path):
+        return 'l' in self._flags(path)
+
+    def readlink(self, path):
+        try:
+            return self.links[path]
+        except KeyError:
+            err = self._error('readlink', path)
+            raise OSError(err.errno, err.strerror, path)
+
+    def getmtime(self, path):
+        # Snapshots do not record modification times. Nothing in a snapshot
+        # ever changes, so callers comparing times to detect changes lose
+        # nothing by treating every path as having no known time.
+        err = self._error('getmtime', path)
+        raise OSError(err.errno, err.strerror, path)
+
+    def statvfs(self, path):
+        # Nor do they record filesystem usage, which describes the moment of
+        # capture rather than the host's hardware
+        err = self._error('statvfs', path)
+        raise OSError(err.errno, err.strerror, path)
+
+    def realpath(self, path):
+        return self.realpaths.get(path, os.path.normpath(path))
+
+    def check_output(self, cmd, stderr=None):
+        record = self.commands.get(tuple(cmd))
+        if record is None:
+            raise subprocess.CalledProcessError(127, cmd)
+        if 'errno' in record:
+            code = record['errno']
+            raise OSError(code, os.strerror(code))
+        out = _to_bytes(record.get('output', ''))
+        if record.get('returncode'):
+            raise subprocess.CalledProcessError(
+                record['returncode'], cmd, output=out,
+            )
+        return out
+
+    def system(self):
+        return self._system
+
+
+def _info(name):
+    # Runs full discovery, including attributes that are otherwise only
+    # determined on access, so that a snapshot records everything
+    module = importlib.import_module('hwk.' + name)
+    return module.info(include=module.FIELDS)
+
+
+def capture(modules=None, filesystem=None):
+    """Runs the `info()` function of each of the named hwk modules, by default
+    all of them, against the supplied `hwk.fs.Filesystem` or the current one
+    and returns a snapshot dict of everything they read.
+
+    Modules whose discovery fails are skipped; whatever they read before
+    failing is still recorded.
+    """
+    recorder = Recorder(filesystem)
+    with fs.use(recorder):
+        for name in modules or MODULES:
+            try:
+                _info(name)
+            except Exception:
+                pass
+    return recorder.snapshot()
+
+
+def save(snapshot, path):
+    """Writes the supplied snapshot dict to a file."""
+    data = json.dumps(snapshot, sort_keys=True, separators=(',', ':'))
+    with gzip.open(path, 'wb') as f:
+        f.write(data.encode('utf-8'))
+
+
+def load(path):
+    """Returns a `hwk.snapshot.Archive` for the snapshot stored in a file."""
+    with gzip.open(path, 'rb') as f:
+        data = f.read()
+    return Archive(json.loads(data.decode('utf-8')), name=path)
+
+
+@contextlib.contextmanager
+def replay(path):
+    """Context manager that makes the calling thread read from the snapshot
+    stored in a file for the duration of the block.
+    """
+    with fs.use(load(path)) as archive:
+        yield archive
+
+
+def _parser(prog):
+    parser = argparse.ArgumentParser(
+        prog=prog,
+        description="Capture or replay the host information hwk reads.",
+    )
+    subparsers = parser.add_subparsers(dest='command')
+    cap = subparsers.add_parser(
+        'capture', help="Record what hwk reads from this host.",
+    )
+    cap.add_argument(
+        '-o', '--output', default='hwk-snapshot.json.gz',
+        help="File to write the snapshot to (default: %(default)s).",
+    )
+    cap.add_argument(
+        '--root', default='/',
+        help="Read from a copy of a host's /sys and /proc trees under this "
+             "directory instead of the live host.",
+    )
+    cap.add_argument(
+        'modules', nargs='*', metavar='module',
+        help="hwk modules to run (default: all of %s)." % ', '.join(MODULES),
+    )
+    rep = subparsers.add_parser(
+        'replay', help="Print what hwk discovers from a snapshot.",
+    )
+    rep.add_argument('snapshot')
+    rep.add_argument(
+        'modules', nargs='*', metavar='module',
+        help="hwk modules to run (default: all of %s)." % ', '.join(MODULES),
+    )
+    return parser
+
+
+def main(argv=None, prog='python -m hwk.snapshot'):
+    parser = _parser(prog)
+    args = parser.parse_args(argv)
+    unknown = set(getattr(args, 'modules', None) or []) - set(MODULES)
+    if unknown:
+        parser.error("unknown module(s): %s" % ', '.join(sorted(unknown)))
+    if args.command == 'capture':
+        snapshot = capture(args.modules, fs.Filesystem(args.root))
+        save(snapshot, args.output)
+        sys.stdout.write(
+            "Captured %d files, %d directories and %d commands to %s "
+            "(%d bytes)\n" % (
+                len(snapshot['files']),
+                len(snapshot['dirs']),
+                len(snapshot['commands']),
+                args.output,
+                os.path.getsize(args.output),
+            )
+        )
+    elif args.command == 'replay':
+        res = 0
+        with replay(args.snapshot):
+            for name in args.modules or MODULES:
+                try:
+                    sys.stdout.write("%s\n" % _info(name))
+                except Exception as err:
+                    sys.stderr.write("%s: %s\n" % (name, err))
+                    res = 1
+        return res
+    else:
+        parser.print_usage()
+        return 2
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,551 @@
+# -*- coding: utf-8 -*-
+
+# Licensed under the Apache License, Version 2.0 (the "License"); you may
+# not use this file except in compliance with the License. You may obtain
+# a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+# WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+# License for the specific language governing permissions and limitations
+# under the License.
+
+"""Helpers that lay out synthetic sysfs/procfs trees on disk, modelled on
+what the Linux kernel exposes on real hosts, for use by tests and benchmarks.
+"""
+
+import os
+import subprocess
+
+import six
+
+from hwk import fs
+from hwk import utils
+
+
+class CountingFilesystem(fs.Filesystem):
+    """A `hwk.fs.Filesystem` that records the host path of every file
+    opened.
+    """
+
+    def __init__(self, root='/'):
+        super(CountingFilesystem, self).__init__(root)
+        self.opened = []
+
+    def open(self, path, mode='r'):
+        self.opened.append(path)
+        return super(CountingFilesystem, self).open(path, mode)
+
+
+class FixtureFilesystem(fs.Filesystem):
+    """A `hwk.fs.Filesystem` rooted at a synthetic host tree that answers
+    commands with canned outputs, keyed by the command's arguments as a tuple.
+    `udevadm info --export-db` is answered from the canned outputs of
+    `udevadm info -q property` calls. Other commands fail as if they were not
+    installed.
+    """
+
+    def __init__(self, root, commands=None):
+        super(FixtureFilesystem, self).__init__(root)
+        self.commands = commands or {}
+
+    def _export_db(self):
+        records = []
+        for cmd, out in sorted(self.commands.items()):
+            if cmd[:4] != ('udevadm', 'info', '-q', 'property'):
+                continue
+            devpath = self.realpath(cmd[4])
+            if devpath.startswith('/sys/'):
+                devpath = devpath[4:]
+            records.append(six.b('P: %s\n' % devpath) + six.b('').join(
+                six.b('E: ') + line + six.b('\n')
+                for line in out.splitlines()
+            ))
+        return six.b('\n').join(records)
+
+    def check_output(self, cmd, stderr=None):
+        if tuple(cmd) == ('udevadm', 'info', '--export-db'):
+            return self._export_db()
+        try:
+            return self.commands[tuple(cmd)]
+        except KeyError:
+            raise subprocess.CalledProcessError(127, cmd)
+
+
+def write_file(path, contents):
+    """Writes the supplied contents to a file, creating parent directories as
+    needed.
+    """
+    parent = os.path.dirname(path)
+    if not os.path.isdir(parent):
+        os.makedirs(parent)
+    with open(path, 'w') as f:
+        f.write(contents)
+
+
+def _cpumask(mask, num_cpus):
+    # Format a bitmask the way the kernel does: comma-separated 32-bit words,
+    # most significant word first
+    words = max(1, (num_cpus + 31) // 32)
+    return ','.join(
+        '%08x' % ((mask >> (32 * x)) & 0xffffffff)
+        for x in reversed(range(words))
+    )
+
+
+def build_topology(root, nodes=1, cores_per_node=2, threads_per_core=2):
+    """Creates a /sys/devices/system/{node,cpu} tree under the supplied root
+    directory for a host with the requested number of NUMA nodes, physical
+    cores per node and hardware threads per core.
+
+    Logical processors are numbered the way the kernel enumerates them on
+    most x86 hosts: the first hardware thread of every core in every node
+    first, followed by the second thread of every core, and so on. Each core
+    gets private L1d, L1i and L2 caches and each node a shared L3 cache.
+
+    Returns the total number of logical processors.
+    """
+    node_dir = os.path.join(root, 'sys', 'devices', 'system', 'node')
+    cpu_dir = os.path.join(root, 'sys', 'devices', 'system', 'cpu')
+    total_cores = nodes * cores_per_node
+    num_cpus = total_cores * threads_per_core
+
+    def lp_id(node, core, thread):
+        return thread * total_cores + node * cores_per_node + core
+
+    write_file(os.path.join(cpu_dir, 'online'), '0-%d\n' % (num_cpus - 1))
+    for node in range(nodes):
+        node_path = os.path.join(node_dir, 'node%d' % node)
+        node_mask = 0
+        for core in range(cores_per_node):
+            for thread in range(threads_per_core):
+                node_mask |= 1 << lp_id(node, core, thread)
+        node_set = utils.ProcessorSet.from_mask(node_mask)
+        write_file(os.path.join(node_path, 'cpulist'),
+                   node_set.to_cpulist() + '\n')
+        write_file(os.path.join(node_path, 'cpumap'),
+                   _cpumask(node_mask, num_cpus) + '\n')
+        write_file(os.path.join(node_path, 'distance'), ' '.join(
+            '10' if other == node else '21' for other in range(nodes)
+        ) + '\n')
+
+        for core in range(cores_per_node):
+            core_mask = 0
+            for thread in range(threads_per_core):
+                core_mask |= 1 << lp_id(node, core, thread)
+            core_set = utils.ProcessorSet.from_mask(core_mask)
+            for thread in range(threads_per_core):
+                cpu = lp_id(node, core, thread)
+                cpu_path = os.path.join(cpu_dir, 'cpu%d' % cpu)
+                topo_path = os.path.join(cpu_path, 'topology')
+                write_file(os.path.join(topo_path, 'core_id'), '%d\n' % core)
+                write_file(os.path.join(topo_path, 'physical_package_id'),
+                           '%d\n' % node)
+                write_file(os.path.join(topo_path, 'thread_siblings_list'),
+                           core_set.to_cpulist() + '\n')
+                write_file(os.path.join(topo_path, 'thread_siblings'),
+                           _cpumask(core_mask, num_cpus) + '\n')
+                core_uid = node * cores_per_node + core
+                for index, level, type, size, mask, cache_id in (
+                        (0, 1, 'Data', '32K', core_mask, core_uid),
+                        (1, 1, 'Instruction', '32K', core_mask, core_uid),
+                        (2, 2, 'Unified', '1024K', core_mask, core_uid),
+                        (3, 3, 'Unified', '32768K', node_mask, node)):
+                    index_path = os.path.join(
+                        cpu_path, 'cache', 'index%d' % index)
+                    shared = utils.ProcessorSet.from_mask(mask)
+                    for name, value in (
+                            ('level', level),
+                            ('type', type),
+                            ('size', size),
+                            ('id', cache_id),
+                            ('shared_cpu_list', shared.to_cpulist()),
+                            ('shared_cpu_map', _cpumask(mask, num_cpus))):
+                        write_file(os.path.join(index_path, name),
+                                   '%s\n' % value)
+                os.symlink(
+                    os.path.join('..', '..', 'cpu', 'cpu%d' % cpu),
+                    os.path.join(node_path, 'cpu%d' % cpu),
+                )
+    return num_cpus
+
+
+def _symlink(target, path):
+    parent = os.path.dirname(path)
+    if not os.path.isdir(parent):
+        os.makedirs(parent)
+    os.symlink(target, path)
+
+
+def _properties(props):
+    return six.b(''.join('%s=%s\n' % (k, v) for k, v in sorted(props.items())))
+
+
+def build_cpuinfo(root, nodes=1, cores_per_node=2, threads_per_core=2):
+    """Creates a /proc/cpuinfo under the supplied root directory for a host
+    with one processor package per NUMA node, numbered like
+    `build_topology()` does.
+    """
+    total_cores = nodes * cores_per_node
+    blocks = []
+    for thread in range(threads_per_core):
+        for node in range(nodes):
+            for core in range(cores_per_node):
+                blocks.append((
+                    thread * total_cores + node * cores_per_node + core,
+                    node,
+                    core,
+                ))
+    lines = []
+    for proc_id, node, core in sorted(blocks):
+        lines.extend([
+            'processor\t: %d' % proc_id,
+            'vendor_id\t: GenuineIntel',
+            'model name\t: Intel(R) Xeon(R) CPU E5-2680 v4 @ 2.40GHz',
+            'physical id\t: %d' % node,
+            'siblings\t: %d' % (cores_per_node * threads_per_core),
+            'core id\t\t: %d' % core,
+            'cpu cores\t: %d' % cores_per_node,
+            'flags\t\t: fpu vme de pse tsc msr pae mce cx8 apic sse sse2 ht',
+            '',
+        ])
+    write_file(os.path.join(root, 'proc', 'cpuinfo'), '\n'.join(lines))
+
+
+def build_memory(root, total_kb=16 * 1024 * 1024):
+    """Creates /proc/meminfo, hugepage directories and a system log recording
+    the physical memory of the host under the supplied root directory.
+    """
+    usable_kb = total_kb - total_kb // 64
+    write_file(os.path.join(root, 'proc', 'meminfo'), (
+        'MemTotal:       %d kB\n'
+        'MemFree:        %d kB\n'
+        'HugePages_Total:       0\n'
+        'Hugepagesize:       2048 kB\n'
+    ) % (usable_kb, usable_kb // 2))
+    for size in ('2048kB', '1048576kB'):
+        write_file(os.path.join(
+            root, 'sys', 'kernel', 'mm', 'hugepages', 'hugepages-' + size,
+            'nr_hugepages'), '0\n')
+    write_file(
+        os.path.join(root, 'var', 'log', 'syslog'),
+        'Jan  1 00:00:00 host kernel: [    0.000000] Memory: %dK/%dK '
+        'available\n' % (usable_kb, total_kb),
+    )
+
+
+def build_net(root, nics=2):
+    """Creates a /sys/class/net tree under the supplied root directory with a
+    loopback device and the requested number of PCI NICs. Returns a dict of
+    the udevadm and ethtool outputs for the NICs, for use with
+    `FixtureFilesystem`.
+    """
+    class_dir = os.path.join(root, 'sys', 'class', 'net')
+    devices_dir = os.path.join(root, 'sys', 'devices')
+    commands = {}
+    write_file(os.path.join(
+        devices_dir, 'virtual', 'net', 'lo', 'address'), '00:00:00:00:00:00\n')
+    _symlink('../../devices/virtual/net/lo', os.path.join(class_dir, 'lo'))
+    features = six.b(
+        'Features for %s:\n'
+        'rx-checksumming: on\n'
+        'tx-checksumming: on\n'
+        '\ttx-checksum-ipv4: off [fixed]\n'
+        'scatter-gather: on\n'
+        'tcp-segmentation-offload: on\n'
+        'large-receive-offload: off [fixed]\n'
+    )
+    for x in range(nics):
+        name = 'ens%d' % x
+        # From bus 0x10, clear of the GPU's address however many NICs there
+        # are
+        pci_address = '0000:%02x:%02x.0' % (x // 32 + 0x10, x % 32)
+        net_dir = os.path.join(
+            devices_dir, 'pci0000:00', pci_address, 'net', name)
+        write_file(os.path.join(net_dir, 'addr_assign_type'), '0\n')
+        for filename, contents in (
+                ('speed', '10000'), ('duplex', 'full'), ('carrier', '1'),
+                ('operstate', 'up'), ('mtu', '1500'),
+                ('tx_queue_len', '1000')):
+            write_file(os.path.join(net_dir, filename), contents + '\n')
+        pci_dir = os.path.join(devices_dir, 'pci0000:00', pci_address)
+        for filename, contents in (
+                ('numa_node', '0'), ('class', '0x020000'),
+                ('vendor', '0x8086'), ('device', '0x1572'),
+                ('current_link_speed', '8.0 GT/s PCIe'),
+                ('current_link_width', '8'),
+                ('max_link_speed', '8.0 GT/s PCIe'), ('max_link_width', '8')):
+            write_file(os.path.join(pci_dir, filename), contents + '\n')
+        _symlink('../../../' + pci_address, os.path.join(net_dir, 'device'))
+        _symlink('../../../devices/pci0000:00/' + pci_address, os.path.join(
+            root, 'sys', 'bus', 'pci', 'devices', pci_address))
+        write_file(
+            os.path.join(net_dir, 'address'),
+            '02:00:00:%02x:%02x:%02x\n' % (
+                x >> 16 & 0xff, x >> 8 & 0xff, x & 0xff),
+        )
+        _symlink(
+            '../../devices/pci0000:00/%s/net/%s' % (pci_address, name),
+            os.path.join(class_dir, name),
+        )
+        commands[(
+            'udevadm', 'info', '-q', 'property', '/sys/class/net/' + name,
+        )] = _properties({
+            'ID_BUS': 'pci',
+            'ID_MODEL_FROM_DATABASE': 'Ethernet Controller X710 for 10GbE',
+            'ID_NET_DRIVER': 'i40e',
+            'ID_VENDOR_FROM_DATABASE': 'Intel Corporation',
+            'ID_VENDOR_ID': '0x8086',
+            'INTERFACE': name,
+        })
+        commands[('ethtool', '-k', name)] = features.replace(
+            six.b('%s'), six.b(name))
+    return commands
+
+
+def build_block(root, disks=1, partitions=2):
+    """Creates /sys/block, /sys/class/block, /dev/disk/by-id and
+    /dev/disk/by-partuuid trees under the supplied root directory for the
+    requested number of SCSI disks, each with the requested number of
+    partitions, and a /proc/self/mountinfo in which every partition but the
+    last of each disk is mounted.
+    """
+    block_dir = os.path.join(root, 'sys', 'block')
+    class_dir = os.path.join(root, 'sys', 'class', 'block')
+    by_partuuid_dir = os.path.join(root, 'dev', 'disk', 'by-partuuid')
+    by_id_dir = os.path.join(root, 'dev', 'disk', 'by-id')
+    mounts = ['21 0 0:20 / /proc rw,relatime shared:2 - proc proc rw']
+    for x in range(disks):
+        name = 'sd' + chr(ord('a') + x)
+        disk_dir = os.path.join(block_dir, name)
+        sectors = (x + 1) * 2 * 1024 * 1024 * 1024
+        write_file(os.path.join(disk_dir, 'size'), '%d\n' % sectors)
+        write_file(os.path.join(disk_dir, 'dev'), '8:%d\n' % (x * 16))
+        write_file(os.path.join(disk_dir, 'uevent'), 'MAJOR=8\nMINOR=%d\n'
+                   'DEVNAME=%s\nDEVTYPE=disk\n' % (x * 16, name))
+        _symlink('../../block/' + name, os.path.join(class_dir, name))
+        write_file(os.path.join(disk_dir, 'device', 'vendor'), 'ATA     \n')
+        for filename, contents in (
+                ('scheduler', 'mq-deadline kyber [bfq] none'),
+                ('nr_requests', '64'), ('read_ahead_kb', '128'),
+                ('rotational', '1'), ('logical_block_size', '512'),
+                ('physical_block_size', '4096'), ('optimal_io_size', '0'),
+                ('discard_max_bytes', '0'), ('write_cache', 'write back')):
+            write_file(os.path.join(disk_dir, 'queue', filename),
+                       contents + '\n')
+        _symlink('../../' + name, os.path.join(
+            by_id_dir, 'scsi-3600508e00000000%08x' % x))
+        for y in range(1, partitions + 1):
+            part = '%s%d' % (name, y)
+            devno = '8:%d' % (x * 16 + y)
+            part_dir = os.path.join(disk_dir, part)
+            write_file(os.path.join(part_dir, 'size'),
+                       '%d\n' % (sectors // partitions))
+            write_file(os.path.join(part_dir, 'start'),
+                       '%d\n' % (2048 + (y - 1) * (sectors // partitions)))
+            write_file(os.path.join(part_dir, 'dev'), devno + '\n')
+            write_file(os.path.join(part_dir, 'partition'), '%d\n' % y)
+            write_file(os.path.join(part_dir, 'uevent'), ''.join(
+                '%s=%s\n' % kv for kv in (
+                    ('MAJOR', 8), ('MINOR', x * 16 + y), ('DEVNAME', part),
+                    ('DEVTYPE', 'partition'), ('PARTN', y),
+                    ('PARTNAME', 'data-%s' % part))))
+            _symlink('../../block/%s/%s' % (name, part),
+                     os.path.join(class_dir, part))
+            _symlink('../../' + part, os.path.join(
+                by_partuuid_dir, '0000000%d-0%d' % (x, y)))
+            if y < partitions:
+                mounts.append(
+                    '%d 1 %s / /srv/%s rw,relatime shared:1 - ext4 /dev/%s '
+                    'rw' % (len(mounts) + 21, devno, part, part))
+    write_file(os.path.join(root, 'proc', 'self', 'mountinfo'),
+               '\n'.join(mounts) + '\n')
+
+
+def _block_device(root, path, name, devno, sectors, slaves=(), holders=()):
+    # Creates a block device's directory at the supplied path under
+    # /sys/devices, and its /sys/class/block entry
+    dev_dir = os.path.join(root, 'sys', 'devices', path)
+    write_file(os.path.join(dev_dir, 'dev'), devno + '\n')
+    write_file(os.path.join(dev_dir, 'size'), '%d\n' % sectors)
+    for kind, names in (('slaves', slaves), ('holders', holders)):
+        os.makedirs(os.path.join(dev_dir, kind))
+        for other in names:
+            _symlink('../../' + other, os.path.join(dev_dir, kind, other))
+    _symlink('../../devices/' + path,
+             os.path.join(root, 'sys', 'class', 'block', name))
+    return dev_dir
+
+
+def build_stack(root):
+    """Creates a /sys/class/block tree and /proc/self/mountinfo under the
+    supplied root directory for a host with an LVM logical volume, vg0-root,
+    mounted at /, on a dm-crypt device, cryptroot, on an md RAID 1 array of
+    the first partitions of two SCSI disks, an NVMe disk whose first
+    partition is mounted at /boot, and a dm-crypt device, cryptdata, mounted
+    at /data, on the first partition of an md RAID 1 array, md126, of two
+    more NVMe disks.
+    """
+    part_sectors = 1024 * 1024
+    for x, disk in enumerate(('sda', 'sdb')):
+        path = 'pci0000:00/0000:00:1f.2/ata%d/block/%s' % (x + 1, disk)
+        _block_device(root, path, disk, '8:%d' % (x * 16), part_sectors * 2)
+        part_dir = _block_device(
+            root, path + '/' + disk + '1', disk + '1', '8:%d' % (x * 16 + 1),
+            part_sectors, holders=['md0'])
+        write_file(os.path.join(part_dir, 'partition'), '1\n')
+    md_dir = _block_device(
+        root, 'virtual/block/md0', 'md0', '9:0', part_sectors - 2048,
+        slaves=['sda1', 'sdb1'], holders=['dm-0'])
+    write_file(os.path.join(md_dir, 'md', 'level'), 'raid1\n')
+    for x, (name, uuid, slave, holders) in enumerate((
+            ('cryptroot', 'CRYPT-LUKS2-0123-cryptroot', 'md0', ['dm-1']),
+            ('vg0-root', 'LVM-0123456789abcdef', 'dm-0', []))):
+        dm_dir = _block_device(
+            root, 'virtual/block/dm-%d' % x, 'dm-%d' % x, '253:%d' % x,
+            part_sectors - 4096, slaves=[slave], holders=holders)
+        write_file(os.path.join(dm_dir, 'dm', 'name'), name + '\n')
+        write_file(os.path.join(dm_dir, 'dm', 'uuid'), uuid + '\n')
+    path = 'pci0000:00/0000:00:1d.0/nvme/nvme0/nvme0n1'
+    _block_device(root, path, 'nvme0n1', '259:0', part_sectors * 4)
+    part_dir = _block_device(
+        root, path + '/nvme0n1p1', 'nvme0n1p1', '259:1', part_sectors)
+    write_file(os.path.join(part_dir, 'partition'), '1\n')
+    for x in (1, 2):
+        disk = 'nvme%dn1' % x
+        _block_device(
+            root, 'pci0000:00/0000:00:1d.%d/nvme/nvme%d/%s' % (x, x, disk),
+            disk, '259:%d' % (x * 2), part_sectors * 2, holders=['md126'])
+    md_dir = _block_device(
+        root, 'virtual/block/md126', 'md126', '9:126', part_sectors * 2,
+        slaves=['nvme1n1', 'nvme2n1'])
+    write_file(os.path.join(md_dir, 'md', 'level'), 'raid1\n')
+    part_dir = _block_device(
+        root, 'virtual/block/md126/md126p1', 'md126p1', '259:10',
+        part_sectors, holders=['dm-2'])
+    write_file(os.path.join(part_dir, 'partition'), '1\n')
+    dm_dir = _block_device(
+        root, 'virtual/block/dm-2', 'dm-2', '253:2', part_sectors - 4096,
+        slaves=['md126p1'])
+    write_file(os.path.join(dm_dir, 'dm', 'name'), 'cryptdata\n')
+    write_file(os.path.join(dm_dir, 'dm', 'uuid'),
+               'CRYPT-LUKS2-4567-cryptdata\n')
+    write_file(os.path.join(root, 'proc', 'self', 'mountinfo'), ''.join([
+        '21 1 253:1 / / rw,relatime shared:1 - xfs /dev/mapper/vg0-root rw\n',
+        '22 21 259:1 / /boot rw,relatime shared:2 - ext4 /dev/nvme0n1p1 rw\n',
+        '23 21 253:2 / /data rw,relatime shared:3 - xfs '
+        '/dev/mapper/cryptdata rw\n',
+    ]))
+
+
+def _pci_netdev(root, address, name, numa_node=None, driver=None):
+    # Creates a PCI device with a network interface, and its /sys/bus/pci
+    # and /sys/class/net entries. Returns the device's directory.
+    dev_dir = os.path.join(root, 'sys', 'devices', 'pci0000:00', address)
+    if numa_node is not None:
+        write_file(os.path.join(dev_dir, 'numa_node'), '%d\n' % numa_node)
+    else:
+        os.makedirs(dev_dir)
+    _symlink('../../../devices/pci0000:00/' + address, os.path.join(
+        root, 'sys', 'bus', 'pci', 'devices', address))
+    if driver is not None:
+        _symlink('../../../bus/pci/drivers/' + driver,
+                 os.path.join(dev_dir, 'driver'))
+    if name is not None:
+        write_file(os.path.join(dev_dir, 'net', name, 'mtu'), '1500\n')
+        _symlink('../../../' + address,
+                 os.path.join(dev_dir, 'net', name, 'device'))
+        _symlink('../../devices/pci0000:00/%s/net/%s' % (address, name),
+                 os.path.join(root, 'sys', 'class', 'net', name))
+    return dev_dir
+
+
+def _virtual_netdev(root, name, files):
+    # Creates a virtual network interface with the supplied files, and its
+    # /sys/class/net entry
+    net_dir = os.path.join(root, 'sys', 'devices', 'virtual', 'net', name)
+    for path, contents in files.items():
+        if contents is None:
+            os.makedirs(os.path.join(net_dir, path))
+        else:
+            write_file(os.path.join(net_dir, path), contents)
+    _symlink('../../devices/virtual/net/' + name,
+             os.path.join(root, 'sys', 'class', 'net', name))
+    return net_dir
+
+
+def build_sriov(root):
+    """Creates a /sys/class/net tree under the supplied root directory with
+    two SR-IOV capable NICs in an 802.3ad bond, which is a port of a bridge:
+
+    * enp1s0f0, on NUMA node 0, with 2 of 8 virtual functions enabled, the
+      first of which is a port of the bridge and so in use
+    * enp130s0f0, on NUMA node 1, with 3 of 8 virtual functions enabled, the
+      first of which is bound to vfio-pci and so in use, and the last of which
+      is bound to no driver
+    """
+    for pf, bus, numa_node, vfs in (
+            ('enp1s0f0', 0x01, 0, ('iavf', 'iavf')),
+            ('enp130s0f0', 0x82, 1, ('vfio-pci', 'iavf', None))):
+        address = '0000:%02x:00.0' % bus
+        dev_dir = _pci_netdev(root, address, pf, numa_node, 'i40e')
+        write_file(os.path.join(dev_dir, 'sriov_totalvfs'), '8\n')
+        write_file(os.path.join(dev_dir, 'sriov_numvfs'), '%d\n' % len(vfs))
+        for x, driver in enumerate(vfs):
+            vf_address = '0000:%02x:02.%d' % (bus, x)
+            name = None
+            if driver == 'iavf':
+                name = '%sv%d' % (pf, x)
+            _pci_netdev(root, vf_address, name, numa_node, driver)
+            _symlink('../' + vf_address,
+                     os.path.join(dev_dir, 'virtfn%d' % x))
+    _virtual_netdev(root, 'bond0', {
+        'bonding/mode': '802.3ad 4\n',
+        'bonding/slaves': 'enp1s0f0 enp130s0f0\n',
+    })
+    br_dir = _virtual_netdev(root, 'br0', {'brif': None})
+    for port in ('bond0', 'enp1s0f0v0'):
+        _symlink('../../%s/brport' % port, os.path.join(br_dir, 'brif', port))
+
+
+def build_gpu(root):
+    """Returns a dict of the lspci and udevadm outputs describing a host with
+    a single GPU, for use with `FixtureFilesystem`.
+    """
+    address = '0000:03:00.0'
+    write_file(os.path.join(
+        root, 'sys', 'devices', 'pci0000:00', address, 'vendor'), '0x10de\n')
+    _symlink('../../../devices/pci0000:00/' + address, os.path.join(
+        root, 'sys', 'bus', 'pci', 'devices', address))
+    return {
+        ('lspci', '-D'): six.b(
+            '0000:00:00.0 Host bridge: Intel Corporation Device 6f00\n'
+            '%s VGA compatible controller: NVIDIA Corporation GP102 '
+            '[TITAN Xp] (rev a1)\n' % address
+        ),
+        ('udevadm', 'info', '-q', 'property',
+         '/sys/bus/pci/devices/' + address): _properties({
+             'DRIVER': 'nvidia',
+             'ID_MODEL_FROM_DATABASE': 'GP102 [TITAN Xp]',
+             'ID_VENDOR_FROM_DATABASE': 'NVIDIA Corporation',
+             'PCI_ID': '10DE:1B02',
+         }),
+    }
+
+
+def build_host(root, nodes=1, cores_per_node=2, threads_per_core=2, nics=2,
+               disks=1, partitions=2):
+    """Creates a synthetic host under the supplied root directory with
+    everything hwk's `info()` functions read and returns a
+    `FixtureFilesystem` for it.
+    """
+    build_topology(root, nodes, cores_per_node, threads_per_core)
+    build_cpuinfo(root, nodes, cores_per_node, threads_per_core)
+    build_memory(root)
+    commands = {}
+    commands.update(build_net(root, nics))
+    build_block(root, disks, partitions)
+    commands.update(build_gpu(root))
+    return FixtureFilesystem(root, commands)
@@ -0,0 +1,318 @@
+# -*- coding: utf-8 -*-
+
+# Licensed under the Apache License, Version 2.0 (the "License"); you may
+# not use this file except in compliance with the License. You may obtain
+# a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+# WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+# License for the specific language governing permissions and limitations
+# under the License.
+
+import os
+import shutil
+import tempfile
+import threading
+
+import mock
+
+from hwk import block
+from hwk import fs
+
+from hwk.tests import fixtures
+from hwk.tests.unit import base
+
+
+class TestBlock(base.TestCase):
+
+    def setUp(self):
+        super(TestBlock, self).setUp()
+        self.root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.root)
+        self.host = fixtures.build_host(self.root, disks=2, partitions=2)
+
+    def _disks(self):
+        with fs.use(self.host):
+            disks = block.info().disks
+        return sorted(disks, key=lambda d: d.name)
+
+    def test_lazy(self):
+        disks = self._disks()
+        self.assertEqual(['sda', 'sdb'], [d.name for d in disks])
+        self.assertEqual(1024 ** 4, disks[0].size_bytes)
+
+        # Attributes are read from the host the disk was discovered on, even
+        # outside of the fs.use() block, and only when first accessed
+        counting = fixtures.CountingFilesystem(self.root)
+        disks[0]._filesystem = counting
+        self.assertEqual('ATA', disks[0].vendor)
+        self.assertEqual(1, len(counting.opened))
+        self.assertEqual('ATA', disks[0].vendor)
+        self.assertEqual(1, len(counting.opened))
+
+        self.assertEqual('3600508e0000000000000000', disks[0].serial_no)
+        parts = sorted(disks[0].partitions, key=lambda p: p.name)
+        self.assertEqual(['sda1', 'sda2'], [p.name for p in parts])
+        self.assertEqual(('ext4', '/srv/sda1'),
+                         (parts[0].type, parts[0].mount_point))
+        self.assertEqual((None, None), (parts[1].type, parts[1].mount_point))
+
+    def test_prefetch(self):
+        disks = self._disks()
+        counting = fixtures.CountingFilesystem(self.root)
+        for d in disks:
+            d._filesystem = counting
+        block.prefetch(disks, fields=['serial_no', 'mount_point'])
+        # mountinfo is read once for all partitions
+        self.assertEqual(
+            ['/proc/self/mountinfo'],
+            [p for p in counting.opened if p.startswith('/proc')],
+        )
+        for d in disks:
+            for p in d.partitions:
+                self.assertEqual(
+                    p.name.endswith('1'), p.mount_point is not None)
+        self.assertEqual(
+            ['3600508e0000000000000000', '3600508e0000000000000001'],
+            [d.serial_no for d in disks],
+        )
+        del counting.opened[:]
+        block.prefetch(disks)
+        # Only the vendors and queues are left to determine, since the type
+        # and mount point of partitions are determined together
+        self.assertEqual(
+            ['/sys/block/sda/device/vendor', '/sys/block/sdb/device/vendor'],
+            sorted(p for p in counting.opened if '/queue/' not in p))
+        self.assertEqual(18, len(counting.opened) - 2)
+        self.assertRaises(ValueError, block.prefetch, disks, ['colour'])
+
+    def test_include(self):
+        counting = fixtures.CountingFilesystem(self.root)
+        with fs.use(counting):
+            res = block.info(include=['size_bytes'])
+        self.assertEqual(
+            sum(d.size_bytes for d in res.disks), res.total_size_bytes)
+        # Only the disk sizes are read
+        self.assertEqual(
+            ['/sys/block/sda/size', '/sys/block/sdb/size'],
+            sorted(counting.opened),
+        )
+
+        del counting.opened[:]
+        with fs.use(counting):
+            res = block.info(include=['mount_point'])
+        self.assertIsNone(res.disks[0].size_bytes)
+        self.assertEqual(
+            ['/proc/self/mountinfo'],
+            [p for p in counting.opened if p.startswith('/proc')],
+        )
+
+    def test_partitions(self):
+        # An NVMe disk, whose partitions are not named after the first three
+        # letters of the disk's name
+        disk_dir = os.path.join(
+            self.root, 'sys', 'devices', 'pci0000:00', '0000:00:1d.0', 'nvme',
+            'nvme0', 'nvme0n1')
+        fixtures.write_file(os.path.join(disk_dir, 'size'), '4194304\n')
+        fixtures.write_file(
+            os.path.join(disk_dir, 'uevent'), 'DEVTYPE=disk\n')
+        fixtures.write_file(os.path.join(disk_dir, 'nvme0n1p1', 'size'),
+                            '1048576\n')
+        fixtures.write_file(os.path.join(disk_dir, 'nvme0n1p1', 'start'),
+                            '2048\n')
+        fixtures.write_file(
+            os.path.join(disk_dir, 'nvme0n1p1', 'uevent'),
+            'DEVNAME=nvme0n1p1\nDEVTYPE=partition\nPARTN=1\n')
+        rel = '../../devices/pci0000:00/0000:00:1d.0/nvme/nvme0/nvme0n1'
+        os.symlink(rel[3:],
+                   os.path.join(self.root, 'sys', 'block', 'nvme0n1'))
+        for name in ('nvme0n1', 'nvme0n1p1'):
+            os.symlink(
+                rel + ('/' + name if name != 'nvme0n1' else ''),
+                os.path.join(self.root, 'sys', 'class', 'block', name))
+
+        disks = self._disks()
+        self.assertEqual(['nvme0n1', 'sda', 'sdb'], [d.name for d in disks])
+        nvme, sda = disks[0], disks[1]
+        self.assertEqual('NVMe', nvme.bus_type)
+        p1, = nvme.partitions
+        self.assertEqual(
+            ('nvme0n1p1', 1, 1048576, 512 * 1024 * 1024, None, None),
+            (p1.name, p1.number, p1.start_bytes, p1.size_bytes, p1.uuid,
+             p1.label))
+        sda1, sda2 = sda.partitions
+        self.assertEqual((2, sda.size_bytes // 2 + 1048576),
+                         (sda2.number, sda2.start_bytes))
+        self.assertEqual(('00000000-01', 'data-sda1'),
+                         (sda1.uuid, sda1.label))
+
+    def test_partitions_lazy(self):
+        # Partitions determined on first access are read from the disk's own
+        # directory, not from those of every block device
+        disks = self._disks()
+        counting = fixtures.CountingFilesystem(self.root)
+        disks[0]._filesystem = counting
+        self.assertEqual(
+            ['sda1', 'sda2'], [p.name for p in disks[0].partitions])
+        self.assertEqual(
+            set(['/sys/block/sda/sda1', '/sys/block/sda/sda2']),
+            set(os.path.dirname(p) for p in counting.opened))
+
+    def test_queue(self):
+        with fs.use(self.host):
+            sda = block.info(include=['queue']).disks[0]
+            queue = sda.queue
+            self.assertEqual('bfq', queue.scheduler)
+            self.assertEqual(
+                ('mq-deadline', 'kyber', 'bfq', 'none'), queue.schedulers)
+            self.assertEqual(64, queue.nr_requests)
+            self.assertTrue(queue.rotational)
+            self.assertEqual(4096, queue.physical_block_size)
+            self.assertEqual('write back', queue.write_cache)
+
+            settings = {
+                'sda': {'scheduler': 'mq-deadline', 'nr_requests': 256},
+                'sdb': {'scheduler': 'mq-deadline', 'rotational': False},
+            }
+            queues = block.apply_queues(settings)
+            self.assertEqual('mq-deadline', queues['sdb'].scheduler)
+            self.assertFalse(queues['sdb'].rotational)
+            self.assertEqual(256, queues['sda'].nr_requests)
+            self.assertEqual(128, queues['sda'].read_ahead_kb)
+
+            # Nothing is written unless every value is valid
+            for disk, values in (('sdc', {'nr_requests': 8}),
+                                 ('sda', {'logical_block_size': 4096}),
+                                 ('sda', {'nr_requests': 0}),
+                                 ('sdb', {'scheduler': 'cfq'})):
+                self.assertRaises(ValueError, block.apply_queues, {
+                    'sda': {'read_ahead_kb': 0}, disk: values})
+            self.assertEqual(128, block.info().disks[0].queue.read_ahead_kb)
+
+    def test_apply_queues_scheduler_first(self):
+        queue_dir = os.path.join(self.root, 'sys', 'block', 'sda', 'queue')
+        host_open = self.host.open
+        refused = []
+
+        def fake_open(path, mode='r'):
+            # Like the kernel, reset nr_requests when the scheduler changes,
+            # and refuse the values in refused
+            if mode == 'w' and path.endswith('/queue/scheduler'):
+                fixtures.write_file(
+                    os.path.join(queue_dir, 'nr_requests'), '64\n')
+            if mode == 'w' and path.rsplit('/', 1)[1] in refused:
+                raise IOError(22, 'Invalid argument')
+            return host_open(path, mode)
+
+        settings = {'sda': {'scheduler': 'mq-deadline', 'nr_requests': 256}}
+        with fs.use(self.host), \
+                mock.patch.object(self.host, 'open', fake_open):
+            queue = block.apply_queues(settings)['sda']
+            self.assertEqual(
+                ('mq-deadline', 256), (queue.scheduler, queue.nr_requests))
+
+            # Values already written are put back when one is refused
+            fixtures.write_file(os.path.join(queue_dir, 'scheduler'),
+                                '[mq-deadline] kyber bfq none\n')
+            refused.append('read_ahead_kb')
+            settings = {'sda': {'scheduler': 'kyber', 'nr_requests': 128,
+                                'read_ahead_kb': 0}}
+            self.assertRaises(IOError, block.apply_queues, settings)
+            queue = block.info().disks[0].queue
+            self.assertEqual(
+                ('mq-deadline', 256, 128),
+                (queue.scheduler, queue.nr_requests, queue.read_ahead_kb))
+
+    def test_stack(self):
+        root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, root)
+        fixtures.build_stack(root)
+        with fs.use(fs.Filesystem(root)):
+            stack = block.stack()
+
+        self.assertEqual('vg0-root', stack.find('/').dm_name)
+        self.assertEqual('lvm', stack.find('/').kind)
+        self.assertEqual('crypt', stack.find('/dev/mapper/cryptroot').kind)
+        self.assertEqual('raid1', stack.find('/dev/md0').md_level)
+        self.assertEqual('sdb', stack.find('sdb1').parent)
+        md126p1 = stack.find('md126p1')
+        self.assertEqual(
+            ('partition', 'md126'), (md126p1.kind, md126p1.parent))
+        self.assertEqual(
+            ['sda', 'sdb'], [d.name for d in stack.disks('/')])
+        self.assertEqual(
+            ['sda1', 'sdb1'], [d.name for d in stack.leaves('vg0-root')])
+        self.assertEqual(2 * 512 * 1024 ** 2, stack.raw_bytes('vg0-root'))
+        self.assertEqual(['nvme0n1'], [d.name for d in stack.disks('/boot')])
+        self.assertEqual('crypt', stack.find('/data').kind)
+        self.assertEqual(
+            ['nvme1n1', 'nvme2n1'], [d.name for d in stack.disks('/data')])
+        self.assertEqual(
+            ['nvme1n1', 'nvme2n1'], [d.name for d in stack.leaves('md126p1')])
+        self.assertEqual(4 * 512 * 1024 ** 2, stack.raw_bytes('/data'))
+        self.assertRaises(KeyError, stack.find, '/srv')
+        copy = block.Stack.from_dict(stack.to_dict())
+        self.assertEqual(stack.to_dict(), copy.to_dict())
+        self.assertEqual(
+            ['sda', 'sdb'], [d.name for d in copy.disks('/')])
+
+    def test_usage(self):
+        os.makedirs(os.path.join(self.root, 'srv', 'sda1'))
+        hung = threading.Event()
+        self.addCleanup(hung.set)
+        statvfs = self.host.statvfs
+        calls = []
+
+        def fake_statvfs(path):
+            calls.append(path)
+            if path == '/srv/sdb1':
+                hung.wait()
+            return statvfs(path)
+
+        with fs.use(self.host), \
+                mock.patch.object(self.host, 'statvfs', fake_statvfs), \
+                mock.patch.object(block, 'USAGE_TIMEOUT', 0.2):
+            for x in range(2):
+                disks = sorted(block.info(include=['usage']).disks,
+                               key=lambda d: d.name)
+                sda1, sda2 = disks[0].partitions
+                self.assertIsNone(sda2.usage)
+                # The hung mount is waited for once, and asked about once
+                self.assertIsNone(disks[1].partitions[0].usage)
+                self.assertEqual(
+                    ['/srv/sdb1', '/srv/sda1'], sorted(calls, reverse=True))
+        st = os.statvfs(os.path.join(self.root, 'srv', 'sda1'))
+        self.assertEqual(st.f_blocks * st.f_frsize, sda1.usage.total_bytes)
+        self.assertEqual(st.f_files, sda1.usage.total_inodes)
+
+    def test_usage_hung_mounts(self):
+        # One more hung mount than there are workers, asked about before a
+        # healthy one
+        os.makedirs(os.path.join(self.root, 'srv', 'sda1'))
+        hung_paths = [
+            '/hung/%d' % x for x in range(block._USAGE_WORKERS + 1)
+        ]
+        hung = threading.Event()
+        self.addCleanup(hung.set)
+        statvfs = self.host.statvfs
+
+        def fake_statvfs(path):
+            if path in hung_paths:
+                hung.wait()
+            return statvfs(path)
+
+        with fs.use(self.host), \
+                mock.patch.object(self.host, 'statvfs', fake_statvfs), \
+                mock.patch.object(block, 'USAGE_TIMEOUT', 0.2), \
+                mock.patch.object(block, '_statvfs_pool', block._StatvfsPool(
+                    block._USAGE_WORKERS)):
+            block._linux_usages(hung_paths + ['/srv/sda1'])
+            # The threads stuck on hung mounts are replaced, so the healthy
+            # mount is answered once they have been stuck for USAGE_TIMEOUT
+            usages = block._linux_usages(hung_paths + ['/srv/sda1'])
+        self.assertIsNotNone(usages['/srv/sda1'])
+        self.assertEqual(
+            [None] * len(hung_paths), [usages[p] for p in hung_paths])
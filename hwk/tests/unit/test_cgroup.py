@@ -0,0 +1,105 @@
+# -*- coding: utf-8 -*-
+
+# Licensed under the Apache License, Version 2.0 (the "License"); you may
+# not use this file except in compliance with the License. You may obtain
+# a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+# WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+# License for the specific language governing permissions and limitations
+# under the License.
+
+import os
+import shutil
+import tempfile
+
+import mock
+
+from hwk import cgroup
+from hwk import cpu
+
+from hwk.tests import fixtures
+from hwk.tests.unit import base
+
+
+class TestCgroup(base.TestCase):
+
+    def setUp(self):
+        super(TestCgroup, self).setUp()
+        self.root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.root)
+        self.cgroup_path = os.path.join(self.root, 'cgroup')
+        self.mountinfo_path = os.path.join(self.root, 'mountinfo')
+        for name, path in (
+                ('_LINUX_PROC_SELF_CGROUP', self.cgroup_path),
+                ('_LINUX_PROC_SELF_MOUNTINFO', self.mountinfo_path)):
+            patcher = mock.patch.object(cgroup, name, path)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def _write(self, path, contents):
+        fixtures.write_file(os.path.join(self.root, path), contents)
+
+    def test_v2(self):
+        self._write('cgroup', '0::/kubepods/pod1/ctr1\n')
+        self._write('mountinfo', (
+            '30 24 0:26 / %s/fs/cgroup rw,nosuid - cgroup2 cgroup2 rw\n'
+        ) % self.root)
+        self._write('fs/cgroup/kubepods/cpu.max', '800000 100000\n')
+        self._write('fs/cgroup/kubepods/memory.max', '8589934592\n')
+        self._write('fs/cgroup/kubepods/pod1/ctr1/cpu.max', '150000 100000\n')
+        self._write('fs/cgroup/kubepods/pod1/ctr1/memory.max', 'max\n')
+        self._write('fs/cgroup/kubepods/pod1/ctr1/memory.high', '1073741824\n')
+        self._write('fs/cgroup/kubepods/pod1/ctr1/cpuset.cpus.effective',
+                    '4-7\n')
+
+        version, dirs = cgroup.controller_dirs('cpu')
+        self.assertEqual(2, version)
+        self.assertEqual(
+            os.path.join(self.root, 'fs/cgroup/kubepods/pod1/ctr1'), dirs[0])
+        self.assertEqual(os.path.join(self.root, 'fs/cgroup'), dirs[-1])
+        self.assertEqual(1.5, cgroup.cpu_quota())
+        self.assertEqual(set([4, 5, 6, 7]), cgroup.cpuset_cpus())
+        self.assertEqual((8589934592, 1073741824), cgroup.memory_limits())
+
+    def test_v1_hybrid_container(self):
+        # In a container without a cgroup namespace, /proc/self/cgroup has
+        # the host's path but only the container's own cgroup is mounted
+        self._write('cgroup', (
+            '4:memory:/docker/abc\n'
+            '3:cpu,cpuacct:/docker/abc\n'
+            '0::/docker/abc\n'
+        ))
+        self._write('mountinfo', (
+            '33 32 0:29 /docker/abc %(r)s/cpu rw - cgroup cgroup rw,cpu,'
+            'cpuacct\n'
+            '36 32 0:32 /docker/abc %(r)s/memory rw - cgroup cgroup '
+            'rw,memory\n'
+            '42 32 0:38 /docker/abc %(r)s/unified rw - cgroup2 cgroup2 rw\n'
+        ) % {'r': self.root})
+        self._write('cpu/cpu.cfs_quota_us', '200000\n')
+        self._write('cpu/cpu.cfs_period_us', '100000\n')
+        self._write('memory/memory.limit_in_bytes', '9223372036854771712\n')
+
+        self.assertEqual(
+            (1, [os.path.join(self.root, 'cpu')]),
+            cgroup.controller_dirs('cpu'),
+        )
+        self.assertEqual(2.0, cgroup.cpu_quota())
+        self.assertEqual((None, None), cgroup.memory_limits())
+        self.assertIsNone(cgroup.cpuset_cpus())
+
+    def test_no_cgroups(self):
+        self.assertEqual((None, []), cgroup.controller_dirs('cpu'))
+        self.assertIsNone(cgroup.cpu_quota())
+
+    def test_usable_parallelism(self):
+        allowed = cpu._linux_usable_parallelism_from
+        all_cpus = set(range(64))
+        self.assertEqual(64, allowed(all_cpus, None, None))
+        self.assertEqual(4, allowed(all_cpus, set([0, 1, 2, 3]), None))
+        self.assertEqual(2, allowed(all_cpus, set([0, 1, 2, 3]), 1.5))
+        self.assertEqual(1, allowed(all_cpus, None, 0.25))
@@ -0,0 +1,85 @@
+# Licensed under the Apache License, Version 2.0 (the "License"); you may
+# not use this file except in compliance with the License. You may obtain
+# a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+# WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+# License for the specific language governing permissions and limitations
+# under the License.
+
+import json
+import os
+import shutil
+import tempfile
+
+import mock
+import six
+
+from hwk import cli
+from hwk import fs
+
+from hwk.tests import fixtures
+from hwk.tests.unit import base
+
+
+class TestCli(base.TestCase):
+
+    def setUp(self):
+        super(TestCli, self).setUp()
+        self.root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.root)
+        self.host = fixtures.build_host(self.root, nics=2)
+
+    def _main(self, *argv):
+        with fs.use(self.host), mock.patch(
+                'sys.stdout', new_callable=six.StringIO) as out:
+            res = cli.main(list(argv))
+        return res, out.getvalue()
+
+    def test_json(self):
+        res, out = self._main(
+            '--json', '--only', 'memory,net,block', '--fields', 'mac')
+        self.assertEqual(0, res)
+        # Modules supporting none of the fields are skipped, and fields that
+        # were not asked for are not determined
+        lines = [json.loads(line) for line in out.splitlines()]
+        self.assertEqual(['net'], [line['module'] for line in lines])
+        self.assertEqual(
+            [{'name': 'ens0', 'mac': '02:00:00:00:00:00'},
+             {'name': 'ens1', 'mac': '02:00:00:00:00:01'}],
+            sorted(lines[0]['info']['nics'], key=lambda n: n['mac']))
+
+        self.assertRaises(SystemExit, self._main, '--only', 'disk')
+        self.assertRaises(
+            SystemExit, self._main, '--only', 'net', '--fields', 'serial_no')
+
+    def test_snapshot(self):
+        path = os.path.join(self.root, 'host.json.gz')
+        res, out = self._main(
+            'capture', '-o', path, '--root', self.root, 'net')
+        self.assertEqual(0, res)
+        self.assertIn(path, out)
+        res, out = self._main('replay', path, 'net')
+        self.assertEqual(0, res)
+        self.assertEqual('net (2 NICs)\n', out)
+
+    def test_watch(self):
+        fixtures.write_file(
+            os.path.join(self.root, 'proc', 'stat'),
+            'cpu  10 0 5 100 0 0 0 0\ncpu0 10 0 5 100 0 0 0 0\nintr 0\n')
+        with mock.patch('time.sleep') as sleep:
+            res, out = self._main(
+                '--only', 'net,cpu', '--watch', '5', '--count', '2')
+        self.assertEqual(0, res)
+        self.assertEqual(2, sleep.call_count)
+        lines = out.splitlines()
+        self.assertIn('== Network information ' + '=' * 41, lines)
+        # Nothing changed, so only the utilization of each interval follows
+        # the first collection
+        busy = [line for line in lines if ' busy (' in line]
+        self.assertEqual(2, len(busy))
+        self.assertEqual(
+            busy, [line for line in lines if line.startswith('[')])
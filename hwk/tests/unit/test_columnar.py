@@ -0,0 +1,66 @@
+# Licensed under the Apache License, Version 2.0 (the "License"); you may
+# not use this file except in compliance with the License. You may obtain
+# a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+# WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+# License for the specific language governing permissions and limitations
+# under the License.
+
+import json
+import os
+import shutil
+import tempfile
+
+from hwk import columnar
+from hwk import fs
+
+from hwk.tests import fixtures
+from hwk.tests.unit import base
+
+
+class TestColumnar(base.TestCase):
+
+    def setUp(self):
+        super(TestColumnar, self).setUp()
+        self.root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.root)
+
+    def _collect(self, host, **kwargs):
+        root = os.path.join(self.root, host)
+        os.mkdir(root)
+        with fs.use(fixtures.build_host(root, **kwargs)):
+            return columnar.collect(host)
+
+    def test_inventory(self):
+        inv = self._collect('a', nics=3, disks=2, partitions=2)
+        self.assertEqual(3, len(inv['nics']))
+        self.assertEqual(2, len(inv['disks']))
+        self.assertEqual(4, len(inv['partitions']))
+        self.assertEqual({'a': 3}, inv['nics'].count_by('host'))
+        self.assertEqual(
+            inv['hosts']['total_disk_bytes'][0],
+            inv['disks'].sum_by('host', 'size_bytes')['a'],
+        )
+
+        # Inventories exported as JSON are appended column by column
+        other = self._collect('b', nics=2, disks=1, partitions=1)
+        data = json.loads(json.dumps(other.to_dict()))
+        inv.extend(columnar.Inventory.from_dict(data))
+        nics = inv['nics']
+        self.assertEqual({'a': 3, 'b': 2}, nics.count_by('host'))
+        self.assertEqual({'i40e': 5}, nics.count_by('driver'))
+        self.assertEqual('b', nics['host'][4])
+        self.assertEqual(
+            list(range(3)), list(nics.where('host', 'a')))
+        self.assertEqual(
+            {'ext4': 2, None: 3},
+            inv['partitions'].count_by('type'),
+        )
+        self.assertEqual(0, len(nics.where('driver', 'igb')))
+
+        data['version'] = 2
+        self.assertRaises(ValueError, columnar.Inventory.from_dict, data)
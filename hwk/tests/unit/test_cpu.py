@@ -0,0 +1,172 @@
+# -*- coding: utf-8 -*-
+
+# Licensed under the Apache License, Version 2.0 (the "License"); you may
+# not use this file except in compliance with the License. You may obtain
+# a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+# WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+# License for the specific language governing permissions and limitations
+# under the License.
+
+import os
+import shutil
+import tempfile
+
+import mock
+
+from hwk import cpu
+from hwk import topology
+from hwk import utils
+
+from hwk.tests import fixtures
+from hwk.tests.unit import base
+
+
+class TestSampler(base.TestCase):
+
+    def setUp(self):
+        super(TestSampler, self).setUp()
+        self.root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.root)
+        self.stat_path = os.path.join(self.root, 'stat')
+        patcher = mock.patch.object(cpu, '_LINUX_PROC_STAT', self.stat_path)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        patcher = mock.patch('platform.system', return_value='Linux')
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def _write_stat(self, lines):
+        fixtures.write_file(self.stat_path, '\n'.join(
+            ['cpu  0 0 0 0 0 0 0 0 0 0'] + lines + ['intr 1 0 0', 'ctxt 1']
+        ) + '\n')
+
+    def test_sample(self):
+        self._write_stat([
+            'cpu0 100 0 100 100 0 0 0 0 0 0',
+            'cpu2 100 0 100 100 0 0 0 0 0 0',
+        ])
+        sampler = cpu.Sampler()
+        first = sampler.sample()
+        self.assertEqual(set([0, 2]), first.processor_set)
+        self.assertEqual(3, first.size)
+
+        # cpu0: 50 user, 50 idle; cpu2: 150 system, 0 idle, 50 steal; cpu3
+        # came online with 100 ticks of iowait
+        self._write_stat([
+            'cpu0 150 0 100 150 0 0 0 0 0 0',
+            'cpu2 100 0 250 100 0 0 0 50 0 0',
+            'cpu3 0 0 0 0 100 0 0 0 0 0',
+        ])
+        res = sampler.sample()
+        self.assertEqual(set([0, 2, 3]), res.processor_set)
+        self.assertEqual(4, res.size)
+        self.assertEqual(50.0, res.user[0])
+        self.assertEqual(50.0, res.idle[0])
+        self.assertEqual(75.0, res.system[2])
+        self.assertEqual(25.0, res.steal[2])
+        self.assertEqual(100.0, res.iowait[3])
+        self.assertEqual(0.0, res.user[1])
+
+        # Weighted by ticks: cpu0 accounted for 100 ticks and cpu2 for 200
+        agg = res.aggregate(utils.ProcessorSet([0, 2]))
+        self.assertAlmostEqual(50.0 / 3, agg['user'])
+        self.assertAlmostEqual(50.0, agg['system'])
+        self.assertAlmostEqual(50.0 / 3, agg['steal'])
+
+        core = topology.Core(0)
+        core.processor_set = utils.ProcessorSet([2, 3])
+        agg = res.aggregate(core)
+        self.assertAlmostEqual(100.0 / 3, agg['iowait'])
+
+        # cpu2 went offline: its entries no longer hold the last interval's
+        self._write_stat([
+            'cpu0 200 0 100 200 0 0 0 0 0 0',
+            'cpu3 0 0 0 0 200 0 0 0 0 0',
+        ])
+        res = sampler.sample()
+        self.assertEqual(set([0, 3]), res.processor_set)
+        self.assertEqual(
+            (0.0, 0.0, 0.0), (res.ticks[2], res.system[2], res.steal[2]))
+        self.assertEqual(50.0, res.user[0])
+
+
+class TestFrequencySampler(base.TestCase):
+
+    def setUp(self):
+        super(TestFrequencySampler, self).setUp()
+        self.root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.root)
+        self.cpu_dir = os.path.join(self.root, 'cpu')
+        patcher = mock.patch.object(
+            cpu, '_LINUX_SYS_DEVICES_SYSTEM_CPU_DIR', self.cpu_dir)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        patcher = mock.patch('platform.system', return_value='Linux')
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def _write(self, path, contents):
+        fixtures.write_file(os.path.join(self.cpu_dir, path), contents)
+
+    def test_sample(self):
+        # Two policies, each shared by a pair of sibling threads
+        for policy, cpus, cur, governor in (
+                (0, '0 2', 3000000, 'performance'),
+                (1, '1 3', 1200000, 'powersave')):
+            path = 'cpufreq/policy%d/' % policy
+            self._write(path + 'related_cpus', cpus + '\n')
+            self._write(path + 'scaling_cur_freq', '%d\n' % cur)
+            self._write(path + 'scaling_min_freq', '800000\n')
+            self._write(path + 'scaling_max_freq', '3500000\n')
+            self._write(path + 'cpuinfo_min_freq', '400000\n')
+            self._write(path + 'cpuinfo_max_freq', '4000000\n')
+            self._write(path + 'scaling_governor', governor + '\n')
+        for lp_id in range(4):
+            for state, name in enumerate(('POLL', 'C6')):
+                path = 'cpu%d/cpuidle/state%d/' % (lp_id, state)
+                self._write(path + 'name', name + '\n')
+                self._write(path + 'time', '%d\n' % (lp_id * 1000))
+
+        sampler = cpu.FrequencySampler()
+        res = sampler.sample()
+        self.assertEqual(set([0, 1, 2, 3]), res.processor_set)
+        self.assertEqual(3000000, res.cur_khz[2])
+        self.assertEqual(1200000, res.cur_khz[3])
+        self.assertEqual(4000000, res.hw_max_khz[1])
+        self.assertEqual('powersave', res.governor[1])
+        self.assertIsNone(res.energy_performance_preference[1])
+        self.assertEqual(['POLL', 'C6'], res.idle_states)
+        self.assertEqual(3000, res.idle_time_us['C6'][3])
+
+        core = topology.Core(0)
+        core.processor_set = utils.ProcessorSet([0, 1])
+        agg = res.aggregate(core)
+        self.assertEqual(2100000, agg['cur_khz'])
+        self.assertEqual(800000, agg['min_khz'])
+        self.assertEqual(set(['performance', 'powersave']), agg['governors'])
+
+        # Only the current frequency and idle time are re-read
+        self._write('cpufreq/policy0/scaling_cur_freq', '2000000\n')
+        self._write('cpufreq/policy0/scaling_governor', 'schedutil\n')
+        with mock.patch('time.time', side_effect=[100.0, 102.0]):
+            sampler.sample()
+            # One second of the two in C6
+            self._write('cpu0/cpuidle/state1/time', '1000000\n')
+            res = sampler.sample()
+        self.assertEqual(2000000, res.cur_khz[0])
+        self.assertEqual('performance', res.governor[0])
+        self.assertEqual(50.0, res.idle_residency['C6'][0])
+        self.assertEqual(0.0, res.idle_residency['C6'][1])
+
+        sampler.refresh()
+        res = sampler.sample()
+        self.assertEqual('schedutil', res.governor[2])
+
+        # Past what a 32-bit C long holds, after about 36 minutes in a state
+        self._write('cpu3/cpuidle/state1/time', '%d\n' % 2 ** 33)
+        self.assertEqual(2 ** 33, sampler.sample().idle_time_us['C6'][3])
@@ -0,0 +1,93 @@
+# Licensed under the Apache License, Version 2.0 (the "License"); you may
+# not use this file except in compliance with the License. You may obtain
+# a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+# WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+# License for the specific language governing permissions and limitations
+# under the License.
+
+import os
+import shutil
+import tempfile
+
+import mock
+
+from hwk import diff
+from hwk import fs
+from hwk import gpu
+from hwk import net
+
+from hwk.tests import fixtures
+from hwk.tests.unit import base
+
+
+class TestDiff(base.TestCase):
+
+    def setUp(self):
+        super(TestDiff, self).setUp()
+        self.root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.root)
+        self.host = fixtures.build_host(
+            self.root, nics=3, disks=2, partitions=2)
+
+    def _touch(self, *path):
+        # Directory modification times may not change between two quick
+        # writes on filesystems with coarse timestamps
+        path = os.path.join(self.root, *path)
+        mtime = os.path.getmtime(path) + 10
+        os.utime(path, (mtime, mtime))
+
+    def test_collector(self):
+        with fs.use(self.host):
+            collector = diff.Collector()
+            first = collector.collect()
+            self.assertEqual(set(collector.modules), set(first))
+            for name, changes in first.items():
+                self.assertEqual(
+                    [{'op': 'add', 'path': [],
+                      'value': collector.state[name]}], changes)
+            before = collector.state
+
+            # Nothing changed, and nothing but CPU and memory is re-probed
+            with mock.patch.object(net, 'info') as net_info, \
+                    mock.patch.object(gpu, 'info') as gpu_info:
+                self.assertEqual({}, collector.collect())
+            self.assertFalse(net_info.called)
+            self.assertFalse(gpu_info.called)
+
+            # Unmount sda1, and remove ens1
+            path = os.path.join(self.root, 'proc', 'self', 'mountinfo')
+            with open(path) as f:
+                mounts = [m for m in f if '/srv/sda1' not in m]
+            with open(path, 'w') as f:
+                f.writelines(mounts)
+            os.unlink(os.path.join(self.root, 'sys', 'class', 'net', 'ens1'))
+            self._touch('sys', 'class', 'net')
+            changes = collector.collect()
+
+        self.assertEqual(['block', 'net'], sorted(changes))
+        serial = before['block']['info']['disks'][0]['serial_no']
+        self.assertEqual([{
+            'op': 'modify',
+            'path': ['disks', serial, 'partitions', 'sda1', 'mount_point'],
+            'old': '/srv/sda1',
+            'new': None,
+        }, {
+            'op': 'modify',
+            'path': ['disks', serial, 'partitions', 'sda1', 'type'],
+            'old': 'ext4',
+            'new': None,
+        }], changes['block'])
+        self.assertEqual(
+            [{'op': 'remove', 'path': ['nics', '02:00:00:00:00:01']}],
+            changes['net'])
+        for name in ('block', 'net'):
+            self.assertEqual(
+                collector.state[name],
+                diff.apply(before[name], changes[name]))
+        self.assertRaises(
+            ValueError, diff.diff, before['net'], before['block'])
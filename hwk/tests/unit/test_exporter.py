@@ -0,0 +1,102 @@
+# Licensed under the Apache License, Version 2.0 (the "License"); you may
+# not use this file except in compliance with the License. You may obtain
+# a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+# WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+# License for the specific language governing permissions and limitations
+# under the License.
+
+import os
+import shutil
+import socket
+import tempfile
+import threading
+
+from hwk import exporter
+from hwk import fs
+
+from hwk.tests import fixtures
+from hwk.tests.unit import base
+
+
+class TestExporter(base.TestCase):
+
+    def setUp(self):
+        super(TestExporter, self).setUp()
+        self.root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.root)
+        self.host = fixtures.build_host(self.root, nics=2, disks=1)
+        proc = os.path.join(self.root, 'proc')
+        fixtures.write_file(
+            os.path.join(proc, 'stat'),
+            'cpu  30 0 10 160 0 0 0 0\n'
+            'cpu0 10 0 5 85 0 0 0 0\n'
+            'cpu1 20 0 5 75 0 0 0 0\n'
+            'intr 0\n')
+        fixtures.write_file(
+            os.path.join(proc, 'diskstats'),
+            '   8       0 sda 100 0 1000 40 50 0 800 20 0 60 60\n'
+            '   8       1 sda1 90 0 900 30 40 0 700 10 0 40 40\n')
+        fixtures.write_file(
+            os.path.join(proc, 'net', 'dev'),
+            'Inter-|   Receive |  Transmit\n'
+            ' face |bytes    packets errs drop fifo frame compressed '
+            'multicast|bytes    packets errs drop fifo colls carrier '
+            'compressed\n'
+            '    lo:     500       5    0    0    0     0          0 '
+            '        0      500       5    0    0    0     0       0 '
+            '         0\n'
+            '  ens0:    1000      10    1    2    0     0          0 '
+            '        0     2000      20    3    4    0     0       0 '
+            '         0\n')
+
+    def test_exporter(self):
+        with fs.use(self.host):
+            exp = exporter.Exporter()
+            exp.refresh_inventory()
+            for sampler in exp._samplers:
+                exp.sample(sampler)
+        lines = exp.buffer.decode('utf-8').splitlines()
+        for line in (
+                'hwk_disk_size_bytes{disk="sda"} 1099511627776',
+                'hwk_partition_size_bytes{disk="sda",partition="sda1",'
+                'type="ext4",mount_point="/srv/sda1"} 549755813888',
+                'hwk_disk_read_bytes_total{disk="sda"} 512000',
+                'hwk_disk_io_time_seconds_total{disk="sda"} 0.06',
+                'hwk_nic_receive_bytes_total{nic="ens0"} 1000',
+                'hwk_nic_transmit_drop_total{nic="ens0"} 4',
+                'hwk_cpu_utilization_ratio{cpu="1",mode="user"} 0.2',
+                'hwk_numa_node_processors{node="0"} 4',
+                '# TYPE hwk_disk_io_now gauge'):
+            self.assertIn(line, lines)
+        # Only the inventory's disks and NICs are sampled
+        self.assertFalse(
+            [m for m in lines if '{disk="sda1"}' in m or '{nic="lo"}' in m])
+        # Each metric family is rendered once
+        types = [m for m in lines if m.startswith('# TYPE')]
+        self.assertEqual(len(set(types)), len(types))
+
+        path = os.path.join(self.root, 'metrics.sock')
+        server = exporter.make_server(exp, unix_socket=path)
+        self.addCleanup(server.server_close)
+        thread = threading.Thread(target=server.serve_forever)
+        thread.start()
+        self.addCleanup(thread.join)
+        self.addCleanup(server.shutdown)
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        sock.connect(path)
+        sock.sendall(b'GET /metrics HTTP/1.0\r\n\r\n')
+        res = b''
+        while True:
+            data = sock.recv(65536)
+            if not data:
+                break
+            res += data
+        sock.close()
+        headers, _, body = res.partition(b'\r\n\r\n')
+        self.assertIn(b' 200 ', headers.splitlines()[0])
+        self.assertEqual(exp.buffer, body)
@@ -0,0 +1,95 @@
+# -*- coding: utf-8 -*-
+
+# Licensed under the Apache License, Version 2.0 (the "License"); you may
+# not use this file except in compliance with the License. You may obtain
+# a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+# WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+# License for the specific language governing permissions and limitations
+# under the License.
+
+import os
+import shutil
+import subprocess
+import tempfile
+import threading
+
+from hwk import fs
+from hwk import memory
+from hwk import topology
+
+from hwk.tests import fixtures
+from hwk.tests.unit import base
+
+
+class TestFilesystem(base.TestCase):
+
+    def setUp(self):
+        super(TestFilesystem, self).setUp()
+        self.root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.root)
+
+    def test_rooted_paths(self):
+        fixtures.write_file(
+            os.path.join(self.root, 'proc', 'meminfo'), 'MemTotal: 1 kB\n')
+        os.symlink('proc', os.path.join(self.root, 'link'))
+        rooted = fs.Filesystem(self.root)
+
+        self.assertFalse(rooted.is_local)
+        self.assertEqual('Linux', rooted.system())
+        self.assertEqual(['meminfo'], rooted.listdir('/proc'))
+        self.assertTrue(rooted.isdir('/link'))
+        self.assertEqual('/proc', rooted.realpath('/link'))
+        with rooted.open('/proc/meminfo') as f:
+            self.assertEqual('MemTotal: 1 kB\n', f.read())
+        self.assertRaises(
+            subprocess.CalledProcessError, rooted.check_output, ['true'])
+
+    def test_use(self):
+        self.assertTrue(fs.current().is_local)
+        with fs.use(self.root) as rooted:
+            self.assertIs(rooted, fs.current())
+            self.assertEqual(self.root, fs.current().root)
+        self.assertTrue(fs.current().is_local)
+
+    def test_parallel_roots(self):
+        # Each thread sees its own host, and memoized results are not shared
+        # between hosts
+        roots = []
+        for nodes in (1, 2, 4):
+            root = os.path.join(self.root, 'host%d' % nodes)
+            fixtures.build_topology(root, nodes=nodes)
+            fixtures.write_file(
+                os.path.join(root, 'proc', 'meminfo'),
+                'MemTotal: %d kB\n' % (nodes * 1024),
+            )
+            fixtures.write_file(
+                os.path.join(root, 'sys', 'kernel', 'mm', 'hugepages',
+                             'hugepages-2048kB', 'nr_hugepages'),
+                '0\n',
+            )
+            roots.append(root)
+        results = {}
+
+        def discover(root):
+            with fs.use(root):
+                for _ in range(5):
+                    results[root] = (
+                        len(topology.info().nodes),
+                        memory.info().total_usable_bytes,
+                    )
+
+        threads = [
+            threading.Thread(target=discover, args=(root,)) for root in roots
+        ]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+
+        for nodes, root in zip((1, 2, 4), roots):
+            self.assertEqual((nodes, nodes * 1024 * 1024), results[root])
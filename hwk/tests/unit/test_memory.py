@@ -13,6 +13,7 @@
 # under the License.
 
 import mock
+import six
 
 from hwk import memory
 
@@ -35,3 +36,17 @@ class TestMemory(base.TestCase):
         self.assertEqual(expected, page_sizes)
 
         listdir_mock.assert_called_once_with('/sys/kernel/mm/hugepages')
+
+    @mock.patch.object(memory, '_warned_physical_bytes', False)
+    @mock.patch.object(memory, '_linux_total_physical_bytes',
+                       return_value=None)
+    @mock.patch.object(memory, '_linux_meminfo',
+                       return_value={six.b('MemTotal'): 1024})
+    def test_physical_bytes_warning(self, meminfo_mock, physical_mock):
+        stderr = six.StringIO()
+        with mock.patch('sys.stderr', stderr):
+            for x in range(2):
+                res = memory._linux_info(set(['total_physical_bytes']))
+                self.assertEqual(1024, res.total_physical_bytes)
+        # Written once however often memory information is determined
+        self.assertEqual(1, stderr.getvalue().count('WARNING'))
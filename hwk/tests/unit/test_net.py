@@ -0,0 +1,147 @@
+# -*- coding: utf-8 -*-
+
+# Licensed under the Apache License, Version 2.0 (the "License"); you may
+# not use this file except in compliance with the License. You may obtain
+# a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+# WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+# License for the specific language governing permissions and limitations
+# under the License.
+
+import os
+import shutil
+import tempfile
+
+import mock
+
+from hwk import fs
+from hwk import net
+
+from hwk.tests import fixtures
+from hwk.tests.unit import base
+
+
+class TestNet(base.TestCase):
+
+    def setUp(self):
+        super(TestNet, self).setUp()
+        self.root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.root)
+        self.host = fixtures.build_host(self.root, nics=3)
+
+    def test_prefetch(self):
+        with fs.use(self.host):
+            nics = sorted(net.info().nics, key=lambda n: n.name)
+        self.assertEqual(['ens0', 'ens1', 'ens2'], [n.name for n in nics])
+        self.assertEqual('02:00:00:00:00:01', nics[1].mac)
+
+        with mock.patch.object(
+                self.host, 'check_output',
+                wraps=self.host.check_output) as check_output:
+            net.prefetch(nics, fields=['vendor', 'driver'])
+            # A single udevadm call for all NICs, and no ethtool calls
+            self.assertEqual(1, check_output.call_count)
+            self.assertEqual(
+                ['udevadm', 'info', '--export-db'],
+                check_output.call_args[0][0],
+            )
+            self.assertEqual(
+                ['i40e'] * 3, [n.driver for n in nics])
+            self.assertEqual('0x8086', nics[0].vendor_id)
+            self.assertEqual(1, check_output.call_count)
+            self.assertIn('tcp-segmentation-offload', nics[2].enabled_features)
+            self.assertEqual(2, check_output.call_count)
+
+    def test_include(self):
+        with mock.patch.object(
+                self.host, 'check_output',
+                wraps=self.host.check_output) as check_output:
+            with fs.use(self.host):
+                nics = net.info(include=['mac', 'driver']).nics
+            # The udev database is read up front and ethtool is never run
+            self.assertEqual(1, check_output.call_count)
+            self.assertEqual(['i40e'] * 3, [n.driver for n in nics])
+            self.assertEqual(1, check_output.call_count)
+        self.assertTrue(all(n.mac for n in nics))
+
+        with fs.use(self.host):
+            nics = net.info(include=[]).nics
+        self.assertEqual([None] * 3, [n.mac for n in nics])
+        self.assertRaises(ValueError, net.info, include=['ip_address'])
+
+    def test_graph(self):
+        root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, root)
+        fixtures.build_sriov(root)
+        with fs.use(fs.Filesystem(root)):
+            graph = net.graph()
+
+        self.assertEqual(['enp130s0f0', 'enp1s0f0'], sorted(graph.pfs))
+        pf = graph.pfs['enp130s0f0']
+        self.assertEqual(
+            ('0000:82:00.0', 1, 8, 3),
+            (pf.address, pf.numa_node, pf.total_vfs, pf.num_vfs))
+        self.assertEqual(
+            [(0, '0000:82:02.0', 'vfio-pci', None, True),
+             (1, '0000:82:02.1', 'iavf', 'enp130s0f0v1', False),
+             (2, '0000:82:02.2', None, None, False)],
+            [(v.index, v.address, v.driver, v.name, v.in_use)
+             for v in pf.vfs])
+        self.assertEqual(
+            ['0000:82:02.1', '0000:82:02.2'],
+            [v.address for v in graph.free_vfs(numa_node=1)])
+        # The first VF of enp1s0f0 is a port of br0
+        self.assertEqual(
+            ['enp1s0f0v1'], [v.name for v in graph.free_vfs(numa_node=0)])
+        self.assertEqual([], graph.free_vfs(numa_node=2))
+        self.assertEqual(3, len(graph.free_vfs()))
+
+        bond = graph.bonds['bond0']
+        self.assertEqual(
+            ('802.3ad', ('enp1s0f0', 'enp130s0f0')), (bond.mode, bond.slaves))
+        self.assertEqual(
+            ('bond0', 'enp1s0f0v0'), graph.bridges['br0'].ports)
+        self.assertEqual('bond0', graph.masters['enp130s0f0'])
+        self.assertEqual('br0', graph.masters['bond0'])
+        copy = net.Graph.from_dict(graph.to_dict())
+        self.assertEqual(graph.to_dict(), copy.to_dict())
+        self.assertEqual(2, len(copy.free_vfs(numa_node=1)))
+
+    def test_refresh(self):
+        with fs.use(self.host):
+            nics = sorted(net.info().nics, key=lambda n: n.name)
+        counting = fixtures.CountingFilesystem(self.root)
+        for nic in nics:
+            nic._filesystem = counting
+        # Accessing any link attribute reads them all, once
+        self.assertEqual(10000, nics[0].speed)
+        self.assertEqual(7, len(counting.opened))
+        self.assertEqual(
+            ('full', True, 'up', 1500, 1000, 0),
+            (nics[0].duplex, nics[0].carrier, nics[0].operstate, nics[0].mtu,
+             nics[0].tx_queue_len, nics[0].numa_node))
+        self.assertEqual(7, len(counting.opened))
+
+        # The link of ens1 goes down
+        path = os.path.join(self.root, 'sys', 'class', 'net', 'ens1')
+        os.unlink(os.path.join(path, 'speed'))
+        for filename, contents in (('carrier', '0'), ('operstate', 'down'),
+                                   ('duplex', 'unknown')):
+            fixtures.write_file(os.path.join(path, filename), contents)
+        del counting.opened[:]
+        with mock.patch.object(
+                self.host, 'check_output') as check_output:
+            self.assertIs(nics, net.refresh(nics))
+        self.assertFalse(check_output.called)
+        self.assertEqual(3 * 7, len(counting.opened))
+        self.assertEqual(
+            (None, None, False, 'down'),
+            (nics[1].speed, nics[1].duplex, nics[1].carrier,
+             nics[1].operstate))
+        self.assertTrue(nics[2].carrier)
+        copy = net.NIC.from_dict(nics[1].to_dict())
+        self.assertEqual(nics[1].to_dict(), copy.to_dict())
@@ -0,0 +1,129 @@
+# -*- coding: utf-8 -*-
+
+# Licensed under the Apache License, Version 2.0 (the "License"); you may
+# not use this file except in compliance with the License. You may obtain
+# a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+# WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+# License for the specific language governing permissions and limitations
+# under the License.
+
+import os
+import shutil
+import tempfile
+
+from hwk import fs
+from hwk import pci
+
+from hwk.tests import fixtures
+from hwk.tests.unit import base
+
+
+class TestPCI(base.TestCase):
+
+    def setUp(self):
+        super(TestPCI, self).setUp()
+        self.root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.root)
+        self.host = fixtures.build_host(self.root, nodes=2, nics=2)
+        # An NVMe drive supporting 4 lanes running with 2, behind a bridge, on
+        # a NUMA node the kernel does not know
+        bridge = '0000:80:03.0'
+        nvme = '0000:82:00.0'
+        devices_dir = os.path.join(self.root, 'sys', 'devices', 'pci0000:80')
+        for address, path, files in (
+                (bridge, bridge, (
+                    ('class', '0x060400'), ('current_link_width', '8'),
+                    ('max_link_width', '16'))),
+                (nvme, os.path.join(bridge, nvme), (
+                    ('class', '0x010802'), ('vendor', '0x144d'),
+                    ('device', '0xa808'), ('numa_node', '-1'),
+                    ('local_cpulist', '2-3,6-7'),
+                    ('current_link_speed', '8.0 GT/s PCIe'),
+                    ('current_link_width', '2'),
+                    ('max_link_speed', '8.0 GT/s PCIe'),
+                    ('max_link_width', '4')))):
+            for filename, contents in files:
+                fixtures.write_file(os.path.join(
+                    devices_dir, path, filename), contents + '\n')
+            os.symlink(
+                '../../../devices/pci0000:80/' + path,
+                os.path.join(self.root, 'sys', 'bus', 'pci', 'devices',
+                             address))
+        os.symlink('../../../../bus/pci/drivers/nvme',
+                   os.path.join(devices_dir, bridge, nvme, 'driver'))
+
+    def test_info(self):
+        with fs.use(self.host):
+            info = pci.info()
+        self.assertEqual(
+            ['0000:03:00.0', '0000:10:00.0', '0000:10:01.0', '0000:80:03.0',
+             '0000:82:00.0'],
+            [d.address for d in info.devices])
+        nvme = info.find('0000:82:00.0')
+        self.assertEqual(
+            ('storage', '0x144d', '0xa808', 'nvme'),
+            (nvme.class_name, nvme.vendor_id, nvme.device_id, nvme.driver))
+        self.assertEqual(
+            (8.0, 2, 8.0, 4),
+            (nvme.current_link_speed, nvme.current_link_width,
+             nvme.max_link_speed, nvme.max_link_width))
+        self.assertEqual(('0000:80:03.0',), nvme.bridges)
+        self.assertEqual('0000:80:03.0', info.parent(nvme.address).address)
+        self.assertIsNone(info.parent('0000:80:03.0'))
+        self.assertIsNone(info.parent('0000:ff:00.0'))
+        # The bridge is narrower than it could be too, which is up to what is
+        # behind it
+        self.assertEqual([nvme], info.degraded())
+
+        # The node is found from the drive's local processors
+        self.assertEqual(1, nvme.numa_node)
+        self.assertEqual('2-3,6-7', nvme.local_processor_set.to_cpulist())
+        self.assertEqual(
+            ['0000:10:00.0', '0000:10:01.0'],
+            [d.address for d in info.on_node(0)])
+        self.assertEqual([nvme], info.on_node(1))
+
+        copy = pci.Info.from_dict(info.to_dict())
+        self.assertEqual(info.to_dict(), copy.to_dict())
+        self.assertEqual(['0000:82:00.0'],
+                         [d.address for d in copy.degraded()])
+
+    def test_vmd(self):
+        # An NVMe drive behind a root port of the 10000 domain that an Intel
+        # VMD controller exposes
+        vmd = '0000:5d:05.5'
+        port = '10000:00:02.0'
+        nvme = '10000:01:00.0'
+        for address, path in (
+                (vmd, vmd),
+                (port, os.path.join(vmd, 'pci10000:00', port)),
+                (nvme, os.path.join(vmd, 'pci10000:00', port, nvme))):
+            fixtures.write_file(os.path.join(
+                self.root, 'sys', 'devices', 'pci0000:5d', path, 'class'),
+                '0x010802\n')
+            os.symlink(
+                '../../../devices/pci0000:5d/' + path,
+                os.path.join(self.root, 'sys', 'bus', 'pci', 'devices',
+                             address))
+        with fs.use(self.host):
+            info = pci.info(include=['bridges'])
+        self.assertEqual((vmd, port), info.find(nvme).bridges)
+        self.assertEqual(port, info.parent(nvme).address)
+
+    def test_include(self):
+        counting = fixtures.CountingFilesystem(self.root)
+        with fs.use(counting):
+            info = pci.info(include=['class_id', 'link'])
+        self.assertEqual(['0000:82:00.0'],
+                         [d.address for d in info.degraded()])
+        self.assertIsNone(info.find('0000:82:00.0').driver)
+        self.assertEqual(
+            set(['class', 'current_link_speed', 'current_link_width',
+                 'max_link_speed', 'max_link_width']),
+            set(os.path.basename(p) for p in counting.opened))
+        self.assertRaises(ValueError, pci.info, include=['irq'])
@@ -0,0 +1,90 @@
+# Licensed under the Apache License, Version 2.0 (the "License"); you may
+# not use this file except in compliance with the License. You may obtain
+# a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+# WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+# License for the specific language governing permissions and limitations
+# under the License.
+
+import importlib
+import json
+import shutil
+import tempfile
+
+import mock
+
+from hwk import fs
+from hwk import serialize
+
+from hwk.tests import fixtures
+from hwk.tests.unit import base
+
+
+class TestSerialize(base.TestCase):
+
+    def setUp(self):
+        super(TestSerialize, self).setUp()
+        self.root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.root)
+        self.host = fixtures.build_host(
+            self.root, nodes=2, nics=2, disks=1, partitions=2)
+
+    def test_round_trip(self):
+        for name in ('cpu', 'memory', 'block', 'net', 'gpu', 'pci',
+                     'topology'):
+            module = importlib.import_module('hwk.' + name)
+            with fs.use(self.host):
+                info = module.info()
+                expected = info.to_dict()
+                as_json = serialize.dumps_json(info)
+                as_msgpack = serialize.dumps(info)
+            # Serialized objects are complete, and deserialized ones never
+            # touch the host they are loaded on
+            counting = fixtures.CountingFilesystem(self.root)
+            with fs.use(counting), mock.patch.object(
+                    counting, 'check_output', side_effect=AssertionError):
+                from_json = serialize.loads_json(as_json)
+                from_msgpack = serialize.loads(as_msgpack)
+                self.assertIsInstance(from_json, module.Info)
+                # JSON object keys are strings, so compare the JSON forms
+                expected = json.loads(json.dumps(expected, sort_keys=True))
+                for res in (from_json, from_msgpack):
+                    actual = json.loads(
+                        json.dumps(res.to_dict(), sort_keys=True))
+                    self.assertEqual(expected, actual, name)
+            self.assertEqual([], counting.opened)
+
+        with fs.use(self.host):
+            info = importlib.import_module('hwk.topology').info()
+        res = serialize.loads(serialize.dumps(info))
+        core = res.nodes[0].cores[0]
+        self.assertEqual(
+            [repr(c) for c in info.nodes[0].cores[0].caches],
+            [repr(c) for c in core.caches],
+        )
+        self.assertIs(core.caches[-1], res.nodes[0].caches[-1])
+
+    def test_msgpack(self):
+        # Encodings from the MessagePack specification
+        out = bytearray()
+        for value in (None, True, 5, -3, 200, -200, 70000, 1 << 40, 'a',
+                      [1], {'k': 1.5}):
+            serialize._pack(out, value)
+        self.assertEqual(
+            b'\xc0\xc3\x05\xfd\xcc\xc8\xd1\xff\x38\xce\x00\x01\x11\x70'
+            b'\xcf\x00\x00\x01\x00\x00\x00\x00\x00\xa1a\x91\x01\x81\xa1k'
+            b'\xcb\x3f\xf8\x00\x00\x00\x00\x00\x00',
+            bytes(out),
+        )
+        value, pos = serialize._unpack(out, 0)
+        self.assertIsNone(value)
+
+        with fs.use(self.host):
+            data = serialize.dumps(
+                importlib.import_module('hwk.memory').info())
+        newer = data.replace(b'\xa6schema\x01', b'\xa6schema\x02')
+        self.assertRaises(ValueError, serialize.loads, newer)
@@ -0,0 +1,98 @@
+# -*- coding: utf-8 -*-
+
+# Licensed under the Apache License, Version 2.0 (the "License"); you may
+# not use this file except in compliance with the License. You may obtain
+# a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+# WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+# License for the specific language governing permissions and limitations
+# under the License.
+
+import os
+import shutil
+import subprocess
+import tempfile
+
+import mock
+import six
+
+from hwk import fs
+from hwk import snapshot
+from hwk import topology
+
+from hwk.tests import fixtures
+from hwk.tests.unit import base
+
+
+class TestSnapshot(base.TestCase):
+
+    def setUp(self):
+        super(TestSnapshot, self).setUp()
+        self.root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.root)
+        self.host = os.path.join(self.root, 'host')
+        fixtures.build_topology(self.host, nodes=2)
+
+    def test_capture_replay(self):
+        with fs.use(self.host):
+            expected = topology.info()
+
+        snap = snapshot.capture(['topology'], fs.Filesystem(self.host))
+        path = os.path.join(self.root, 'host.json.gz')
+        snapshot.save(snap, path)
+        shutil.rmtree(self.host)
+
+        counting = fixtures.CountingFilesystem(self.host)
+        with fs.use(counting):
+            with snapshot.replay(path):
+                got = topology.info()
+        self.assertEqual([], counting.opened)
+        self.assertEqual(expected.distances, got.distances)
+        self.assertEqual(
+            [(n.id, n.processor_set, len(n.cores), len(n.caches))
+             for n in expected.nodes],
+            [(n.id, n.processor_set, len(n.cores), len(n.caches))
+             for n in got.nodes],
+        )
+
+    def test_archive(self):
+        data = six.b('\x00\xff\n')
+        with open(os.path.join(self.host, 'bin'), 'wb') as f:
+            f.write(data)
+        inner = fs.Filesystem(self.host)
+        recorder = snapshot.Recorder(inner)
+        with mock.patch.object(inner, 'check_output') as check_output:
+            check_output.side_effect = [
+                six.b('out\n'),
+                subprocess.CalledProcessError(1, ['false']),
+            ]
+            recorder.check_output(['true'])
+            self.assertRaises(
+                subprocess.CalledProcessError,
+                recorder.check_output, ['false'],
+            )
+        recorder.open('/bin', 'rb').read()
+        self.assertRaises(IOError, recorder.open, '/missing')
+        recorder.isdir('/sys')
+        recorder.listdir('/sys/devices/system/node')
+
+        archive = snapshot.Archive(recorder.snapshot())
+        self.assertEqual(data, archive.open('/bin', 'rb').read())
+        self.assertRaises(IOError, archive.open, '/missing')
+        self.assertRaises(IOError, archive.open, '/bin', 'w')
+        self.assertTrue(archive.isdir('/sys'))
+        self.assertTrue(archive.exists('/sys/devices/system/node'))
+        self.assertFalse(archive.exists('/missing'))
+        self.assertEqual(six.b('out\n'), archive.check_output(['true']))
+        self.assertRaises(
+            subprocess.CalledProcessError, archive.check_output, ['false'])
+        self.assertRaises(
+            subprocess.CalledProcessError, archive.check_output, ['other'])
+        self.assertRaises(
+            ValueError, snapshot.Archive,
+            dict(recorder.snapshot(), version=snapshot.VERSION + 1),
+        )
@@ -0,0 +1,161 @@
+# -*- coding: utf-8 -*-
+
+# Licensed under the Apache License, Version 2.0 (the "License"); you may
+# not use this file except in compliance with the License. You may obtain
+# a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+# WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+# License for the specific language governing permissions and limitations
+# under the License.
+
+import os
+import shutil
+import tempfile
+
+import mock
+
+from hwk import fs
+from hwk import topology
+from hwk import utils
+
+from hwk.tests import fixtures
+from hwk.tests.unit import base
+
+
+class TestTopology(base.TestCase):
+
+    def setUp(self):
+        super(TestTopology, self).setUp()
+        self.root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.root)
+        topology._linux_info.cache_clear()
+        self.addCleanup(topology._linux_info.cache_clear)
+        self.use_filesystem(fs.Filesystem(self.root))
+
+    def use_filesystem(self, filesystem):
+        ctx = fs.use(filesystem)
+        ctx.__enter__()
+        self.addCleanup(ctx.__exit__, None, None, None)
+
+    def test_info(self):
+        # Two nodes, each with two cores of two hardware threads. Logical
+        # processors N and N+4 are siblings.
+        fixtures.build_topology(self.root, nodes=2)
+        info = topology.info()
+
+        self.assertEqual('NUMA', info.architecture)
+        self.assertEqual([0, 1], [n.id for n in info.nodes])
+        self.assertEqual([[10, 21], [21, 10]], info.distances)
+        self.assertEqual(21, info.distance(1, 0))
+        self.assertEqual([21, 10], topology.node_distances(1))
+
+        node = info.nodes[1]
+        self.assertEqual(set([2, 3, 6, 7]), node.processor_set)
+        self.assertEqual([0, 1], [c.id for c in node.cores])
+        self.assertEqual(set([2, 6]), node.cores[0].processor_set)
+        self.assertEqual(2, node.cores[0].threads)
+        # L1d, L1i and L2 for each of the two cores, plus one L3
+        self.assertEqual(7, len(node.caches))
+
+        core_caches = node.cores[0].caches
+        self.assertEqual(4, len(core_caches))
+        l3 = core_caches[-1]
+        self.assertEqual(3, l3.level)
+        self.assertEqual(1, l3.id)
+        self.assertEqual(32 * 1024 * 1024, l3.size_bytes)
+        self.assertEqual(node.processor_set, l3.processor_set)
+        self.assertIs(l3, node.cores[1].caches[-1])
+
+    def test_info_reads_each_cache_once(self):
+        fixtures.build_topology(
+            self.root, nodes=2, cores_per_node=8, threads_per_core=2)
+        counting_fs = fixtures.CountingFilesystem(self.root)
+        with fs.use(counting_fs):
+            info = topology.info()
+        opened = counting_fs.opened
+
+        self.assertEqual(16, sum(len(n.cores) for n in info.nodes))
+        # 16 cores x 3 private caches + 2 L3 caches, 5 files each
+        cache_opens = [p for p in opened if '/cache/' in p]
+        self.assertEqual((16 * 3 + 2) * 5, len(cache_opens))
+        self.assertEqual(len(opened), len(set(opened)))
+
+    def _place(self, workers, policy, **kwargs):
+        return [
+            list(ps)[0] for ps in topology.place(workers, policy, **kwargs)
+        ]
+
+    def test_place(self):
+        # Two nodes of four cores, logical processors N and N+8 are siblings
+        fixtures.build_topology(self.root, nodes=2, cores_per_node=4)
+
+        self.assertEqual(
+            [0, 4, 1, 5, 2, 6, 3, 7, 8, 12],
+            self._place(10, topology.PLACE_SPREAD),
+        )
+        self.assertEqual(
+            [0, 8, 1, 9, 2, 10],
+            self._place(6, topology.PLACE_PACK),
+        )
+        self.assertEqual(
+            [0, 1, 2, 3, 8, 9],
+            self._place(6, topology.PLACE_CACHE),
+        )
+        # The siblings sharing the first node's cache are used before any
+        # processor of the second node
+        self.assertEqual(
+            [0, 1, 2, 3, 8, 9, 10, 11, 4, 5],
+            self._place(10, topology.PLACE_CACHE),
+        )
+        # Without SMT, workers wrap around onto the first thread of each core
+        self.assertEqual(
+            [0, 4, 1, 5, 2, 6, 3, 7, 0],
+            self._place(9, topology.PLACE_SPREAD, smt=False),
+        )
+
+        allowed = utils.ProcessorSet([1, 2, 9])
+        self.assertEqual(
+            [1, 9, 2],
+            self._place(3, topology.PLACE_PACK, processor_set=allowed),
+        )
+        self.assertRaises(ValueError, topology.place, 1, 'bogus')
+
+    def test_allowed_processor_set(self):
+        fixtures.build_topology(self.root)
+        isolated_path = fs.current().path(os.path.join(
+            topology._LINUX_SYS_DEVICES_SYSTEM_CPU_DIR, 'isolated'))
+        fixtures.write_file(isolated_path, '2-3\n')
+        self.assertEqual(set([0, 1]), topology.allowed_processor_set())
+
+        self.use_filesystem(fs.Filesystem('/'))
+        with mock.patch.object(
+                topology, '_LINUX_SYS_DEVICES_SYSTEM_CPU_DIR',
+                os.path.join(self.root, 'sys', 'devices', 'system', 'cpu')):
+            with mock.patch('os.sched_getaffinity', create=True) as aff:
+                aff.return_value = set([0, 1, 2, 3])
+                self.assertEqual(
+                    set([0, 1]), topology.allowed_processor_set())
+
+                # A process started on isolated processors keeps them
+                aff.return_value = set([3])
+                self.assertEqual(set([3]), topology.allowed_processor_set())
+
+    @mock.patch('os.sched_setaffinity', create=True)
+    def test_apply_placement(self, setaffinity_mock):
+        placement = [utils.ProcessorSet([0]), utils.ProcessorSet([2, 3])]
+        topology.apply_placement(placement, [100, 0])
+        setaffinity_mock.assert_has_calls([
+            mock.call(100, [0]),
+            mock.call(0, [2, 3]),
+        ])
+        self.assertRaises(
+            ValueError, topology.apply_placement, placement, [1, 2, 3])
+
+        setaffinity_mock.reset_mock()
+        with mock.patch('hwk.fs.system', return_value='Darwin'):
+            self.assertIsNone(topology.apply_placement(placement, [100]))
+        self.assertFalse(setaffinity_mock.called)
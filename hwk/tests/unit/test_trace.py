@@ -0,0 +1,97 @@
+# -*- coding: utf-8 -*-
+
+# Licensed under the Apache License, Version 2.0 (the "License"); you may
+# not use this file except in compliance with the License. You may obtain
+# a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+# WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+# License for the specific language governing permissions and limitations
+# under the License.
+
+import json
+import shutil
+import tempfile
+
+from hwk import block
+from hwk import fs
+from hwk import net
+from hwk import trace
+from hwk import udev
+
+from hwk.tests import fixtures
+from hwk.tests.unit import base
+
+
+class TestTrace(base.TestCase):
+
+    def setUp(self):
+        super(TestTrace, self).setUp()
+        self.root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.root)
+        host = fixtures.build_host(self.root, nics=2, disks=1, partitions=2)
+        ctx = fs.use(host)
+        ctx.__enter__()
+        self.addCleanup(ctx.__exit__, None, None, None)
+
+    def test_disabled(self):
+        # Outside of a trace, collectors are the undecorated functions
+        original = block._linux_disks
+        self.assertFalse(hasattr(original, '__wrapped__'))
+        with trace.tracing():
+            self.assertIsNot(original, block._linux_disks)
+        self.assertIs(original, block._linux_disks)
+
+    def test_tracing(self):
+        finished = []
+        with trace.tracing(callback=finished.append) as t:
+            block.info()
+            for nic in net.info().nics:
+                nic.driver
+
+        self.assertEqual(
+            [
+                'hwk.block._linux_info',
+                'hwk.net._linux_info',
+                'hwk.udev.device_properties',
+                'hwk.udev.device_properties',
+            ],
+            [s.name for s in t.spans],
+        )
+        block_span, net_span, udev_span, _ = t.spans
+        self.assertEqual(
+            ['hwk.block._linux_disks'],
+            [c.name for c in block_span.children],
+        )
+        # The addr_assign_type and address of each NIC
+        self.assertEqual(4, net_span.opens)
+        self.assertEqual([], net_span.files)
+        self.assertEqual(0, net_span.spawns)
+        self.assertEqual(1, udev_span.spawns)
+        self.assertEqual('udevadm', udev_span.commands[0][0])
+        self.assertEqual(
+            t.opens, sum(s.opens for s in (block_span, net_span)))
+        self.assertEqual(2, t.spawns)
+        self.assertIs(finished[-1], t.spans[-1])
+
+        exported = json.loads(t.to_json())
+        self.assertEqual(2, exported['spawns'])
+        self.assertEqual('hwk.net._linux_info', exported['spans'][1]['name'])
+
+    def test_error(self):
+        def fail(cmd, stderr=None):
+            raise ValueError('boom')
+
+        with trace.tracing() as t:
+            orig = fs.current().filesystem.check_output
+            fs.current().filesystem.check_output = fail
+            try:
+                self.assertRaises(
+                    ValueError, udev.device_properties, '/sys/class/net/x')
+            finally:
+                fs.current().filesystem.check_output = orig
+        self.assertIn('boom', t.spans[0].error)
+        self.assertIsNotNone(t.spans[0].duration)
@@ -0,0 +1,104 @@
+# -*- coding: utf-8 -*-
+
+# Licensed under the Apache License, Version 2.0 (the "License"); you may
+# not use this file except in compliance with the License. You may obtain
+# a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+# WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+# License for the specific language governing permissions and limitations
+# under the License.
+
+import mock
+
+from hwk import fs
+from hwk import utils
+
+from hwk.tests.unit import base
+
+
+class TestUtils(base.TestCase):
+
+    def test_parse_cpulist(self):
+        self.assertEqual(0, utils.parse_cpulist(''))
+        self.assertEqual(0b1, utils.parse_cpulist('0\n'))
+        self.assertEqual(0xf0f, utils.parse_cpulist('0-3,8-11'))
+        self.assertEqual(0b10101010, utils.parse_cpulist('1-7:2'))
+        self.assertEqual(1 << 255, utils.parse_cpulist(b'255'))
+
+    def test_parse_cpumask(self):
+        self.assertEqual(0xffff, utils.parse_cpumask('0000ffff\n'))
+        # Hosts with more than 32 logical processors have comma-separated
+        # 32-bit words in their masks
+        self.assertEqual(
+            (1 << 32) | 1,
+            utils.parse_cpumask('00000000,00000001,00000001'),
+        )
+
+    def test_processor_set(self):
+        ps = utils.ProcessorSet.from_cpulist('0-3,8-11')
+        self.assertEqual(8, len(ps))
+        self.assertIn(9, ps)
+        self.assertNotIn(4, ps)
+        self.assertEqual([0, 1, 2, 3, 8, 9, 10, 11], list(ps))
+        self.assertEqual(set([0, 1, 2, 3, 8, 9, 10, 11]), ps)
+        self.assertEqual('0-3,8-11', ps.to_cpulist())
+
+        other = utils.ProcessorSet([3, 4, 8])
+        self.assertEqual(set([3, 8]), ps & other)
+        self.assertEqual(set([0, 1, 2, 9, 10, 11]), ps - other)
+        self.assertEqual(
+            utils.ProcessorSet.from_cpulist('0-4,8-11'),
+            ps | other,
+        )
+        self.assertTrue(utils.ProcessorSet([0, 1]).issubset(ps))
+        self.assertTrue(ps.isdisjoint([4, 5]))
+        self.assertFalse(utils.ProcessorSet())
+        # Equal to the frozenset of its IDs, so it must hash the same
+        self.assertEqual(hash(frozenset(ps)), hash(ps))
+        self.assertIn(ps, set([frozenset([0, 1, 2, 3, 8, 9, 10, 11])]))
+
+    def test_processor_set_immutable(self):
+        ps = utils.ProcessorSet([1])
+        self.assertRaises(AttributeError, setattr, ps, 'mask', 3)
+
+    @mock.patch.object(utils, 'MEMOIZE_MAXSIZE', 2)
+    def test_memoize(self):
+        calls = []
+
+        @utils.memoize
+        def root(x):
+            calls.append((fs.current().root, x))
+            return fs.current().root
+
+        def discover(path):
+            with fs.use(fs.Filesystem(path)):
+                return root(1)
+
+        self.assertEqual('/a', discover('/a'))
+        self.assertEqual('/b', discover('/b'))
+        self.assertEqual('/a', discover('/a'))
+        # The least recently used result, for /b, is dropped
+        self.assertEqual('/c', discover('/c'))
+        self.assertEqual('/a', discover('/a'))
+        self.assertEqual('/b', discover('/b'))
+        self.assertEqual(
+            [('/a', 1), ('/b', 1), ('/c', 1), ('/b', 1)], calls)
+        root.cache_clear()
+        discover('/a')
+        self.assertEqual(('/a', 1), calls[-1])
+
+    def test_intern(self):
+        # Build equal strings at runtime so they are distinct objects
+        a = ''.join(['i40', 'e'])
+        b = ''.join(['i4', '0e'])
+        self.assertIs(utils.intern_str(a), utils.intern_str(b))
+        self.assertIsNone(utils.intern_str(None))
+
+        s1 = utils.intern_set([a, 'tso'])
+        s2 = utils.intern_set(set([b, 'tso']))
+        self.assertIs(s1, s2)
+        self.assertEqual(frozenset(['i40e', 'tso']), s1)
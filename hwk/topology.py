@@ -13,13 +13,17 @@
 # under the License.
 
 import os
-import sys
 
-from hwk import cpu
+from hwk import fs
+from hwk import serialize
+from hwk import trace
 from hwk import units
 from hwk import utils
 
 _LINUX_SYS_DEVICES_SYSTEM_NODE_DIR = '/sys/devices/system/node/'
+_LINUX_SYS_DEVICES_SYSTEM_CPU_DIR = '/sys/devices/system/cpu/'
+# Fields that may be passed to `info(include=...)`
+FIELDS = ('cores', 'caches', 'distances')
 _INFO_HELP = """Topology information
 ===============================================================================
 `hwk.topology.Info` attributes:
@@ -29,6 +33,14 @@ architecture (string)
   A string indicating the overall architecture of the system topology (e.g.
   'NUMA' or 'SMP')
 
+distances (list of list of int)
+
+  A node x node table of the relative cost of accessing memory on one node from
+  processors on another, as reported by the system firmware (ACPI SLIT). The
+  rows and columns are ordered the same as `nodes`, so `distances[i][j]` is the
+  distance from `nodes[i]` to `nodes[j]`. A node's distance to itself is
+  normally 10
+
 nodes (list of `hwk.topology.Node` objects)
 
   A list of objects representing one or more processors, memory banks (caches)
@@ -40,15 +52,16 @@ nodes (list of `hwk.topology.Node` objects)
 
     0-based index of the node within the system
 
-  processor_set (set of int)
+  processor_set (`hwk.utils.ProcessorSet`)
 
-    A set of integers representing the logical processors that are associated
-    with this node. For example, assume a dual Intel® Xeon® Processor E5-4650
-    v2 system. Each E5-4650 processor has 10 cores with 2 hardware threads per
-    core, giving 40 total logical processors in the system.  Suppose the system
+    A set of integers, stored as a bitmask, representing the logical
+    processors that are associated with this node. For example, assume a dual
+    Intel® Xeon® Processor E5-4650 v2 system. Each E5-4650 processor has 10
+    cores with 2 hardware threads per core, giving 40 total logical processors
+    in the system.  Suppose the system
     reported the second Xeon processor's (NUMA node) cores (and their thread
     siblings) as logical processors 10-19 and 31-39, the value of processor_set
-    would be set([10,11,12,13,14,15,16,17,18,19,31,32,33,34,35,36,37,38,39])
+    would be ProcessorSet('10-19,31-39')
 
   cores (list of `hwk.topology.Core` objects)
 
@@ -64,7 +77,7 @@ nodes (list of `hwk.topology.Node` objects)
 
       Number of hardware threads in the core
 
-    processor_set (set of int)
+    processor_set (`hwk.utils.ProcessorSet`)
 
       The set of logical processor IDs for all threads in the core
 
@@ -79,6 +92,11 @@ nodes (list of `hwk.topology.Node` objects)
 
     `hwk.topology.Cache` attributes:
 
+    id (int)
+
+      Identifier of the cache, unique among caches of the same level and type,
+      if known
+
     level (int)
 
       1-based number representing the "distance" or "cost to access"
@@ -93,7 +111,7 @@ nodes (list of `hwk.topology.Node` objects)
 
       Size in bytes of the cache
 
-    processor_set (int)
+    processor_set (`hwk.utils.ProcessorSet`)
 
       Set of logical processor IDs for all threads having access to the cache
 """
@@ -102,9 +120,12 @@ nodes (list of `hwk.topology.Node` objects)
 class Info(object):
     """Object describing the physical topology of a system."""
 
+    _SERIALIZED = ('architecture', 'nodes', 'distances')
+
     def __init__(self):
         self.architecture = None
         self.nodes = None
+        self.distances = None
 
     def __repr__(self):
         return "topology %s (%d nodes)" % (
@@ -115,12 +136,38 @@ class Info(object):
     def describe(self):
         return _INFO_HELP
 
+    def distance(self, from_node_id, to_node_id):
+        """Returns the distance between the two supplied NUMA nodes, or None
+        if the information could not be determined.
+        """
+        if not self.distances:
+            return None
+        index = dict((n.id, x) for x, n in enumerate(self.nodes))
+        try:
+            return self.distances[index[from_node_id]][index[to_node_id]]
+        except (KeyError, IndexError):
+            return None
+
+    def to_dict(self):
+        return serialize.to_dict(self)
+
+    @classmethod
+    def from_dict(cls, data):
+        res = cls()
+        res.architecture = data['architecture']
+        res.nodes = [Node.from_dict(n) for n in data['nodes']]
+        res.distances = data['distances']
+        return res
+
 
 class Node(object):
 
+    __slots__ = ('id', 'processor_set', 'cores', 'caches')
+    _SERIALIZED = ('id', 'processor_set', 'caches', 'cores')
+
     def __init__(self, node_id):
         self.id = int(node_id)
-        self.processor_set = set()
+        self.processor_set = utils.ProcessorSet()
         self.cores = []
         self.caches = []
 
@@ -130,12 +177,35 @@ class Node(object):
             len(self.cores),
         )
 
+    def to_dict(self):
+        return serialize.to_dict(self)
+
+    @classmethod
+    def from_dict(cls, data):
+        res = cls(data['id'])
+        res.processor_set = utils.ProcessorSet.from_cpulist(
+            data['processor_set'])
+        res.caches = [Cache.from_dict(c) for c in data['caches']]
+        res.cores = [Core.from_dict(c) for c in data['cores']]
+        # The caches of a core are the node's caches shared by any of its
+        # processors. They are not serialized with the core, so that each
+        # cache is serialized and deserialized once.
+        for core in res.cores:
+            core.caches = [
+                c for c in res.caches
+                if c.processor_set.intersects(core.processor_set)
+            ]
+        return res
+
 
 class Core(object):
 
+    __slots__ = ('id', 'processor_set', 'caches')
+    _SERIALIZED = ('id', 'processor_set')
+
     def __init__(self, core_id):
         self.id = int(core_id)
-        self.processor_set = set()
+        self.processor_set = utils.ProcessorSet()
         self.caches = []
 
     @property
@@ -148,13 +218,28 @@ class Core(object):
             self.threads,
         )
 
+    def to_dict(self):
+        return serialize.to_dict(self)
+
+    @classmethod
+    def from_dict(cls, data):
+        res = cls(data['id'])
+        res.processor_set = utils.ProcessorSet.from_cpulist(
+            data['processor_set'])
+        return res
+
 
 class Cache(object):
 
+    __slots__ = ('id', 'level', 'type', 'size_bytes', 'processor_set')
+    _SERIALIZED = __slots__
+
     def __init__(self):
+        self.id = None
         self.level = None
+        self.type = None
         self.size_bytes = None
-        self.processor_set = set()
+        self.processor_set = utils.ProcessorSet()
 
     def __repr__(self):
         size_kb = self.size_bytes // units.KB
@@ -169,32 +254,90 @@ class Cache(object):
             size_kb,
         )
 
+    def to_dict(self):
+        return serialize.to_dict(self)
+
+    @classmethod
+    def from_dict(cls, data):
+        res = cls()
+        res.id = data['id']
+        res.level = data['level']
+        res.type = utils.intern_str(data['type'])
+        res.size_bytes = data['size_bytes']
+        res.processor_set = utils.ProcessorSet.from_cpulist(
+            data['processor_set'])
+        return res
+
+
+def _linux_node_path(node_id, *parts):
+    return os.path.join(
+        _LINUX_SYS_DEVICES_SYSTEM_NODE_DIR,
+        'node' + str(node_id),
+        *parts
+    )
+
+
+def _linux_cache_size_bytes(size):
+    # The cache's size file contains a string like '32K' or '30720K'
+    size = size.strip().upper()
+    multiplier = {
+        'K': units.KB,
+        'M': units.MB,
+        'G': units.GB,
+    }.get(size[-1:])
+    if multiplier is None:
+        return int(size)
+    return int(size[:-1]) * multiplier
+
+
+def _linux_read_cpulist(path):
+    """Reads a file in cpulist format, falling back to the cpumap (hex bitmask)
+    file of the same name if the list file does not exist, and returns the
+    integer bitmask.
+    """
+    try:
+        return utils.parse_cpulist(fs.open(path + 'list', 'r').read())
+    except IOError:
+        return utils.parse_cpumask(fs.open(path + 'map', 'r').read())
+
 
 def node_processor_set(node_id):
-    """Returns a set of ints representing the logical processor IDs associated
-    with the supplied NUMA node.
+    """Returns a `hwk.utils.ProcessorSet` representing the logical processor
+    IDs associated with the supplied NUMA node.
     """
     try:
         return {
-            "linux2": _linux_node_processor_set,
-        }[sys.platform](node_id)
+            "Linux": _linux_node_processor_set,
+        }[fs.system()](int(node_id))
     except KeyError:
         return None
 
 
-@utils.memoize
 def _linux_node_processor_set(node_id):
-    # The /sys/devices/node/nodeX/cpumask file contains a hexadecimal string
-    # that indicates which of the logical processors on the system are
-    # associated with node X
-    path = os.path.join(
-        _LINUX_SYS_DEVICES_SYSTEM_NODE_DIR,
-        'node' + str(node_id),
-        'cpumap',
-    )
-    cpumap = utils.hextoi(open(path, 'rb').read())
-    num_cpus = cpu.total_threads()
-    return set(x for x in range(num_cpus) if cpumap & (1 << x))
+    node = _linux_node(node_id)
+    if node is None:
+        return None
+    return node.processor_set
+
+
+def node_distances(node_id):
+    """Returns a list of ints representing the distance from the supplied NUMA
+    node to every node in the system, ordered by node ID.
+    """
+    try:
+        return {
+            "Linux": _linux_node_distances,
+        }[fs.system()](int(node_id))
+    except KeyError:
+        return None
+
+
+def _linux_node_distances(node_id):
+    i = _linux_info()
+    for x, node in enumerate(i.nodes):
+        if node.id == node_id and i.distances is not None:
+            return i.distances[x]
+    return None
 
 
 def node_cores(node_id):
@@ -203,54 +346,17 @@ def node_cores(node_id):
     """
     try:
         return {
-            "linux2": _linux_node_cores,
-        }[sys.platform](node_id)
+            "Linux": _linux_node_cores,
+        }[fs.system()](int(node_id))
     except KeyError:
         return None
 
 
-@utils.memoize
 def _linux_node_cores(node_id):
-    # The /sys/devices/node/nodeX directory contains a subdirectory called
-    # 'cpuX' for each logical processor assigned to the node. Each of those
-    # subdirectories containers a topology subdirectory which has a core_id
-    # file that indicates the 0-based identifier of the physical core the
-    # logical processor (hardware thread) is on.
-    path = os.path.join(
-        _LINUX_SYS_DEVICES_SYSTEM_NODE_DIR,
-        'node' + str(node_id),
-    )
-    cores = {}
-    for filename in os.listdir(path):
-        if not filename.startswith('cpu'):
-            continue
-        cpu_path = os.path.join(path, filename)
-        if not os.path.isdir(cpu_path):
-            # There are two files in the node directory that start with 'cpu'
-            # but are not subdirectories ('cpulist' and 'cpumap'). Ignore these
-            # files.
-            continue
-        # Grab the logical processor ID by cutting the integer from the
-        # filename of the CPU
-        lp_id = int(filename[3:])
-        core_id_path = os.path.join(cpu_path, 'topology', 'core_id')
-        core_id = int(open(core_id_path, 'rb').read())
-        if core_id in cores:
-            core = cores[core_id]
-        else:
-            core = Core(core_id)
-            cores[core_id] = core
-        core.processor_set.add(lp_id)
-
-    cores = cores.values()
-    caches = _linux_node_caches(node_id)
-    # Map the cache to the core, depending on intersection of core's
-    # processor_set and cache's processor_set.
-    for cache in caches:
-        for core in cores:
-            if core.processor_set & cache.processor_set:
-                core.caches.append(cache)
-    return cores
+    node = _linux_node(node_id)
+    if node is None:
+        return None
+    return node.cores
 
 
 def node_caches(node_id):
@@ -259,94 +365,395 @@ def node_caches(node_id):
     """
     try:
         return {
-            "linux2": _linux_node_caches,
-        }[sys.platform](node_id)
+            "Linux": _linux_node_caches,
+        }[fs.system()](int(node_id))
     except KeyError:
         return None
 
 
-@utils.memoize
 def _linux_node_caches(node_id):
-    # The /sys/devices/node/nodeX directory contains a subdirectory called
-    # 'cpuX' for each logical processor assigned to the node. Each of those
-    # subdirectories containers a 'cache' subdirectory which contains a number
-    # of subdirectories beginning with 'index' and ending in the cache's
-    # internal 0-based identifier. Those subdirectories contain a number of
-    # files, including 'shared_cpu_list', 'size', and 'type' which we use to
-    # determine cache characteristics.
-    path = os.path.join(
-        _LINUX_SYS_DEVICES_SYSTEM_NODE_DIR,
-        'node' + str(node_id),
-    )
-    caches = {}
-    for filename in os.listdir(path):
-        if not filename.startswith('cpu'):
-            continue
-        cpu_path = os.path.join(path, filename)
-        if not os.path.isdir(cpu_path):
-            # There are two files in the node directory that start with 'cpu'
-            # but are not subdirectories ('cpulist' and 'cpumap'). Ignore these
-            # files.
-            continue
-        # Grab the logical processor ID by cutting the integer from the
-        # filename of the CPU
-        lp_id = int(filename[3:])
-        cache_path = os.path.join(cpu_path, 'cache')
-        for cpu_filename in os.listdir(cache_path):
-            if not cpu_filename.startswith('index'):
-                continue
-            type_path = os.path.join(cache_path, cpu_filename, 'type')
-            type = open(type_path, 'rb').read().strip().lower()
-            level_path = os.path.join(cache_path, cpu_filename, 'level')
-            level = int(open(level_path, 'rb').read().strip())
-            size_path = os.path.join(cache_path, cpu_filename, 'size')
-            size = open(size_path, 'rb').read().strip()
-            scpu_path = os.path.join(
-                cache_path,
-                cpu_filename,
-                'shared_cpu_map',
-            )
-            shared_cpu_map = open(scpu_path, 'rb').read().strip()
-            cache_key = (level, type, shared_cpu_map)
-            if cache_key in caches:
-                cache = caches[cache_key]
-            else:
-                cache = Cache()
-                cache.level = level
-                cache.type = type
-                cache.size_bytes = int(size[:-1]) * units.KB
-                caches[cache_key] = cache
-            cache.processor_set.add(lp_id)
-
-    return caches.values()
-
-
-def info():
+    node = _linux_node(node_id)
+    if node is None:
+        return None
+    return node.caches
+
+
+def _linux_node(node_id):
+    for node in _linux_info().nodes:
+        if node.id == node_id:
+            return node
+    return None
+
+
+def info(include=None):
     """Returns a `hwk.topology.Info` object containing information on the
     physical topology in the system, or None if the information could not be
     determined.
+
+    If include is supplied, only the fields it names, from those listed in
+    `hwk.topology.FIELDS`, are determined, together with the nodes and their
+    processor sets. 'cores' fills in the cores of each node, 'caches' the
+    caches of each node and core and 'distances' the node distance table. For
+    example, include=['cores'] never walks the cache directories.
     """
+    fields = utils.included(include, FIELDS)
     try:
-        return {
-            "linux2": _linux_info,
-        }[sys.platform]()
+        fn = {
+            "Linux": _linux_info,
+        }[fs.system()]
     except KeyError:
         return None
+    if include is None:
+        return fn()
+    return fn(fields)
 
 
-@utils.memoize
-def _linux_info():
+def _linux_nodes(distances=True):
+    """Returns a list of `hwk.topology.Node` objects with their processor_set
+    attribute filled in, along with the node x node distance table, or None
+    for the table if distances is False.
+    """
     nodes = []
-    for filename in os.listdir(_LINUX_SYS_DEVICES_SYSTEM_NODE_DIR):
-        if filename.startswith('node'):
-            node_id = filename[4:]
-            node = Node(node_id)
-            node.processor_set = _linux_node_processor_set(node_id)
-            node.caches = _linux_node_caches(node_id)
-            node.cores = _linux_node_cores(node_id)
-            nodes.append(node)
+    distances = [] if distances else None
+    try:
+        filenames = fs.listdir(_LINUX_SYS_DEVICES_SYSTEM_NODE_DIR)
+    except OSError:
+        filenames = []
+    node_ids = sorted(
+        int(filename[4:]) for filename in filenames
+        if filename.startswith('node') and filename[4:].isdigit()
+    )
+    for node_id in node_ids:
+        node = Node(node_id)
+        # The /sys/devices/node/nodeX/cpulist file contains a range list (e.g.
+        # '0-9,20-29') of the logical processors on the system that are
+        # associated with node X. Older kernels may only have the cpumap file,
+        # which contains the same information as a hexadecimal bitmask split
+        # into comma-separated 32-bit words.
+        node.processor_set = utils.ProcessorSet.from_mask(
+            _linux_read_cpulist(_linux_node_path(node_id, 'cpu')))
+        nodes.append(node)
+        # The /sys/devices/node/nodeX/distance file contains a space-separated
+        # list of the distances from node X to each online node, e.g. '10 21'
+        if distances is not None:
+            try:
+                path = _linux_node_path(node_id, 'distance')
+                distances.append(
+                    [int(d) for d in fs.open(path, 'r').read().split()])
+            except IOError:
+                distances = None
+
+    if not nodes:
+        # Kernels built without CONFIG_NUMA have no node directory at all. We
+        # treat all online processors as belonging to a single node 0.
+        node = Node(0)
+        path = os.path.join(_LINUX_SYS_DEVICES_SYSTEM_CPU_DIR, 'online')
+        node.processor_set = utils.ProcessorSet.from_cpulist(
+            fs.open(path, 'r').read())
+        nodes.append(node)
+        distances = None
+    return nodes, distances
+
+
+@trace.collector
+@utils.memoize
+def _linux_info(fields=frozenset(FIELDS)):
+    # We build nodes, cores and caches in a single walk over the logical
+    # processors listed in each node's cpulist. For each logical processor X,
+    # /sys/devices/system/cpu/cpuX contains:
+    #
+    # topology/core_id: the identifier of the physical core the processor
+    #   (hardware thread) is on
+    # topology/thread_siblings_list: all processors on that same core
+    # cache/indexY/: one directory per cache the processor can access, with
+    #   'level', 'type', 'size', 'id' and 'shared_cpu_list' files
+    #
+    # Sibling threads share a core, and many processors share the same L2 or
+    # L3 cache, so re-reading those files for every processor would mean
+    # thousands of redundant opens on large hosts. Instead we keep a bitmask
+    # per core and per cache index of the processors already accounted for
+    # and skip any processor whose core or cache is already known.
+    nodes, distances = _linux_nodes('distances' in fields)
+    read_cores = 'cores' in fields
+    read_caches = 'caches' in fields
+
+    caches = []
+    # Maps cache index directory name to the bitmask of logical processors
+    # whose cache at that index has already been recorded
+    index_masks = {}
+    cpu_caches = {}
+    for node in nodes:
+        cores = {}
+        core_mask = 0
+        for lp_id in node.processor_set:
+            cpu_path = os.path.join(
+                _LINUX_SYS_DEVICES_SYSTEM_CPU_DIR,
+                'cpu%d' % lp_id,
+            )
+            lp_bit = 1 << lp_id
+            if read_cores and not core_mask & lp_bit:
+                topo_path = os.path.join(cpu_path, 'topology')
+                core_id = int(
+                    fs.open(os.path.join(topo_path, 'core_id'), 'r').read())
+                siblings = _linux_read_cpulist(
+                    os.path.join(topo_path, 'thread_siblings_'))
+                # Only count siblings that are actually in this node
+                siblings = (siblings | lp_bit) & node.processor_set.mask
+                core_mask |= siblings
+                if core_id in cores:
+                    siblings |= cores[core_id]
+                cores[core_id] = siblings
+
+            if not read_caches:
+                continue
+            if index_masks and all(m & lp_bit for m in index_masks.values()):
+                continue
+            cache_path = os.path.join(cpu_path, 'cache')
+            try:
+                index_names = fs.listdir(cache_path)
+            except OSError:
+                continue
+            for index_name in index_names:
+                if not index_name.startswith('index'):
+                    continue
+                if index_masks.get(index_name, 0) & lp_bit:
+                    continue
+                cache = _linux_cache(os.path.join(cache_path, index_name))
+                # Make sure the processor we got here from is in the set even
+                # if the kernel reported a bogus shared_cpu_list
+                cache.processor_set = cache.processor_set | lp_bit
+                index_masks[index_name] = (
+                    index_masks.get(index_name, 0) | cache.processor_set.mask
+                )
+                caches.append(cache)
+                for x in cache.processor_set:
+                    cpu_caches.setdefault(x, []).append(cache)
+
+        for core_id in sorted(cores):
+            core = Core(core_id)
+            core.processor_set = utils.ProcessorSet.from_mask(cores[core_id])
+            core.caches = _sorted_caches(
+                c for x in core.processor_set for c in cpu_caches.get(x, ())
+            )
+            node.cores.append(core)
+
+    for node in nodes:
+        node.caches = _sorted_caches(
+            c for x in node.processor_set for c in cpu_caches.get(x, ())
+        )
 
     res = Info()
     res.architecture = 'NUMA' if len(nodes) > 1 else 'SMP'
     res.nodes = nodes
+    res.distances = distances
     return res
+
+
+def _linux_cache(index_path):
+    """Returns a `hwk.topology.Cache` object describing the cache at the
+    supplied /sys/devices/system/cpu/cpuX/cache/indexY directory.
+    """
+    cache = Cache()
+    cache.type = fs.open(os.path.join(index_path, 'type'), 'r').read()
+    cache.type = utils.intern_str(cache.type.strip().lower())
+    cache.level = int(fs.open(os.path.join(index_path, 'level'), 'r').read())
+    cache.size_bytes = _linux_cache_size_bytes(
+        fs.open(os.path.join(index_path, 'size'), 'r').read())
+    cache.processor_set = utils.ProcessorSet.from_mask(
+        _linux_read_cpulist(os.path.join(index_path, 'shared_cpu_')))
+    try:
+        cache.id = int(fs.open(os.path.join(index_path, 'id'), 'r').read())
+    except IOError:
+        # Kernels before 4.11 do not expose the cache id
+        pass
+    return cache
+
+
+def _sorted_caches(caches):
+    # Removes duplicate cache objects, preserving a stable order of level, type
+    # and then lowest processor ID
+    unique = dict((id(c), c) for c in caches)
+    return sorted(
+        unique.values(),
+        key=lambda c: (c.level, c.type, c.processor_set.mask),
+    )
+
+
+PLACE_SPREAD = 'spread'
+PLACE_PACK = 'pack'
+PLACE_CACHE = 'cache'
+
+
+def allowed_processor_set():
+    """Returns a `hwk.utils.ProcessorSet` of the logical processors the calling
+    process may be scheduled on, or None if the information could not be
+    determined.
+
+    This is the process' CPU affinity, which already reflects any cgroup
+    cpuset the process is confined to, minus any processors the kernel was
+    told to isolate from general scheduling with the isolcpus boot parameter.
+    """
+    try:
+        return {
+            "Linux": _linux_allowed_processor_set,
+        }[fs.system()]()
+    except KeyError:
+        return None
+
+
+def _linux_allowed_processor_set():
+    if fs.current().is_local and hasattr(os, 'sched_getaffinity'):
+        mask = utils.ProcessorSet(os.sched_getaffinity(0)).mask
+    else:
+        path = os.path.join(_LINUX_SYS_DEVICES_SYSTEM_CPU_DIR, 'online')
+        mask = utils.parse_cpulist(fs.open(path, 'r').read())
+    # The /sys/devices/system/cpu/isolated file contains a cpulist of the
+    # processors in the isolcpus= kernel boot parameter. If the process was
+    # explicitly started on isolated processors, we leave them alone.
+    try:
+        path = os.path.join(_LINUX_SYS_DEVICES_SYSTEM_CPU_DIR, 'isolated')
+        isolated = utils.parse_cpulist(fs.open(path, 'r').read())
+    except IOError:
+        isolated = 0
+    if mask & ~isolated:
+        mask &= ~isolated
+    return utils.ProcessorSet.from_mask(mask)
+
+
+def place(workers, policy=PLACE_SPREAD, smt=True, processor_set=None):
+    """Returns a list of `workers` `hwk.utils.ProcessorSet` objects, each
+    containing the single logical processor the worker at that index should be
+    pinned to.
+
+    `policy` may be one of:
+
+    `hwk.topology.PLACE_SPREAD`: distribute workers round-robin across NUMA
+    nodes, and across last-level caches within a node, to maximize the memory
+    bandwidth and cache capacity available to each worker
+
+    `hwk.topology.PLACE_PACK`: fill every hardware thread of a core, and every
+    core of a node, before moving on to the next, to keep workers close
+    together
+
+    `hwk.topology.PLACE_CACHE`: fill the cores sharing one last-level (L3)
+    cache, and then their hardware thread siblings, before moving on to the
+    next cache, so workers sharing data share a cache
+
+    With `PLACE_SPREAD`, hardware thread siblings are only used once every
+    core has a worker. `PLACE_PACK` fills the threads of each core before
+    the next core, and `PLACE_CACHE` the threads within each cache before the
+    next cache. If `smt` is False, only one hardware thread per core is ever
+    used. If there are more workers than usable
+    processors, workers are assigned processors round-robin.
+
+    `processor_set` limits placement to the supplied processors and defaults
+    to `hwk.topology.allowed_processor_set()`.
+    """
+    if policy not in (PLACE_SPREAD, PLACE_PACK, PLACE_CACHE):
+        raise ValueError("Unknown placement policy %r" % policy)
+    if workers < 1:
+        return []
+    if processor_set is None:
+        processor_set = allowed_processor_set()
+    allowed = utils.ProcessorSet(processor_set).mask
+
+    order = []
+    node_orders = []
+    for node in info().nodes:
+        if policy == PLACE_PACK:
+            for core in node.cores:
+                threads = list(core.processor_set & allowed)
+                order.extend(threads if smt else threads[:1])
+            continue
+        groups = [
+            _thread_ranks(cores, allowed, smt)
+            for cores in _llc_groups(node.cores)
+        ]
+        if policy == PLACE_CACHE:
+            order.extend(
+                lp_id for ranks in groups for rank in ranks for lp_id in rank
+            )
+            continue
+        node_order = []
+        for r in range(max([len(ranks) for ranks in groups] or [0])):
+            node_order.extend(_interleave(
+                [ranks[r] for ranks in groups if len(ranks) > r]
+            ))
+        node_orders.append(node_order)
+    if policy == PLACE_SPREAD:
+        order = _interleave(node_orders)
+
+    if not order:
+        raise ValueError("No processors available for placement")
+    return [
+        utils.ProcessorSet.from_mask(1 << order[x % len(order)])
+        for x in range(workers)
+    ]
+
+
+def _llc_groups(cores):
+    # Groups the supplied cores by the last-level cache they share, in order
+    # of the lowest core ID in each group
+    groups = []
+    index = {}
+    for core in cores:
+        llc = None
+        for cache in core.caches:
+            if llc is None or cache.level > llc.level:
+                llc = cache
+        key = id(llc) if llc is not None else None
+        if key not in index:
+            index[key] = len(groups)
+            groups.append([])
+        groups[index[key]].append(core)
+    return groups
+
+
+def _thread_ranks(cores, allowed, smt):
+    # Returns a list of lists of logical processor IDs: the first list holds
+    # the first usable hardware thread of each core, the second list the
+    # second thread of each core and so on.
+    ranks = []
+    for core in cores:
+        threads = list(core.processor_set & allowed)
+        if not smt:
+            threads = threads[:1]
+        for r, lp_id in enumerate(threads):
+            if len(ranks) <= r:
+                ranks.append([])
+            ranks[r].append(lp_id)
+    return ranks
+
+
+def _interleave(lists):
+    res = []
+    for x in range(max([len(items) for items in lists] or [0])):
+        res.extend(items[x] for items in lists if len(items) > x)
+    return res
+
+
+def apply_placement(placement, pids):
+    """Pins each process or thread ID in `pids` to the `hwk.utils.ProcessorSet`
+    at the same index in `placement`, as returned by `hwk.topology.place()`. A
+    pid of 0 means the calling thread. On systems where processor affinity
+    cannot be set, nothing is pinned.
+    """
+    if len(pids) > len(placement):
+        raise ValueError(
+            "Placement has %d processor sets for %d pids" % (
+                len(placement),
+                len(pids),
+            )
+        )
+    try:
+        fn = {
+            "Linux": _linux_apply_placement,
+        }[fs.system()]
+    except KeyError:
+        return None
+    return fn(placement, pids)
+
+
+def _linux_apply_placement(placement, pids):
+    for pid, processor_set in zip(pids, placement):
+        os.sched_setaffinity(pid, list(processor_set))
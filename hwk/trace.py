@@ -0,0 +1,235 @@
+# -*- coding: utf-8 -*-
+
+# Licensed under the Apache License, Version 2.0 (the "License"); you may
+# not use this file except in compliance with the License. You may obtain
+# a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+# WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+# License for the specific language governing permissions and limitations
+# under the License.
+
+"""Opt-in instrumentation of hwk's collectors.
+
+Functions that probe the host are decorated with `hwk.trace.collector`. While
+a trace is active in any thread, those functions are replaced in their modules
+by wrappers that record, for the tracing thread, a `hwk.trace.Span` per call
+with its wall time, the files it opened and the commands it ran:
+
+    >>> from hwk import block, trace
+    >>> with trace.tracing() as t:
+    ...     block.info()
+    >>> print(t.to_json())
+
+When no trace is active the decorated functions are the undecorated originals,
+so instrumentation costs nothing.
+"""
+
+import contextlib
+import functools
+import json
+import sys
+import threading
+import timeit
+
+from hwk import fs
+
+# List of (module name, function name, function, wrapper) tuples for every
+# function decorated with `collector`
+_collectors = []
+_lock = threading.Lock()
+_active = [0]
+_local = threading.local()
+
+
+class Span(object):
+    """One call of a collector.
+
+    `opens` and `spawns` count the files opened and commands run by the call
+    and everything it called. `files` and `commands` list only those opened
+    or run by the collector itself, not by the collectors it called, which
+    appear as `children`.
+    """
+
+    __slots__ = (
+        'name', 'start', 'duration', 'opens', 'spawns', 'files', 'commands',
+        'error', 'children',
+    )
+
+    def __init__(self, name, start):
+        self.name = name
+        self.start = start
+        self.duration = None
+        self.opens = 0
+        self.spawns = 0
+        self.files = []
+        self.commands = []
+        self.error = None
+        self.children = []
+
+    def __repr__(self):
+        return "%s (%.3f ms, %d opens, %d spawns)" % (
+            self.name, (self.duration or 0) * 1000, self.opens, self.spawns,
+        )
+
+    def to_dict(self):
+        return {
+            'name': self.name,
+            'start_ms': round(self.start * 1000, 3),
+            'duration_ms': round((self.duration or 0) * 1000, 3),
+            'opens': self.opens,
+            'spawns': self.spawns,
+            'files': self.files,
+            'commands': self.commands,
+            'error': self.error,
+            'children': [c.to_dict() for c in self.children],
+        }
+
+
+class Trace(object):
+    """The spans recorded by one `hwk.trace.tracing()` block.
+
+    `spans` holds the outermost calls. `opens` and `spawns` count every file
+    opened and command run during the block, including any outside of a
+    collector.
+    """
+
+    def __init__(self, callback=None):
+        self.callback = callback
+        self.spans = []
+        self.opens = 0
+        self.spawns = 0
+        self._stack = []
+        self._epoch = timeit.default_timer()
+
+    def __repr__(self):
+        return "trace (%d spans, %d opens, %d spawns)" % (
+            len(self.spans), self.opens, self.spawns,
+        )
+
+    def _push(self, name):
+        span = Span(name, timeit.default_timer() - self._epoch)
+        if self._stack:
+            self._stack[-1].children.append(span)
+        else:
+            self.spans.append(span)
+        self._stack.append(span)
+        return span
+
+    def _pop(self, span):
+        span.duration = timeit.default_timer() - self._epoch - span.start
+        self._stack.pop()
+        if self.callback is not None:
+            self.callback(span)
+
+    def _open(self, path):
+        self.opens += 1
+        for span in self._stack:
+            span.opens += 1
+        if self._stack:
+            self._stack[-1].files.append(path)
+
+    def _spawn(self, cmd):
+        self.spawns += 1
+        for span in self._stack:
+            span.spawns += 1
+        if self._stack:
+            self._stack[-1].commands.append(list(cmd))
+
+    def to_dict(self):
+        return {
+            'opens': self.opens,
+            'spawns': self.spawns,
+            'spans': [s.to_dict() for s in self.spans],
+        }
+
+    def to_json(self, **kwargs):
+        return json.dumps(self.to_dict(), **kwargs)
+
+
+class _Filesystem(fs.Proxy):
+    # Reports the files opened and commands run through the filesystem in use
+    # when tracing started to the trace. Memoized results are keyed by the
+    # wrapped filesystem, so tracing does not change what gets cached.
+
+    def __init__(self, filesystem, trace):
+        super(_Filesystem, self).__init__(filesystem)
+        self.trace = trace
+
+    def open(self, path, mode='r'):
+        self.trace._open(path)
+        return self.filesystem.open(path, mode)
+
+    def check_output(self, cmd, stderr=None):
+        self.trace._spawn(cmd)
+        return self.filesystem.check_output(cmd, stderr=stderr)
+
+
+def _wrap(name, fn):
+    @functools.wraps(fn)
+    def wrapper(*args, **kwargs):
+        trace = getattr(_local, 'trace', None)
+        if trace is None:
+            return fn(*args, **kwargs)
+        span = trace._push(name)
+        try:
+            return fn(*args, **kwargs)
+        except Exception as err:
+            span.error = repr(err)
+            raise
+        finally:
+            trace._pop(span)
+    return wrapper
+
+
+def collector(fn):
+    """Decorator that marks a module-level function as a collector, so calls
+    to it are recorded while tracing.
+    """
+    wrapper = _wrap('%s.%s' % (fn.__module__, fn.__name__), fn)
+    with _lock:
+        _collectors.append((fn.__module__, fn.__name__, fn, wrapper))
+        if _active[0]:
+            return wrapper
+    return fn
+
+
+def _swap(install):
+    for module_name, name, fn, wrapper in _collectors:
+        module = sys.modules.get(module_name)
+        if module is None:
+            continue
+        current = getattr(module, name, None)
+        if install and current is fn:
+            setattr(module, name, wrapper)
+        elif not install and current is wrapper:
+            setattr(module, name, fn)
+
+
+@contextlib.contextmanager
+def tracing(callback=None):
+    """Context manager that records the collectors called by the calling
+    thread for the duration of the block, yielding a `hwk.trace.Trace`.
+
+    If supplied, callback is called with each `hwk.trace.Span` as it
+    finishes.
+    """
+    trace = Trace(callback)
+    with _lock:
+        if not _active[0]:
+            _swap(True)
+        _active[0] += 1
+    prev = getattr(_local, 'trace', None)
+    _local.trace = trace
+    try:
+        with fs.use(_Filesystem(fs.current(), trace)):
+            yield trace
+    finally:
+        _local.trace = prev
+        with _lock:
+            _active[0] -= 1
+            if not _active[0]:
+                _swap(False)
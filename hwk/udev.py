@@ -17,20 +17,69 @@ import subprocess
 
 import six
 
+from hwk import fs
+from hwk import trace
+
 if six.PY3:
     DEVNULL = subprocess.DEVNULL
 else:
     DEVNULL = open(os.devnull, 'w')
 
 
+@trace.collector
+def database():
+    """Returns a dict, keyed by device path relative to /sys, e.g.
+    '/devices/pci0000:00/0000:00:19.0/net/enp0s25', of dicts of properties for
+    every device udev knows about, or None if the udev database could not be
+    read. This costs a single udevadm call, so is much cheaper than calling
+    `hwk.udev.device_properties()` for more than a handful of devices.
+    """
+    cmd = ['udevadm', 'info', '--export-db']
+    try:
+        out = fs.check_output(cmd, stderr=DEVNULL)
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+    # Output from udevadm info --export-db is a blank line separated record
+    # for each device, each line of which is prefixed with a type:
+    # $ udevadm info --export-db
+    # P: /devices/pci0000:00/0000:00:19.0/net/enp0s25
+    # E: DEVPATH=/devices/pci0000:00/0000:00:19.0/net/enp0s25
+    # E: ID_BUS=pci
+    # E: ID_NET_DRIVER=e1000e
+    # ...
+    #
+    # P: /devices/pci0000:00/0000:00:1a.0
+    # ...
+    #
+    # The 'P' line holds the device path and 'E' lines hold the properties
+    # `udevadm info -q property` would report for the device.
+    if isinstance(out, six.binary_type):
+        out = out.decode('utf8')
+    res = {}
+    props = None
+    for line in out.split('\n'):
+        if line.startswith('P: '):
+            props = res[line[3:]] = {}
+        elif line.startswith('E: ') and props is not None:
+            parts = line[3:].split('=', 1)
+            if len(parts) == 2:
+                props[parts[0]] = parts[1]
+        elif not line:
+            props = None
+    return res
+
+
+@trace.collector
 def device_properties(path):
     """Given a device path, e.g. '/sys/class/block/sda', returns a dict of
     properties for the device.
     """
     cmd = ['udevadm', 'info', '-q', 'property', path]
     try:
-        out = subprocess.check_output(cmd, stderr=DEVNULL)
-    except subprocess.CalledProcessError:
+        out = fs.check_output(cmd, stderr=DEVNULL)
+    except (OSError, subprocess.CalledProcessError):
+        # udevadm is missing or failed, e.g. in a minimal container
         return {}
 
     # Output from udevadm info looks like the following:
@@ -61,8 +110,10 @@ def device_properties(path):
     # SUBSYSTEM=block
     # TAGS=:systemd:
     # USEC_INITIALIZED=10219204
+    if isinstance(out, six.binary_type):
+        out = out.decode('utf8')
     res = {}
-    for line in six.text_type(out.strip()).split('\n'):
+    for line in out.strip().split('\n'):
         parts = line.split('=', 1)
         if len(parts) != 2:
             continue
@@ -12,6 +12,15 @@
 # License for the specific language governing permissions and limitations
 # under the License.
 
+import collections
+import functools
+import re
+import threading
+
+import six
+
+from hwk import fs
+
 
 def hextoi(subject):
     """Given a string representing an integer in hexadecimal notation, return
@@ -21,3 +30,341 @@ def hextoi(subject):
         return int(subject, 16)
     except ValueError:
         return None
+
+
+_OCTAL_ESCAPE_RE = re.compile(r'\\([0-7]{3})')
+
+
+def unescape_octal(subject):
+    """Given a path from /proc/self/mountinfo or /proc/mounts, which escape
+    spaces, tabs, newlines and backslashes as octal, e.g. '\\040' for a
+    space, returns the unescaped path.
+    """
+    return _OCTAL_ESCAPE_RE.sub(lambda m: chr(int(m.group(1), 8)), subject)
+
+
+# The most return values each memoized function keeps
+MEMOIZE_MAXSIZE = 32
+
+
+def memoize(fn):
+    """Decorator that caches the return value of the decorated function, keyed
+    by the `hwk.fs.Filesystem` in use and the positional arguments the function
+    was called with. At most `hwk.utils.MEMOIZE_MAXSIZE` values are kept, the
+    least recently used being dropped first, so a process discovering many
+    hosts or snapshots does not keep the results for all of them. The cache
+    may be emptied by calling the decorated function's `cache_clear()`
+    attribute.
+    """
+    cache = collections.OrderedDict()
+    lock = threading.Lock()
+
+    @functools.wraps(fn)
+    def wrapper(*args):
+        key = (fs.current().key, args)
+        with lock:
+            if key in cache:
+                # Moved to the end, as the most recently used
+                res = cache[key] = cache.pop(key)
+                return res
+        res = fn(*args)
+        with lock:
+            cache[key] = res
+            while len(cache) > MEMOIZE_MAXSIZE:
+                cache.popitem(last=False)
+        return res
+
+    def cache_clear():
+        with lock:
+            cache.clear()
+
+    wrapper.cache_clear = cache_clear
+    return wrapper
+
+
+def included(include, fields):
+    """Given the `include` argument of an `info()` or `prefetch()` function
+    (an iterable of field names, or None for all of them) and the tuple of
+    fields the function supports, returns a frozenset of the fields to
+    determine. Raises ValueError if any field is not supported.
+    """
+    if include is None:
+        return frozenset(fields)
+    if isinstance(include, six.string_types):
+        include = (include,)
+    res = frozenset(include)
+    unknown = res - set(fields)
+    if unknown:
+        raise ValueError(
+            "Unknown field(s) %s. Valid fields are %s." % (
+                ', '.join(sorted(unknown)), ', '.join(fields)))
+    return res
+
+
+# Frozensets of strings returned by `intern_set()`
+_interned_sets = {}
+
+
+def intern_str(value):
+    """Returns the interned copy of the supplied string, so that equal
+    strings found on many devices and hosts, such as vendor and driver names,
+    share a single object. Values other than native strings, including None,
+    are returned unchanged.
+    """
+    if type(value) is str:
+        return six.moves.intern(value)
+    return value
+
+
+def intern_set(values):
+    """Returns a frozenset of the interned copies of the supplied strings.
+    Equal sets share a single object, so the feature flags of thousands of
+    identical NICs or CPUs cost no more than those of one.
+    """
+    res = frozenset(intern_str(v) for v in values)
+    return _interned_sets.setdefault(res, res)
+
+
+class lazy(object):
+    """Decorator that turns a method into an attribute computed on first
+    access and cached in the instance attribute named for it with a leading
+    underscore, e.g. `_vendor` for `vendor`. Assigning to the attribute sets
+    the cached value, so classes using `__slots__` need only a slot for the
+    underscored name.
+
+    If the instance has a `_filesystem` attribute, the method is run with
+    that `hwk.fs.Filesystem` in use, so an object discovered on one host
+    resolves its attributes from the same host.
+    """
+
+    def __init__(self, fn):
+        functools.update_wrapper(self, fn)
+        self.fn = fn
+        self.attr = '_' + fn.__name__
+
+    def __get__(self, obj, cls=None):
+        if obj is None:
+            return self
+        try:
+            return getattr(obj, self.attr)
+        except AttributeError:
+            pass
+        filesystem = getattr(obj, '_filesystem', None)
+        if filesystem is None or filesystem.key == fs.current().key:
+            # Avoid the cost of a context manager when already on the host the
+            # object was discovered on, which is by far the most common case
+            value = self.fn(obj)
+        else:
+            with fs.use(filesystem):
+                value = self.fn(obj)
+        setattr(obj, self.attr, value)
+        return value
+
+    def __set__(self, obj, value):
+        setattr(obj, self.attr, value)
+
+    def __delete__(self, obj):
+        try:
+            delattr(obj, self.attr)
+        except AttributeError:
+            pass
+
+    def is_resolved(self, obj):
+        """Returns True if the attribute has been computed or set on the
+        supplied object.
+        """
+        return hasattr(obj, self.attr)
+
+
+def parse_cpulist(subject):
+    """Given a string in the Linux "cpulist" format, e.g. '0-3,8-11', return an
+    integer bitmask with a bit set for each logical processor in the list.
+    """
+    if isinstance(subject, six.binary_type):
+        subject = subject.decode('ascii')
+    mask = 0
+    for part in subject.strip().split(','):
+        part = part.strip()
+        if not part:
+            continue
+        stride = 1
+        if ':' in part:
+            # The kernel's command-line cpulist format (used by isolcpus=)
+            # allows a stride suffix, e.g. '0-15:2' for the even processors
+            part, stride = part.split(':', 1)
+            stride = int(stride)
+        if '-' in part:
+            first, last = part.split('-', 1)
+            first = int(first)
+            last = int(last)
+            if stride == 1:
+                mask |= ((1 << (last - first + 1)) - 1) << first
+            else:
+                for x in range(first, last + 1, stride):
+                    mask |= 1 << x
+        else:
+            mask |= 1 << int(part)
+    return mask
+
+
+def parse_cpumask(subject):
+    """Given a string in the Linux "cpumask" format, return an integer bitmask.
+
+    The kernel writes masks for hosts with more than 32 logical processors as
+    comma-separated 32-bit hexadecimal words, most significant word first, e.g.
+    '00000000,0000ffff'.
+    """
+    if isinstance(subject, six.binary_type):
+        subject = subject.decode('ascii')
+    return int(subject.strip().replace(',', '') or '0', 16)
+
+
+def _to_mask(subject):
+    if isinstance(subject, ProcessorSet):
+        return subject.mask
+    if isinstance(subject, six.integer_types):
+        return subject
+    mask = 0
+    for x in subject:
+        mask |= 1 << int(x)
+    return mask
+
+
+class ProcessorSet(object):
+    """An immutable set of logical processor IDs stored as an integer bitmask.
+
+    Supports the usual set operators (`&`, `|`, `-`, `^`), membership tests,
+    iteration in ascending processor ID order and comparison with plain
+    Python sets of ints.
+    """
+
+    __slots__ = ('_mask', '_hash')
+
+    def __init__(self, ids=None):
+        mask = 0
+        if ids is not None:
+            mask = _to_mask(ids)
+        object.__setattr__(self, '_mask', mask)
+
+    @classmethod
+    def from_mask(cls, mask):
+        res = cls.__new__(cls)
+        object.__setattr__(res, '_mask', mask)
+        return res
+
+    @classmethod
+    def from_cpulist(cls, subject):
+        return cls.from_mask(parse_cpulist(subject))
+
+    @classmethod
+    def from_cpumask(cls, subject):
+        return cls.from_mask(parse_cpumask(subject))
+
+    @property
+    def mask(self):
+        return self._mask
+
+    def __setattr__(self, name, value):
+        raise AttributeError("ProcessorSet objects are immutable")
+
+    def __iter__(self):
+        mask = self._mask
+        while mask:
+            low = mask & -mask
+            yield low.bit_length() - 1
+            mask ^= low
+
+    def __len__(self):
+        return bin(self._mask).count('1')
+
+    def __bool__(self):
+        return self._mask != 0
+
+    __nonzero__ = __bool__
+
+    def __contains__(self, proc_id):
+        return proc_id >= 0 and bool((self._mask >> proc_id) & 1)
+
+    def __int__(self):
+        return self._mask
+
+    def __hash__(self):
+        # Equal sets and frozensets must hash the same, and since the object
+        # is immutable the hash is only computed once
+        try:
+            return self._hash
+        except AttributeError:
+            res = hash(frozenset(self))
+            object.__setattr__(self, '_hash', res)
+            return res
+
+    def __eq__(self, other):
+        if isinstance(other, ProcessorSet):
+            return self._mask == other._mask
+        if isinstance(other, (set, frozenset)):
+            return set(self) == other
+        return NotImplemented
+
+    def __ne__(self, other):
+        res = self.__eq__(other)
+        if res is NotImplemented:
+            return res
+        return not res
+
+    def __and__(self, other):
+        return ProcessorSet.from_mask(self._mask & _to_mask(other))
+
+    def __or__(self, other):
+        return ProcessorSet.from_mask(self._mask | _to_mask(other))
+
+    def __sub__(self, other):
+        return ProcessorSet.from_mask(self._mask & ~_to_mask(other))
+
+    def __xor__(self, other):
+        return ProcessorSet.from_mask(self._mask ^ _to_mask(other))
+
+    def __rsub__(self, other):
+        return ProcessorSet.from_mask(_to_mask(other) & ~self._mask)
+
+    __rand__ = __and__
+    __ror__ = __or__
+    __rxor__ = __xor__
+
+    def __le__(self, other):
+        return self.issubset(other)
+
+    def __ge__(self, other):
+        return self.issuperset(other)
+
+    def issubset(self, other):
+        return self._mask & ~_to_mask(other) == 0
+
+    def issuperset(self, other):
+        other = _to_mask(other)
+        return self._mask & other == other
+
+    def isdisjoint(self, other):
+        return self._mask & _to_mask(other) == 0
+
+    def intersects(self, other):
+        return self._mask & _to_mask(other) != 0
+
+    def to_cpulist(self):
+        """Returns the set in the Linux "cpulist" format, e.g. '0-3,8-11'."""
+        ranges = []
+        start = prev = None
+        for x in self:
+            if prev is not None and x == prev + 1:
+                prev = x
+                continue
+            if start is not None:
+                ranges.append((start, prev))
+            start = prev = x
+        if start is not None:
+            ranges.append((start, prev))
+        return ','.join(
+            str(a) if a == b else '%d-%d' % (a, b) for a, b in ranges
+        )
+
+    def __repr__(self):
+        return "ProcessorSet('%s')" % self.to_cpulist()
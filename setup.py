@@ -13,7 +13,7 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
-from distutils.core import setup
+from setuptools import setup
 
 VERSION = 0.1
 URL = 'https://github.com/jaypipes/hwk'
@@ -32,4 +32,11 @@ setup(
     url=URL,
     download_url=DOWNLOAD_URL,
     packages=['hwk'],
+    install_requires=['six'],
+    entry_points={
+        'console_scripts': [
+            'hwk = hwk.cli:main',
+            'hwk-exporter = hwk.exporter:main',
+        ],
+    },
 )